@@ -9,7 +9,10 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
-from .models import Dashboard, Widget, Report, ReportExecution, AnalyticsMetric
+from .models import (
+    Dashboard, Widget, Report, ReportExecution, AnalyticsMetric,
+    MetricRollup, MetricRollupWatermark
+)
 
 
 @admin.register(Dashboard)
@@ -236,6 +239,28 @@ class AnalyticsMetricAdmin(admin.ModelAdmin):
     is_expired_status.short_description = _('وضعیت انقضا')
 
 
+@admin.register(MetricRollup)
+class MetricRollupAdmin(admin.ModelAdmin):
+    """Admin interface for MetricRollup model"""
+    
+    list_display = [
+        'series', 'granularity', 'bucket_start', 'dimension',
+        'row_count', 'matched_count', 'value_sum', 'updated_at'
+    ]
+    list_filter = ['series', 'granularity']
+    search_fields = ['series', 'dimension']
+    readonly_fields = ['updated_at']
+    date_hierarchy = 'bucket_start'
+
+
+@admin.register(MetricRollupWatermark)
+class MetricRollupWatermarkAdmin(admin.ModelAdmin):
+    """Admin interface for MetricRollupWatermark model"""
+    
+    list_display = ['series', 'last_rolled_date', 'updated_at']
+    readonly_fields = ['updated_at']
+
+
 # Custom admin site title
 admin.site.site_header = _('سیستم مدیریت دانشگاه - آنالیتیکس')
 admin.site.site_title = _('آنالیتیکس دانشگاه')
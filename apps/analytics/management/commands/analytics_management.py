@@ -10,6 +10,8 @@ from django.utils import timezone
 from django.db.models import Q
 from apps.analytics.models import Dashboard, Widget, Report, AnalyticsMetric
 from apps.analytics.services import analytics_service
+from apps.analytics.rollups import rollup_service
+from datetime import date
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,7 +27,10 @@ class Command(BaseCommand):
         parser.add_argument(
             '--action',
             type=str,
-            choices=['create_samples', 'test_query', 'cleanup_metrics', 'generate_report', 'list_sources'],
+            choices=[
+                'create_samples', 'test_query', 'cleanup_metrics', 'generate_report',
+                'list_sources', 'advance_rollups'
+            ],
             default='create_samples',
             help='Action to perform'
         )
@@ -55,6 +60,25 @@ class Command(BaseCommand):
             default=7,
             help='Number of days for cleanup operations'
         )
+        
+        parser.add_argument(
+            '--series',
+            type=str,
+            help='Rollup series to advance (default: all)'
+        )
+        
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='Last day to roll up, YYYY-MM-DD (default: yesterday)'
+        )
+        
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Drop existing rollup buckets and rebuild from scratch '
+                 '(needed after changes older than ANALYTICS_ROLLUP_LATE_DAYS)'
+        )
     
     def handle(self, *args, **options):
         action = options['action']
@@ -69,6 +93,8 @@ class Command(BaseCommand):
             self.generate_sample_report(options)
         elif action == 'list_sources':
             self.list_data_sources()
+        elif action == 'advance_rollups':
+            self.advance_rollups(options)
     
     def create_sample_data(self, options):
         """Create sample dashboards and widgets for testing"""
@@ -298,3 +324,33 @@ class Command(BaseCommand):
             self.stdout.write(
                 self.style.ERROR(f'Error listing data sources: {e}')
             )
+    
+    def advance_rollups(self, options):
+        """Advance metric rollups from their watermarks"""
+        try:
+            series_names = [options['series']] if options.get('series') else list(rollup_service.series)
+            until = date.fromisoformat(options['until']) if options.get('until') else None
+            
+            for series_name in series_names:
+                if series_name not in rollup_service.series:
+                    self.stdout.write(
+                        self.style.ERROR(f'Rollup series {series_name} not found')
+                    )
+                    continue
+                
+                if options.get('rebuild'):
+                    days = rollup_service.rebuild(series_name, until)
+                else:
+                    days = rollup_service.advance(series_name, until)
+                
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'{series_name}: rolled up {days} days, '
+                        f'watermark {rollup_service.get_watermark(series_name)}'
+                    )
+                )
+            
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error advancing rollups: {e}')
+            )
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricRollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('series', models.CharField(max_length=100, unique=True, verbose_name='سری داده')),
+                ('last_rolled_date', models.DateField(verbose_name='آخرین روز تجمیع\u200cشده')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ به\u200cروزرسانی')),
+            ],
+            options={
+                'verbose_name': 'واترمارک تجمیع',
+                'verbose_name_plural': 'واترمارک\u200cهای تجمیع',
+                'db_table': 'analytics_metric_rollup_watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('series', models.CharField(max_length=100, verbose_name='سری داده')),
+                ('granularity', models.CharField(choices=[('daily', 'روزانه'), ('weekly', 'هفتگی'), ('monthly', 'ماهانه')], max_length=10, verbose_name='دانه\u200cبندی')),
+                ('bucket_start', models.DateField(verbose_name='شروع بازه')),
+                ('dimension', models.CharField(blank=True, default='', help_text='مقدار بُعد تفکیک (مثلاً شناسه درس)', max_length=100, verbose_name='بُعد')),
+                ('row_count', models.BigIntegerField(default=0, verbose_name='تعداد ردیف')),
+                ('matched_count', models.BigIntegerField(default=0, verbose_name='تعداد منطبق')),
+                ('value_sum', models.DecimalField(decimal_places=4, default=0, max_digits=20, verbose_name='مجموع مقدار')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ به\u200cروزرسانی')),
+            ],
+            options={
+                'verbose_name': 'تجمیع معیار',
+                'verbose_name_plural': 'تجمیع\u200cهای معیار',
+                'db_table': 'analytics_metric_rollups',
+                'indexes': [models.Index(fields=['series', 'granularity', 'bucket_start'], name='analytics_m_series_d7dc5c_idx')],
+                'unique_together': {('series', 'granularity', 'bucket_start', 'dimension')},
+            },
+        ),
+    ]
@@ -491,3 +491,69 @@ class AnalyticsMetric(models.Model):
     def is_expired(self):
         """Check if the metric cache has expired"""
         return timezone.now() > self.expires_at
+
+
+class RollupGranularity(models.TextChoices):
+    """Bucket sizes for pre-aggregated metric rollups"""
+    DAILY = 'daily', _('روزانه')
+    WEEKLY = 'weekly', _('هفتگی')
+    MONTHLY = 'monthly', _('ماهانه')
+
+
+class MetricRollup(models.Model):
+    """Pre-aggregated, additive metric bucket for one series and period"""
+    
+    series = models.CharField(max_length=100, verbose_name=_('سری داده'))
+    granularity = models.CharField(
+        max_length=10,
+        choices=RollupGranularity.choices,
+        verbose_name=_('دانه‌بندی')
+    )
+    bucket_start = models.DateField(verbose_name=_('شروع بازه'))
+    dimension = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        help_text=_('مقدار بُعد تفکیک (مثلاً شناسه درس)'),
+        verbose_name=_('بُعد')
+    )
+    
+    # Additive measures
+    row_count = models.BigIntegerField(default=0, verbose_name=_('تعداد ردیف'))
+    matched_count = models.BigIntegerField(default=0, verbose_name=_('تعداد منطبق'))
+    value_sum = models.DecimalField(
+        max_digits=20,
+        decimal_places=4,
+        default=0,
+        verbose_name=_('مجموع مقدار')
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('تاریخ به‌روزرسانی'))
+    
+    class Meta:
+        db_table = 'analytics_metric_rollups'
+        verbose_name = _('تجمیع معیار')
+        verbose_name_plural = _('تجمیع‌های معیار')
+        unique_together = ['series', 'granularity', 'bucket_start', 'dimension']
+        indexes = [
+            models.Index(fields=['series', 'granularity', 'bucket_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.series} {self.granularity} {self.bucket_start}"
+
+
+class MetricRollupWatermark(models.Model):
+    """Last day fully rolled up for a series"""
+    
+    series = models.CharField(max_length=100, unique=True, verbose_name=_('سری داده'))
+    last_rolled_date = models.DateField(verbose_name=_('آخرین روز تجمیع‌شده'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('تاریخ به‌روزرسانی'))
+    
+    class Meta:
+        db_table = 'analytics_metric_rollup_watermarks'
+        verbose_name = _('واترمارک تجمیع')
+        verbose_name_plural = _('واترمارک‌های تجمیع')
+    
+    def __str__(self):
+        return f"{self.series} @ {self.last_rolled_date}"
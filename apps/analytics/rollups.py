@@ -0,0 +1,371 @@
+# ==============================================================================
+# ANALYTICS METRIC ROLLUPS
+# تجمیع‌های از پیش محاسبه‌شده معیارهای آنالیتیکس
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import calendar
+import logging
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Any, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Q, Count, Sum, Min, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import MetricRollup, MetricRollupWatermark, RollupGranularity
+
+logger = logging.getLogger(__name__)
+
+# Weeks start on Saturday, as in the Iranian calendar
+WEEK_START = calendar.SATURDAY
+
+
+def week_start(day: date) -> date:
+    """First day of the week containing ``day``"""
+    return day - timedelta(days=(day.weekday() - WEEK_START) % 7)
+
+
+def month_end(day: date) -> date:
+    """Last day of the month containing ``day``"""
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def plan_buckets(start: date, end: date) -> List[Tuple[str, date]]:
+    """
+    Cover the closed range ``[start, end]`` with as few buckets as possible.
+
+    Whole months are used where they fit, then whole weeks, then single days,
+    so a year-long range resolves to roughly a dozen buckets.
+    """
+    buckets = []
+    day = start
+    while day <= end:
+        if day.day == 1 and month_end(day) <= end:
+            buckets.append((RollupGranularity.MONTHLY, day))
+            day = month_end(day) + timedelta(days=1)
+        elif day == week_start(day) and day + timedelta(days=6) <= end:
+            buckets.append((RollupGranularity.WEEKLY, day))
+            day += timedelta(days=7)
+        else:
+            buckets.append((RollupGranularity.DAILY, day))
+            day += timedelta(days=1)
+    return buckets
+
+
+# Rollup series: the raw table each one scans and its additive measures.
+# ``value_field`` is summed, ``matched`` is a conditional count.
+ROLLUP_SERIES = {
+    'grades': {
+        'model': 'grades.Grade',
+        'date_field': 'date_assigned',
+        'dimension': 'course_id',
+        'value_field': 'score',
+        'matched': Q(score__gte=60),
+    },
+    'attendance': {
+        'model': 'attendance.Attendance',
+        'date_field': 'date',
+        'dimension': 'student_id',
+        'value_field': None,
+        'matched': Q(is_present=True),
+    },
+    'payments': {
+        'model': 'financial.Payment',
+        'date_field': 'payment_date',
+        'dimension': 'user_id',
+        'value_field': 'amount',
+        'matched': Q(is_paid=True),
+    },
+}
+
+
+def _ratio(part, whole, scale=1):
+    return round(float(part) / float(whole) * scale, 2) if whole else 0
+
+
+# Metrics answered from rollups: (metric_type, metric_name) -> (series, finalizer)
+ROLLUP_METRICS = {
+    ('student_performance', 'average_grade'): (
+        'grades',
+        lambda totals: {'average': _ratio(totals['value_sum'], totals['row_count'])},
+    ),
+    ('student_performance', 'pass_rate'): (
+        'grades',
+        lambda totals: {
+            'pass_rate': _ratio(totals['matched_count'], totals['row_count'], 100),
+            'total': totals['row_count'],
+            'passed': totals['matched_count'],
+        },
+    ),
+    ('course_analytics', 'attendance_rate'): (
+        'attendance',
+        lambda totals: {
+            'rate': _ratio(totals['matched_count'], totals['row_count'], 100),
+            'total': totals['row_count'],
+            'present': totals['matched_count'],
+        },
+    ),
+    ('financial_metrics', 'revenue'): (
+        'payments',
+        lambda totals: {
+            'total_revenue': float(totals['value_sum']),
+            'payment_count': totals['row_count'],
+            'paid_count': totals['matched_count'],
+        },
+    ),
+}
+
+
+class RollupService:
+    """Maintain and query incremental daily/weekly/monthly metric rollups"""
+
+    def __init__(self, series: Dict[str, Dict] = None, metrics: Dict[Tuple[str, str], Tuple] = None,
+                 late_days: int = None):
+        self.series = series if series is not None else ROLLUP_SERIES
+        self.metrics = metrics if metrics is not None else ROLLUP_METRICS
+        # Unset late-data window is read from settings on every advance
+        self._late_days = late_days
+
+    @property
+    def late_days(self) -> int:
+        if self._late_days is not None:
+            return self._late_days
+        return getattr(settings, 'ANALYTICS_ROLLUP_LATE_DAYS', 7)
+
+    def supports(self, metric_type: str, metric_name: str, context: Dict = None) -> bool:
+        """Check whether a metric can be answered from rollups"""
+        definition = self.metrics.get((metric_type, metric_name))
+        if not definition:
+            return False
+        allowed = {self.series[definition[0]]['dimension']}
+        return set((context or {}).keys()) <= allowed
+
+    def get_metric(self, metric_type: str, metric_name: str,
+                   start: date, end: date, context: Dict = None) -> Dict[str, Any]:
+        """Compute a metric over ``[start, end]`` from rollup buckets"""
+        series_name, finalize = self.metrics[(metric_type, metric_name)]
+        dimension_field = self.series[series_name]['dimension']
+        dimension = (context or {}).get(dimension_field)
+        return finalize(self.get_totals(series_name, start, end, dimension))
+
+    def get_totals(self, series_name: str, start: date, end: date,
+                   dimension: Any = None) -> Dict[str, Any]:
+        """
+        Sum the additive measures of a series over the closed range ``[start, end]``.
+
+        Days up to the watermark are read from buckets in one query; any days
+        after it (normally just today) are aggregated live from the raw table.
+        """
+        watermark = self.get_watermark(series_name)
+        closed_end = min(end, watermark) if watermark else start - timedelta(days=1)
+
+        totals = {'row_count': 0, 'matched_count': 0, 'value_sum': Decimal(0)}
+
+        if closed_end >= start:
+            by_granularity = {}
+            for granularity, bucket_start in plan_buckets(start, closed_end):
+                by_granularity.setdefault(granularity, []).append(bucket_start)
+
+            condition = Q()
+            for granularity, bucket_starts in by_granularity.items():
+                condition |= Q(granularity=granularity, bucket_start__in=bucket_starts)
+
+            queryset = MetricRollup.objects.filter(condition, series=series_name)
+            if dimension is not None:
+                queryset = queryset.filter(dimension=str(dimension))
+
+            self._add_totals(totals, queryset.aggregate(
+                row_count=Sum('row_count'),
+                matched_count=Sum('matched_count'),
+                value_sum=Sum('value_sum'),
+            ))
+
+        live_start = max(start, closed_end + timedelta(days=1))
+        if live_start <= end:
+            self._add_totals(totals, self._raw_queryset(series_name, live_start, end, dimension).aggregate(
+                **self._measures(series_name)
+            ))
+
+        return totals
+
+    def get_watermark(self, series_name: str) -> Optional[date]:
+        """Last day fully rolled up for a series"""
+        return MetricRollupWatermark.objects.filter(
+            series=series_name
+        ).values_list('last_rolled_date', flat=True).first()
+
+    def advance(self, series_name: str, until: date = None) -> int:
+        """
+        Roll a series forward from its watermark up to ``until``.
+
+        Only rows dated after the watermark are scanned, plus the last
+        ``late_days`` days before it, so rows edited or backdated into that
+        window since the previous run are picked up; older changes need a
+        ``rebuild``. Daily buckets of the scanned days are replaced from one
+        grouped query, then the weekly and monthly buckets touching them are
+        re-folded from the daily ones. Returns the number of new days rolled
+        up.
+        """
+        until = until or timezone.localdate() - timedelta(days=1)
+        watermark = self.get_watermark(series_name)
+        late_days = self.late_days
+
+        if watermark is None:
+            late_days = 0
+            first_day = self._model(series_name).objects.aggregate(
+                first=Min(self.series[series_name]['date_field'])
+            )['first']
+            if first_day is None:
+                return 0
+            if hasattr(first_day, 'date'):
+                first_day = timezone.localdate(first_day) if timezone.is_aware(first_day) else first_day.date()
+            watermark = first_day - timedelta(days=1)
+
+        start = watermark + timedelta(days=1)
+        days = max((until - start).days + 1, 0)
+        # Never move the watermark back; without new days only re-roll the late window
+        until = max(until, watermark)
+        rescan_start = start - timedelta(days=late_days)
+        if rescan_start > until:
+            return 0
+
+        with transaction.atomic():
+            self._clear(series_name, rescan_start, until)
+            self._write_daily(series_name, rescan_start, until)
+            self._refold(series_name, RollupGranularity.WEEKLY, week_start(rescan_start), until, week_start)
+            self._refold(series_name, RollupGranularity.MONTHLY, rescan_start.replace(day=1), until,
+                         lambda day: day.replace(day=1))
+            MetricRollupWatermark.objects.update_or_create(
+                series=series_name,
+                defaults={'last_rolled_date': until}
+            )
+
+        logger.info(f"Rolled up {days} days of {series_name} through {until}")
+        return days
+
+    def rebuild(self, series_name: str, until: date = None) -> int:
+        """Drop all buckets of a series and roll it up again from scratch"""
+        with transaction.atomic():
+            MetricRollup.objects.filter(series=series_name).delete()
+            MetricRollupWatermark.objects.filter(series=series_name).delete()
+        return self.advance(series_name, until)
+
+    # Internal helpers
+    def _model(self, series_name: str):
+        return apps.get_model(self.series[series_name]['model'])
+
+    def _day_expression(self, series_name: str):
+        definition = self.series[series_name]
+        field = self._model(series_name)._meta.get_field(definition['date_field'])
+        if isinstance(field, models.DateTimeField):
+            return TruncDate(definition['date_field'])
+        return F(definition['date_field'])
+
+    def _measures(self, series_name: str) -> Dict[str, Any]:
+        definition = self.series[series_name]
+        measures = {
+            'row_count': Count('pk'),
+            'matched_count': Count('pk', filter=definition['matched']),
+        }
+        if definition['value_field']:
+            measures['value_sum'] = Sum(definition['value_field'])
+        return measures
+
+    def _raw_queryset(self, series_name: str, start: date, end: date, dimension: Any = None):
+        definition = self.series[series_name]
+        queryset = self._model(series_name).objects.annotate(
+            rollup_day=self._day_expression(series_name)
+        ).filter(rollup_day__gte=start, rollup_day__lte=end)
+        if dimension is not None:
+            queryset = queryset.filter(**{definition['dimension']: dimension})
+        return queryset
+
+    def _clear(self, series_name: str, start: date, end: date):
+        """Drop the buckets that re-rolling ``[start, end]`` rewrites"""
+        MetricRollup.objects.filter(
+            Q(granularity=RollupGranularity.DAILY, bucket_start__gte=start)
+            | Q(granularity=RollupGranularity.WEEKLY, bucket_start__gte=week_start(start))
+            | Q(granularity=RollupGranularity.MONTHLY, bucket_start__gte=start.replace(day=1)),
+            series=series_name,
+            bucket_start__lte=end,
+        ).delete()
+
+    def _write_daily(self, series_name: str, start: date, end: date):
+        dimension_field = self.series[series_name]['dimension']
+        rows = self._raw_queryset(series_name, start, end).values(
+            'rollup_day', dimension_field
+        ).annotate(**self._measures(series_name)).order_by()
+
+        buckets = [
+            MetricRollup(
+                series=series_name,
+                granularity=RollupGranularity.DAILY,
+                bucket_start=row['rollup_day'],
+                dimension=self._dimension_value(row[dimension_field]),
+                row_count=row['row_count'],
+                matched_count=row['matched_count'],
+                value_sum=row.get('value_sum') or 0,
+            )
+            for row in rows
+        ]
+        self._upsert(buckets)
+
+    def _refold(self, series_name: str, granularity: str, start: date, end: date, bucket_of):
+        """Recompute coarser buckets for ``[start, end]`` from the daily ones"""
+        daily = MetricRollup.objects.filter(
+            series=series_name,
+            granularity=RollupGranularity.DAILY,
+            bucket_start__gte=start,
+            bucket_start__lte=end,
+        ).values_list('bucket_start', 'dimension', 'row_count', 'matched_count', 'value_sum')
+
+        folded = {}
+        for bucket_start, dimension, row_count, matched_count, value_sum in daily:
+            key = (bucket_of(bucket_start), dimension)
+            totals = folded.setdefault(key, [0, 0, Decimal(0)])
+            totals[0] += row_count
+            totals[1] += matched_count
+            totals[2] += value_sum
+
+        self._upsert([
+            MetricRollup(
+                series=series_name,
+                granularity=granularity,
+                bucket_start=bucket_start,
+                dimension=dimension,
+                row_count=row_count,
+                matched_count=matched_count,
+                value_sum=value_sum,
+            )
+            for (bucket_start, dimension), (row_count, matched_count, value_sum) in folded.items()
+        ])
+
+    def _upsert(self, buckets: List[MetricRollup]):
+        MetricRollup.objects.bulk_create(
+            buckets,
+            batch_size=1000,
+            update_conflicts=True,
+            # MySQL upserts on any unique key and rejects an explicit target
+            unique_fields=(
+                ['series', 'granularity', 'bucket_start', 'dimension']
+                if connection.features.supports_update_conflicts_with_target else None
+            ),
+            update_fields=['row_count', 'matched_count', 'value_sum', 'updated_at'],
+        )
+
+    def _dimension_value(self, value) -> str:
+        return '' if value is None else str(value)
+
+    def _add_totals(self, totals: Dict[str, Any], values: Dict[str, Any]):
+        totals['row_count'] += values.get('row_count') or 0
+        totals['matched_count'] += values.get('matched_count') or 0
+        totals['value_sum'] += Decimal(values.get('value_sum') or 0)
+
+
+# Global rollup service instance
+rollup_service = RollupService()
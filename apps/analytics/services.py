@@ -6,16 +6,23 @@
 
 import logging
 from typing import Dict, List, Any, Optional, Union
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from django.db.models import Q, Count, Avg, Sum, Max, Min, F
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.db import connection
+from django.db import connection, connections
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
 import json
+import uuid
 
 from .models import Dashboard, Widget, Report, ReportExecution, AnalyticsMetric
+from .aggregation import (
+    GRADE_BANDS, GRADE_BANDS_20, apply_filters, band_counts, conditional_counts
+)
+from .rollups import rollup_service
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -28,11 +35,17 @@ class DataSourceRegistry:
         self._sources = {}
         self.register_default_sources()
     
-    def register(self, name: str, query_func, description: str = ""):
-        """Register a new data source"""
+    def register(self, name: str, query_func, description: str = "", models=()):
+        """
+        Register a new data source.
+        
+        ``models`` lists the ``app_label.ModelName`` labels the source reads;
+        saving or deleting one of them invalidates the source's cached widgets.
+        """
         self._sources[name] = {
             'query_func': query_func,
-            'description': description
+            'description': description,
+            'models': tuple(models)
         }
     
     def get_source(self, name: str):
@@ -43,35 +56,49 @@ class DataSourceRegistry:
         """List all available data sources"""
         return list(self._sources.keys())
     
+    def sources_for_model(self, label: str) -> List[str]:
+        """List the data sources that read the given model"""
+        return [
+            name for name, source in self._sources.items()
+            if label in source['models']
+        ]
+    
+    def dependent_models(self) -> List[str]:
+        """List every model label some data source depends on"""
+        labels = set()
+        for source in self._sources.values():
+            labels.update(source['models'])
+        return sorted(labels)
+    
     def register_default_sources(self):
         """Register default data sources"""
         
         # Student analytics
-        self.register('student_count', self._student_count, 'تعداد کل دانشجویان')
-        self.register('student_by_status', self._student_by_status, 'دانشجویان بر اساس وضعیت')
-        self.register('student_enrollment_trend', self._student_enrollment_trend, 'روند ثبت‌نام دانشجویان')
+        self.register('student_count', self._student_count, 'تعداد کل دانشجویان', models=['users.User'])
+        self.register('student_by_status', self._student_by_status, 'دانشجویان بر اساس وضعیت', models=['users.User'])
+        self.register('student_enrollment_trend', self._student_enrollment_trend, 'روند ثبت‌نام دانشجویان', models=['users.User'])
         
         # Course analytics
-        self.register('course_count', self._course_count, 'تعداد کل دروس')
-        self.register('course_enrollment', self._course_enrollment, 'ثبت‌نام در دروس')
-        self.register('popular_courses', self._popular_courses, 'محبوب‌ترین دروس')
+        self.register('course_count', self._course_count, 'تعداد کل دروس', models=['courses.Course'])
+        self.register('course_enrollment', self._course_enrollment, 'ثبت‌نام در دروس', models=['courses.Course'])
+        self.register('popular_courses', self._popular_courses, 'محبوب‌ترین دروس', models=['courses.Course'])
         
         # Grade analytics
-        self.register('grade_distribution', self._grade_distribution, 'توزیع نمرات')
-        self.register('average_grades', self._average_grades, 'میانگین نمرات')
-        self.register('grade_trends', self._grade_trends, 'روند نمرات')
+        self.register('grade_distribution', self._grade_distribution, 'توزیع نمرات', models=['grades.Grade'])
+        self.register('average_grades', self._average_grades, 'میانگین نمرات', models=['grades.Grade'])
+        self.register('grade_trends', self._grade_trends, 'روند نمرات', models=['grades.Grade'])
         
         # Attendance analytics
-        self.register('attendance_rate', self._attendance_rate, 'نرخ حضور')
-        self.register('attendance_by_course', self._attendance_by_course, 'حضور بر اساس درس')
+        self.register('attendance_rate', self._attendance_rate, 'نرخ حضور', models=['attendance.Attendance'])
+        self.register('attendance_by_course', self._attendance_by_course, 'حضور بر اساس درس', models=['attendance.Attendance'])
         
         # Financial analytics
-        self.register('revenue_summary', self._revenue_summary, 'خلاصه درآمد')
-        self.register('payment_status', self._payment_status, 'وضعیت پرداخت‌ها')
+        self.register('revenue_summary', self._revenue_summary, 'خلاصه درآمد', models=['financial.Payment'])
+        self.register('payment_status', self._payment_status, 'وضعیت پرداخت‌ها', models=['financial.Payment'])
         
         # System analytics
-        self.register('user_activity', self._user_activity, 'فعالیت کاربران')
-        self.register('login_stats', self._login_stats, 'آمار ورود به سیستم')
+        self.register('user_activity', self._user_activity, 'فعالیت کاربران', models=['users.User'])
+        self.register('login_stats', self._login_stats, 'آمار ورود به سیستم', models=['users.User'])
     
     # Default data source implementations
     def _student_count(self, filters=None, **kwargs):
@@ -135,38 +162,14 @@ class DataSourceRegistry:
         """Get grade distribution"""
         try:
             from apps.grades.models import Grade
-            queryset = Grade.objects.all()
-            
-            if filters:
-                if 'course_id' in filters:
-                    queryset = queryset.filter(course_id=filters['course_id'])
-                if 'date_from' in filters:
-                    queryset = queryset.filter(created_at__gte=filters['date_from'])
-            
-            # Create grade ranges
-            result = []
-            ranges = [
-                (90, 100, 'عالی'),
-                (80, 89, 'خوب'),
-                (70, 79, 'متوسط'),
-                (60, 69, 'قابل قبول'),
-                (0, 59, 'مردود')
-            ]
-            
-            for min_grade, max_grade, label in ranges:
-                count = queryset.filter(
-                    score__gte=min_grade,
-                    score__lte=max_grade
-                ).count()
-                
-                result.append({
-                    'range': label,
-                    'count': count,
-                    'min_grade': min_grade,
-                    'max_grade': max_grade
-                })
+            queryset = apply_filters(Grade.objects.all(), filters, {
+                'course_id': 'course_id',
+                'date_from': 'created_at__gte',
+            })
             
-            return result
+            # One conditional aggregate covers every grade band
+            distribution, _ = band_counts(queryset, 'score', GRADE_BANDS)
+            return distribution
         except Exception as e:
             logger.error(f"Error in _grade_distribution: {e}")
             return []
@@ -175,18 +178,18 @@ class DataSourceRegistry:
         """Get attendance rate"""
         try:
             from apps.attendance.models import Attendance
-            queryset = Attendance.objects.all()
-            
-            if filters:
-                if 'course_id' in filters:
-                    queryset = queryset.filter(course_id=filters['course_id'])
-                if 'date_from' in filters:
-                    queryset = queryset.filter(date__gte=filters['date_from'])
-                if 'date_to' in filters:
-                    queryset = queryset.filter(date__lte=filters['date_to'])
+            queryset = apply_filters(Attendance.objects.all(), filters, {
+                'course_id': 'course_id',
+                'date_from': 'date__gte',
+                'date_to': 'date__lte',
+            })
             
-            total = queryset.count()
-            present = queryset.filter(status='present').count()
+            counts = conditional_counts(queryset, {
+                'total': None,
+                'present': Q(status='present'),
+            })
+            total = counts['total']
+            present = counts['present']
             
             rate = (present / total * 100) if total > 0 else 0
             
@@ -204,16 +207,14 @@ class DataSourceRegistry:
         """Get revenue summary"""
         try:
             from apps.financial.models import Payment
-            queryset = Payment.objects.filter(status='completed')
-            
-            if filters:
-                if 'date_from' in filters:
-                    queryset = queryset.filter(created_at__gte=filters['date_from'])
-                if 'date_to' in filters:
-                    queryset = queryset.filter(created_at__lte=filters['date_to'])
+            queryset = apply_filters(Payment.objects.filter(status='completed'), filters, {
+                'date_from': 'created_at__gte',
+                'date_to': 'created_at__lte',
+            })
             
-            total_revenue = queryset.aggregate(total=Sum('amount'))['total'] or 0
-            payment_count = queryset.count()
+            summary = conditional_counts(queryset, {'payment_count': None}, total=Sum('amount'))
+            total_revenue = summary['total'] or 0
+            payment_count = summary['payment_count']
             average_payment = (total_revenue / payment_count) if payment_count > 0 else 0
             
             return {
@@ -237,13 +238,13 @@ class DataSourceRegistry:
                 expire_date__gte=yesterday
             ).count()
             
-            # Total users
-            total_users = User.objects.filter(is_active=True).count()
-            
-            # Recent logins (approximate from user last_login)
-            recent_logins = User.objects.filter(
-                last_login__gte=yesterday
-            ).count()
+            # Total users and recent logins (approximate from user last_login)
+            counts = conditional_counts(User.objects.all(), {
+                'total_users': Q(is_active=True),
+                'recent_logins': Q(last_login__gte=yesterday),
+            })
+            total_users = counts['total_users']
+            recent_logins = counts['recent_logins']
             
             return {
                 'active_sessions': active_sessions,
@@ -337,30 +338,17 @@ class DataSourceRegistry:
             from apps.grades.models import Grade
             from django.db.models import Avg
             
-            avg_grade = Grade.objects.aggregate(
-                average=Avg('grade')
-            )['average'] or 0
-            
-            # Grade distribution by range
-            ranges = [
-                (17, 20, 'عالی'),
-                (15, 17, 'خوب'),
-                (12, 15, 'متوسط'),
-                (10, 12, 'قابل قبول'),
-                (0, 10, 'مردود')
+            # Average and per-range distribution in a single query
+            distribution, extra = band_counts(
+                Grade.objects.all(), 'grade', GRADE_BANDS_20,
+                inclusive=False, extra={'average': Avg('grade')}
+            )
+            avg_grade = extra['average'] or 0
+            distribution = [
+                {'range': item['range'], 'count': item['count']}
+                for item in distribution
             ]
             
-            distribution = []
-            for min_grade, max_grade, label in ranges:
-                count = Grade.objects.filter(
-                    grade__gte=min_grade,
-                    grade__lt=max_grade
-                ).count()
-                distribution.append({
-                    'range': label,
-                    'count': count
-                })
-            
             return {
                 'average_grade': round(avg_grade, 2),
                 'distribution': distribution
@@ -467,18 +455,12 @@ class DataSourceRegistry:
             week_ago = today - timedelta(days=7)
             month_ago = today - timedelta(days=30)
             
-            stats = {
-                'today': User.objects.filter(
-                    last_login__date=today
-                ).count(),
-                'this_week': User.objects.filter(
-                    last_login__gte=week_ago
-                ).count(),
-                'this_month': User.objects.filter(
-                    last_login__gte=month_ago
-                ).count(),
-                'total_users': User.objects.filter(is_active=True).count()
-            }
+            stats = conditional_counts(User.objects.all(), {
+                'today': Q(last_login__date=today),
+                'this_week': Q(last_login__gte=week_ago),
+                'this_month': Q(last_login__gte=month_ago),
+                'total_users': Q(is_active=True),
+            })
             
             return stats
         except Exception as e:
@@ -496,7 +478,7 @@ class AnalyticsService:
         """Get data for a specific widget"""
         try:
             # Check cache first
-            cache_key = f"widget_data_{widget.id}_{hash(str(widget.query_config))}"
+            cache_key = self._widget_cache_key(widget, self._source_versions([widget.data_source]))
             cached_data = cache.get(cache_key)
             
             if cached_data is not None:
@@ -508,11 +490,7 @@ class AnalyticsService:
                 return {'error': f'Data source {widget.data_source} not found'}
             
             # Execute query
-            query_func = data_source['query_func']
-            filters = widget.query_config.get('filters', {})
-            aggregation = widget.aggregation_config
-            
-            raw_data = query_func(filters=filters, aggregation=aggregation)
+            raw_data = self._execute_widget_query(data_source, widget)
             
             # Process data for chart type
             processed_data = self._process_data_for_chart(raw_data, widget.chart_type)
@@ -526,6 +504,142 @@ class AnalyticsService:
             logger.error(f"Error getting widget data for {widget.id}: {e}")
             return {'error': str(e)}
     
+    def get_widgets_data(self, widgets) -> Dict[str, Any]:
+        """
+        Get data for several widgets at once.
+        
+        Cached results are fetched with a single ``get_many``; the misses are
+        grouped by query signature so widgets sharing a data source and
+        filters run their query once, and the distinct queries are evaluated
+        concurrently on a bounded thread pool.
+        """
+        widgets = list(widgets)
+        versions = self._source_versions({widget.data_source for widget in widgets})
+        cache_keys = {str(widget.id): self._widget_cache_key(widget, versions) for widget in widgets}
+        cached = cache.get_many(list(cache_keys.values()))
+        
+        widget_data = {}
+        groups = {}
+        for widget in widgets:
+            widget_id = str(widget.id)
+            cache_key = cache_keys[widget_id]
+            if cache_key in cached:
+                widget_data[widget_id] = cached[cache_key]
+                continue
+            
+            data_source = self.data_registry.get_source(widget.data_source)
+            if not data_source:
+                widget_data[widget_id] = {'error': f'Data source {widget.data_source} not found'}
+                continue
+            
+            groups.setdefault(self._widget_query_signature(widget), []).append(widget)
+        
+        raw_results = self._execute_widget_groups(groups)
+        
+        # Group cache writes by timeout so each duration costs one set_many
+        to_cache = {}
+        for signature, group in groups.items():
+            raw_data, error = raw_results[signature]
+            for widget in group:
+                widget_id = str(widget.id)
+                if error is not None:
+                    logger.error(f"Error getting widget data for {widget.id}: {error}")
+                    widget_data[widget_id] = {'error': str(error)}
+                    continue
+                
+                processed_data = self._process_data_for_chart(raw_data, widget.chart_type)
+                widget_data[widget_id] = processed_data
+                to_cache.setdefault(widget.cache_duration, {})[cache_keys[widget_id]] = processed_data
+        
+        for timeout, entries in to_cache.items():
+            cache.set_many(entries, timeout)
+        
+        # Preserve the order widgets were passed in
+        return {str(widget.id): widget_data[str(widget.id)] for widget in widgets}
+    
+    def _widget_cache_key(self, widget: Widget, versions: Dict[str, str]) -> str:
+        """
+        Build the cache key for a widget's processed data.
+        
+        The key is a digest of the widget's canonical configuration, its last
+        update time and the current version of its data source, so it is the
+        same in every worker process and changes whenever the underlying data
+        is invalidated.
+        """
+        payload = json.dumps({
+            'source': widget.data_source,
+            'source_version': versions.get(widget.data_source),
+            'chart_type': widget.chart_type,
+            'query': widget.query_config,
+            'aggregation': widget.aggregation_config,
+            'updated_at': widget.updated_at.isoformat() if widget.updated_at else None,
+        }, sort_keys=True, separators=(',', ':'), default=str)
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return f"widget_data_{widget.id}_{digest}"
+    
+    def _source_version_key(self, source_name: str) -> str:
+        """Cache key holding the invalidation counter of a data source"""
+        return f"analytics_source_version_{source_name}"
+    
+    def _source_versions(self, source_names) -> Dict[str, str]:
+        """Fetch the current invalidation counters for several data sources"""
+        keys = {self._source_version_key(name): name for name in source_names}
+        found = cache.get_many(list(keys))
+        return {name: found.get(key) for key, name in keys.items()}
+    
+    def invalidate_source(self, source_name: str):
+        """Invalidate every cached widget reading from a data source"""
+        # A fresh random token never collides with a version already used in
+        # a key, even if the previous token was evicted from the cache
+        cache.set(self._source_version_key(source_name), uuid.uuid4().hex, None)
+    
+    def invalidate_model(self, label: str) -> List[str]:
+        """Invalidate the data sources that read the given model"""
+        source_names = self.data_registry.sources_for_model(label)
+        for source_name in source_names:
+            self.invalidate_source(source_name)
+        return source_names
+    
+    def _widget_query_signature(self, widget: Widget) -> str:
+        """Identify widgets that would run exactly the same query"""
+        return json.dumps({
+            'source': widget.data_source,
+            'filters': widget.query_config.get('filters', {}),
+            'aggregation': widget.aggregation_config,
+        }, sort_keys=True, default=str)
+    
+    def _execute_widget_query(self, data_source: Dict, widget: Widget) -> Any:
+        """Run a data source query with the widget's configuration"""
+        query_func = data_source['query_func']
+        filters = widget.query_config.get('filters', {})
+        aggregation = widget.aggregation_config
+        
+        return query_func(filters=filters, aggregation=aggregation)
+    
+    def _execute_widget_groups(self, groups: Dict[str, List[Widget]]) -> Dict[str, tuple]:
+        """Evaluate one query per signature, concurrently when allowed"""
+        def run(signature):
+            widget = groups[signature][0]
+            data_source = self.data_registry.get_source(widget.data_source)
+            try:
+                return signature, (self._execute_widget_query(data_source, widget), None)
+            except Exception as e:
+                return signature, (None, e)
+        
+        max_workers = min(getattr(settings, 'ANALYTICS_WIDGET_WORKERS', 4), len(groups))
+        if max_workers <= 1:
+            return dict(run(signature) for signature in groups)
+        
+        def run_in_thread(signature):
+            try:
+                return run(signature)
+            finally:
+                # Worker threads open their own connections; don't leak them
+                connections.close_all()
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(executor.map(run_in_thread, groups))
+    
     def _process_data_for_chart(self, data: Any, chart_type: str) -> Dict[str, Any]:
         """Process raw data for specific chart type"""
         if chart_type == 'kpi':
@@ -575,9 +689,7 @@ class AnalyticsService:
             # Get all active widgets
             widgets = dashboard.widgets.filter(is_active=True).order_by('order')
             
-            widget_data = {}
-            for widget in widgets:
-                widget_data[str(widget.id)] = self.get_widget_data(widget)
+            widget_data = self.get_widgets_data(widgets)
             
             return {
                 'dashboard_id': str(dashboard.id),
@@ -727,6 +839,14 @@ class AnalyticsService:
                                context: Dict = None) -> Any:
         """Calculate the actual metric value"""
         try:
+            # Additive metrics are answered from pre-aggregated buckets
+            if rollup_service.supports(metric_type, metric_name, context):
+                return rollup_service.get_metric(
+                    metric_type, metric_name,
+                    self._local_date(period_start), self._local_date(period_end),
+                    context
+                )
+            
             if metric_type == 'student_performance':
                 return self._calculate_student_performance_metric(metric_name, period_start, period_end, context)
             elif metric_type == 'course_analytics':
@@ -741,6 +861,12 @@ class AnalyticsService:
             logger.error(f"Error calculating metric value for {metric_name}: {e}")
             return {'error': str(e)}
     
+    def _local_date(self, value) -> date:
+        """Convert a period boundary to a local calendar date"""
+        if isinstance(value, datetime):
+            return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+        return value
+    
     def _calculate_student_performance_metric(self, metric_name: str, 
                                             period_start: datetime, period_end: datetime,
                                             context: Dict = None) -> Dict:
@@ -761,8 +887,12 @@ class AnalyticsService:
                 return {'average': round(float(avg_grade), 2)}
             
             elif metric_name == 'pass_rate':
-                total = queryset.count()
-                passed = queryset.filter(score__gte=60).count()
+                counts = conditional_counts(queryset, {
+                    'total': None,
+                    'passed': Q(score__gte=60),
+                })
+                total = counts['total']
+                passed = counts['passed']
                 rate = (passed / total * 100) if total > 0 else 0
                 return {'pass_rate': round(rate, 2), 'total': total, 'passed': passed}
             
@@ -0,0 +1,34 @@
+# ==============================================================================
+# ANALYTICS SIGNAL HANDLERS
+# سیگنال‌های آنالیتیکس
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from apps.data_management.changes import bulk_rows_written
+
+from .services import analytics_service
+
+
+def invalidate_widget_cache(sender, **kwargs):
+    """Invalidate cached widgets whose data source reads the changed model"""
+    label = sender._meta.label
+    # Wait for the commit so a concurrent reader can't re-cache stale rows
+    transaction.on_commit(lambda: analytics_service.invalidate_model(label))
+
+
+for model_label in analytics_service.data_registry.dependent_models():
+    post_save.connect(
+        invalidate_widget_cache, sender=model_label,
+        dispatch_uid=f'analytics_post_save_{model_label}'
+    )
+    post_delete.connect(
+        invalidate_widget_cache, sender=model_label,
+        dispatch_uid=f'analytics_post_delete_{model_label}'
+    )
+    bulk_rows_written.connect(
+        invalidate_widget_cache, sender=model_label,
+        dispatch_uid=f'analytics_bulk_write_{model_label}'
+    )
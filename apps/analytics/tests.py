@@ -0,0 +1,315 @@
+# ==============================================================================
+# TESTS FOR ANALYTICS APP
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q, Avg, Sum
+from django.test import TestCase
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+from apps.analytics.aggregation import GRADE_BANDS, band_counts, conditional_counts
+from apps.analytics.models import Dashboard, Widget
+from apps.analytics.rollups import RollupService, plan_buckets, rollup_service
+from apps.analytics.services import AnalyticsService, DataSourceRegistry
+from apps.courses.models import Course
+from apps.data_management.importers import BulkImporter
+from apps.grades.models import Grade
+from apps.users.models import User
+
+
+class AggregationTest(TestCase):
+    """Test the conditional-aggregate helpers"""
+
+    def setUp(self):
+        self.professor = User.objects.create_user(
+            username='professor1',
+            national_id='1234567890',
+            email='prof@test.com',
+            password='testpass123',
+            user_type='EMPLOYEE'
+        )
+        self.course = Course.objects.create(
+            title='Test Course',
+            code='TC101',
+            professor=self.professor
+        )
+        for index, score in enumerate([95, 91, 85, 72, 65, 40]):
+            student = User.objects.create_user(
+                username=f'student{index}',
+                national_id=f'10000000{index:02d}',
+                email=f'student{index}@test.com',
+                password='testpass123',
+                user_type='STUDENT'
+            )
+            Grade.objects.create(
+                student=student,
+                course=self.course,
+                score=Decimal(score),
+                professor=self.professor
+            )
+
+    def test_band_counts_single_query(self):
+        """All grade bands are counted in one round trip"""
+        with CaptureQueriesContext(connection) as queries:
+            distribution, _ = band_counts(Grade.objects.all(), 'score', GRADE_BANDS)
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([item['count'] for item in distribution], [2, 1, 1, 1, 1])
+        self.assertEqual(distribution[0]['range'], 'عالی')
+
+    def test_conditional_counts(self):
+        """Filtered and unfiltered counts share a query"""
+        counts = conditional_counts(Grade.objects.all(), {
+            'total': None,
+            'passed': Q(score__gte=60),
+        }, average=Avg('score'))
+
+        self.assertEqual(counts['total'], 6)
+        self.assertEqual(counts['passed'], 5)
+        self.assertAlmostEqual(float(counts['average']), 74.67, places=2)
+
+    def test_grade_distribution_source(self):
+        """The grade_distribution data source keeps its output shape"""
+        registry = DataSourceRegistry()
+        source = registry.get_source('grade_distribution')
+
+        with CaptureQueriesContext(connection) as queries:
+            result = source['query_func'](filters={'course_id': self.course.id})
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(sum(item['count'] for item in result), 6)
+        self.assertEqual(
+            set(result[0].keys()),
+            {'range', 'count', 'min_grade', 'max_grade'}
+        )
+
+
+class DashboardBatchTest(TestCase):
+    """Test batched widget evaluation"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='admin1',
+            national_id='1234567891',
+            email='admin@test.com',
+            password='testpass123',
+            user_type='EMPLOYEE'
+        )
+        self.dashboard = Dashboard.objects.create(title='Admin', created_by=self.user)
+        self.widgets = [
+            Widget.objects.create(
+                dashboard=self.dashboard, title=f'Widget {index}', chart_type=chart_type,
+                data_source=source, query_config={'filters': {}}, order=index
+            )
+            for index, (source, chart_type) in enumerate([
+                ('counter', 'kpi'), ('counter', 'table'), ('other', 'kpi'), ('missing', 'kpi'),
+            ])
+        ]
+
+        self.calls = []
+        self.service = AnalyticsService()
+        self.service.data_registry.register('counter', self._source('counter'))
+        self.service.data_registry.register('other', self._source('other'))
+
+    def _source(self, name):
+        def query_func(filters=None, **kwargs):
+            self.calls.append(name)
+            return {'total': 7}
+        return query_func
+
+    def test_identical_queries_run_once(self):
+        """Widgets sharing a query signature execute it once"""
+        data = self.service.get_dashboard_data(self.dashboard, self.user)
+        widgets = data['widgets']
+
+        self.assertEqual(sorted(self.calls), ['counter', 'other'])
+        self.assertEqual(list(widgets), [str(widget.id) for widget in self.widgets])
+        self.assertEqual(widgets[str(self.widgets[0].id)], {'value': 7, 'label': 'Total'})
+        self.assertEqual(widgets[str(self.widgets[1].id)], {'rows': [{'total': 7}]})
+        self.assertIn('error', widgets[str(self.widgets[3].id)])
+
+    def test_second_load_is_served_from_cache(self):
+        """A warm dashboard does not hit the data sources again"""
+        self.service.get_dashboard_data(self.dashboard, self.user)
+        self.calls.clear()
+
+        data = self.service.get_dashboard_data(self.dashboard, self.user)
+
+        self.assertEqual(self.calls, [])
+        self.assertEqual(data['widgets'][str(self.widgets[2].id)]['value'], 7)
+
+
+class WidgetCacheInvalidationTest(TestCase):
+    """Test widget cache keys and model-driven invalidation"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='admin1',
+            national_id='1234567891',
+            email='admin@test.com',
+            password='testpass123',
+            user_type='EMPLOYEE'
+        )
+        self.course = Course.objects.create(title='Test Course', code='TC101', professor=self.user)
+        self.dashboard = Dashboard.objects.create(title='Admin', created_by=self.user)
+        self.grade_widget = Widget.objects.create(
+            dashboard=self.dashboard, title='Grades', chart_type='pie',
+            data_source='grade_distribution', query_config={'filters': {}}
+        )
+        self.course_widget = Widget.objects.create(
+            dashboard=self.dashboard, title='Courses', chart_type='kpi',
+            data_source='course_count', query_config={'filters': {}}
+        )
+        self.service = AnalyticsService()
+
+    def _cache_key(self, widget):
+        versions = self.service._source_versions([widget.data_source])
+        return self.service._widget_cache_key(widget, versions)
+
+    def test_cache_key_is_deterministic(self):
+        """Equal widget configurations produce equal keys"""
+        reloaded = Widget.objects.get(pk=self.grade_widget.pk)
+        self.assertEqual(self._cache_key(self.grade_widget), self._cache_key(reloaded))
+
+        reloaded.query_config = {'filters': {'course_id': 1}}
+        self.assertNotEqual(self._cache_key(self.grade_widget), self._cache_key(reloaded))
+
+    def test_saving_grade_invalidates_only_grade_widgets(self):
+        """A Grade write drops grade widgets and keeps unrelated ones"""
+        self.service.get_widgets_data([self.grade_widget, self.course_widget])
+        grade_key = self._cache_key(self.grade_widget)
+        course_key = self._cache_key(self.course_widget)
+        self.assertIsNotNone(cache.get(grade_key))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(
+                student=self.user, course=self.course, score=Decimal('95'), professor=self.user
+            )
+
+        self.assertNotEqual(self._cache_key(self.grade_widget), grade_key)
+        self.assertEqual(self._cache_key(self.course_widget), course_key)
+        self.assertIsNotNone(cache.get(course_key))
+        data = self.service.get_widget_data(self.grade_widget)
+        self.assertEqual(data['values'][0], 1)
+
+    def test_bulk_import_invalidates_widgets(self):
+        """Rows written by the bulk importer drop the cached widgets too"""
+        self.service.get_widgets_data([self.course_widget])
+        course_key = self._cache_key(self.course_widget)
+
+        importer = BulkImporter(Course)
+        with self.captureOnCommitCallbacks(execute=True):
+            list(importer.import_batches([(0, {'title': 'Imported', 'code': 'IM01', 'professor': self.user.id})]))
+
+        self.assertNotEqual(self._cache_key(self.course_widget), course_key)
+
+
+class MetricRollupTest(TestCase):
+    """Test incremental metric rollups"""
+
+    def setUp(self):
+        self.professor = User.objects.create_user(
+            username='professor1',
+            national_id='1234567890',
+            email='prof@test.com',
+            password='testpass123',
+            user_type='EMPLOYEE'
+        )
+        self.course = Course.objects.create(title='Test Course', code='TC101', professor=self.professor)
+        self.start = date(2024, 1, 1)
+        # One grade every other day for 120 days, scores cycling 50..95
+        for index in range(60):
+            grade = Grade.objects.create(
+                student=self.professor, course=self.course,
+                score=Decimal(50 + (index % 10) * 5), professor=self.professor
+            )
+            Grade.objects.filter(pk=grade.pk).update(
+                date_assigned=self.start + timedelta(days=index * 2)
+            )
+
+    def _raw(self, start, end):
+        return conditional_counts(
+            Grade.objects.filter(date_assigned__gte=start, date_assigned__lte=end),
+            {'total': None, 'passed': Q(score__gte=60)},
+            score_sum=Sum('score')
+        )
+
+    def test_plan_buckets_prefers_coarse_buckets(self):
+        """A year is covered by twelve monthly buckets"""
+        buckets = plan_buckets(date(2024, 1, 1), date(2024, 12, 31))
+        self.assertEqual(len(buckets), 12)
+        self.assertTrue(all(granularity == 'monthly' for granularity, _ in buckets))
+
+        buckets = plan_buckets(date(2024, 1, 10), date(2024, 2, 20))
+        days = sum(
+            {'daily': 1, 'weekly': 7}.get(granularity, 0) for granularity, _ in buckets
+        )
+        self.assertEqual(days, 42)
+
+    def test_rollup_totals_match_raw_rows(self):
+        """Rolled-up totals equal a direct scan for arbitrary periods"""
+        service = RollupService()
+        days = service.advance('grades', until=date(2024, 3, 31))
+        self.assertEqual(days, 91)
+        self.assertEqual(service.get_watermark('grades'), date(2024, 3, 31))
+
+        for start, end in [
+            (date(2024, 1, 1), date(2024, 3, 31)),
+            (date(2024, 1, 13), date(2024, 2, 27)),
+            (date(2024, 2, 15), date(2024, 4, 30)),  # extends past the watermark
+        ]:
+            totals = service.get_totals('grades', start, end)
+            raw = self._raw(start, end)
+            self.assertEqual(totals['row_count'], raw['total'])
+            self.assertEqual(totals['matched_count'], raw['passed'])
+            self.assertEqual(totals['value_sum'], raw['score_sum'] or 0)
+
+    def test_advance_is_incremental(self):
+        """A second advance only rolls up days after the watermark"""
+        service = RollupService()
+        service.advance('grades', until=date(2024, 1, 31))
+        self.assertEqual(service.advance('grades', until=date(2024, 1, 31)), 0)
+        self.assertEqual(service.advance('grades', until=date(2024, 2, 29)), 29)
+
+        totals = service.get_totals('grades', date(2024, 1, 1), date(2024, 2, 29), self.course.id)
+        self.assertEqual(totals['row_count'], self._raw(date(2024, 1, 1), date(2024, 2, 29))['total'])
+
+    def test_advance_picks_up_late_changes(self):
+        """Rows edited or backdated inside the late window are re-rolled"""
+        service = RollupService(late_days=7)
+        service.advance('grades', until=date(2024, 3, 31))
+
+        late = Grade.objects.filter(date_assigned__gt=date(2024, 3, 24))
+        late.filter(pk=late.first().pk).update(score=Decimal(10))
+        late.filter(pk=late.last().pk).delete()
+        grade = Grade.objects.create(
+            student=self.professor, course=self.course, score=Decimal(80), professor=self.professor
+        )
+        Grade.objects.filter(pk=grade.pk).update(date_assigned=date(2024, 3, 27))
+
+        self.assertEqual(service.advance('grades', until=date(2024, 3, 31)), 0)
+        totals = service.get_totals('grades', date(2024, 3, 1), date(2024, 3, 31))
+        raw = self._raw(date(2024, 3, 1), date(2024, 3, 31))
+        self.assertEqual(totals['row_count'], raw['total'])
+        self.assertEqual(totals['matched_count'], raw['passed'])
+        self.assertEqual(totals['value_sum'], raw['score_sum'])
+
+    def test_metric_answered_from_rollups(self):
+        """pass_rate is computed from buckets via calculate_metric"""
+        rollup_service.advance('grades', until=date(2024, 3, 31))
+        metric = AnalyticsService().calculate_metric(
+            'pass_rate', 'student_performance',
+            timezone.make_aware(datetime(2024, 1, 1)), timezone.make_aware(datetime(2024, 3, 31)),
+            {'course_id': self.course.id}
+        )
+        raw = self._raw(date(2024, 1, 1), date(2024, 3, 31))
+        self.assertEqual(metric.value['total'], raw['total'])
+        self.assertEqual(metric.value['passed'], raw['passed'])
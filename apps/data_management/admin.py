@@ -8,7 +8,9 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
-from .models import ImportExportJob, DataSyncTask, BackupSchedule, ExternalSystemIntegration
+from .models import (
+    ImportExportJob, ImportExportJobError, DataSyncTask, BackupSchedule, ExternalSystemIntegration
+)
 
 
 @admin.register(ImportExportJob)
@@ -104,6 +106,19 @@ class ImportExportJobAdmin(admin.ModelAdmin):
     statistics_display.short_description = "Statistics"
 
 
+@admin.register(ImportExportJobError)
+class ImportExportJobErrorAdmin(admin.ModelAdmin):
+    """Admin interface for per-record job errors"""
+    
+    list_display = ['job', 'record_number', 'message', 'created_at']
+    search_fields = ['message', 'job__title']
+    readonly_fields = ['job', 'record_number', 'data', 'message', 'created_at']
+    list_select_related = ['job']
+    
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(DataSyncTask)
 class DataSyncTaskAdmin(admin.ModelAdmin):
     """Admin interface for Data Sync Tasks"""
@@ -119,19 +134,20 @@ class DataSyncTaskAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description', 'source_model', 'target_model']
     readonly_fields = [
         'id', 'created_at', 'updated_at', 'last_run', 
-        'next_run', 'total_synced_records'
+        'next_run', 'total_synced_records', 'change_cursor', 'remote_cursor'
     ]
+    filter_horizontal = ['integrations']
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'description', 'sync_type')
+            'fields': ('name', 'description', 'sync_type', 'conflict_policy')
         }),
         ('Sync Configuration', {
             'fields': ('source_model', 'target_model', 'field_mapping', 'filters')
         }),
         ('External System', {
             'fields': (
-                'external_system_name', 'external_endpoint', 'auth_config'
+                'integrations', 'external_system_name', 'external_endpoint', 'auth_config'
             ),
             'classes': ('collapse',)
         }),
@@ -147,7 +163,7 @@ class DataSyncTaskAdmin(admin.ModelAdmin):
         ('Status & Monitoring', {
             'fields': (
                 'status', 'last_sync_status', 'last_sync_message', 
-                'total_synced_records'
+                'total_synced_records', 'change_cursor', 'remote_cursor'
             )
         }),
         ('Metadata', {
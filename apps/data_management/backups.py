@@ -0,0 +1,396 @@
+# ==============================================================================
+# STREAMING BACKUP ENGINE
+# موتور پشتیبان‌گیری جریانی
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import os
+import gzip
+import json
+import base64
+import datetime
+import hashlib
+import logging
+from typing import Dict, List, Any, Iterator, Optional
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Max
+from django.utils import timezone
+from .chunking import keyset_chunks
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Not copied: migrate recreates them, but with ids in a different order.
+# Columns pointing at them (group/user permissions, admin log, generic
+# relations) are restored by natural key, see ``capture_natural_keys``
+DEFAULT_EXCLUDE = ['contenttypes', 'auth.permission']
+
+EXTENSIONS = {
+    'gzip': '.ndjson.gz',
+    'zstd': '.ndjson.zst',
+    'none': '.ndjson',
+}
+
+
+class BackupEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder that keeps full microsecond precision on times (the Django
+    encoder rounds to milliseconds) and stores binary columns as base64.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        if isinstance(o, (bytes, memoryview)):
+            return base64.b64encode(bytes(o)).decode('ascii')
+        return super().default(o)
+
+
+class HashingWriter:
+    """Count and checksum the uncompressed bytes passed to a stream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.sha256.update(data)
+        self.size += len(data)
+        self.stream.write(data)
+
+
+def resolve_compression(compression: str) -> str:
+    """Return a usable compression name, falling back from zstd to gzip"""
+    if compression == 'zstd' and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to gzip backups")
+        return 'gzip'
+    if compression not in EXTENSIONS:
+        raise ValueError(f"Unsupported backup compression: {compression}")
+    return compression
+
+
+def open_compressed(path: str, mode: str, compression: str):
+    """Open ``path`` for binary reading or writing through ``compression``"""
+    if compression == 'gzip':
+        # Level 6 is much faster than the default 9 at nearly the same ratio
+        return gzip.open(path, mode, compresslevel=6) if mode.startswith('w') else gzip.open(path, mode)
+    if compression == 'zstd':
+        if mode.startswith('w'):
+            return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, mode)
+
+
+def model_label(model) -> str:
+    return model._meta.label_lower
+
+
+def backup_models(exclude: List[str] = None, include: List[str] = None) -> List:
+    """
+    Concrete models to back up, including auto-created many-to-many tables.
+
+    ``exclude`` and ``include`` take app labels (``sessions``), model labels
+    (``auth.permission``) or table names, matched case-insensitively.
+    """
+    exclude = {name.lower() for name in (exclude or [])}
+    include = {name.lower() for name in (include or [])}
+
+    selected = []
+    for model in apps.get_models(include_auto_created=True):
+        opts = model._meta
+        if opts.proxy or not opts.managed:
+            continue
+        names = {opts.app_label, model_label(model), opts.db_table.lower()}
+        if names & exclude:
+            continue
+        if include and not names & include:
+            continue
+        selected.append(model)
+    return selected
+
+
+def model_dependencies(model) -> List[str]:
+    """Labels of the models ``model`` holds foreign keys to"""
+    dependencies = []
+    for field in model._meta.concrete_fields:
+        if field.is_relation and field.related_model is not None and field.related_model is not model:
+            label = model_label(field.related_model._meta.concrete_model)
+            if label not in dependencies:
+                dependencies.append(label)
+    return dependencies
+
+
+class BackupWriter:
+    """
+    Write a backup as one compressed NDJSON file per table plus a manifest.
+
+    Tables are paged by primary key with ``values_list`` so only one chunk
+    of rows is in memory at a time, and each row is encoded as a compact
+    JSON array (field names are recorded once in the manifest) and written
+    straight through the compressor. The manifest records row counts and a
+    SHA-256 of every table's uncompressed contents.
+    """
+
+    def __init__(self, directory: str, compression: str = 'gzip', chunk_size: int = 2000):
+        self.directory = directory
+        self.compression = resolve_compression(compression)
+        self.chunk_size = chunk_size
+        self.tables = []
+        os.makedirs(directory, exist_ok=True)
+
+    def write_table(self, model, queryset=None) -> Dict[str, Any]:
+        """Stream the rows of ``queryset`` (default: every row of ``model``)"""
+        if queryset is None:
+            queryset = model._default_manager.all()
+        fields = [field.attname for field in model._meta.concrete_fields]
+        filename = f"{model_label(model)}{EXTENSIONS[self.compression]}"
+        encoder = BackupEncoder(ensure_ascii=False, separators=(',', ':'))
+
+        rows = 0
+        with open_compressed(os.path.join(self.directory, filename), 'wb', self.compression) as stream:
+            writer = HashingWriter(stream)
+            for chunk in keyset_chunks(queryset.values_list(*fields), self.chunk_size):
+                writer.write(''.join(encoder.encode(row) + '\n' for row in chunk).encode('utf-8'))
+                rows += len(chunk)
+
+        entry = {
+            'model': model_label(model),
+            'db_table': model._meta.db_table,
+            'file': filename,
+            'fields': fields,
+            'depends_on': model_dependencies(model),
+            'rows': rows,
+            'sha256': writer.sha256.hexdigest(),
+            'bytes': writer.size,
+        }
+        self.tables.append(entry)
+        return entry
+
+    def write_manifest(self, **extra) -> Dict[str, Any]:
+        """Write ``manifest.json`` describing every table written"""
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'created_at': timezone.now().isoformat(),
+            'compression': self.compression,
+            'tables': self.tables,
+            'total_rows': sum(table['rows'] for table in self.tables),
+        }
+        manifest.update(extra)
+
+        with open(os.path.join(self.directory, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, cls=BackupEncoder, indent=2)
+        return manifest
+
+
+def read_manifest(directory: str) -> Dict[str, Any]:
+    """Load the manifest of a backup directory"""
+    with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_table(directory: str, manifest: Dict[str, Any], entry: Dict[str, Any],
+               verify: bool = True) -> Iterator[List[Any]]:
+    """
+    Yield the rows of one table of a backup as value lists in
+    ``entry['fields']`` order, checking the checksum once fully read.
+    """
+    digest = hashlib.sha256()
+    path = os.path.join(directory, entry['file'])
+    with open_compressed(path, 'rb', manifest['compression']) as stream:
+        for line in _iter_lines(stream):
+            digest.update(line)
+            yield json.loads(line)
+
+    if verify and digest.hexdigest() != entry['sha256']:
+        raise ValueError(f"Checksum mismatch for {entry['file']}")
+
+
+def _iter_lines(stream, read_size: int = 1024 * 1024) -> Iterator[bytes]:
+    # zstd stream readers have no line iteration, so split buffered reads
+    pending = b''
+    while True:
+        block = stream.read(read_size)
+        if not block:
+            break
+        pending += block
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if pending:
+        yield pending
+
+
+def backup_size(directory: str) -> int:
+    """Total size in bytes of the files of a backup"""
+    if os.path.isfile(directory):
+        return os.path.getsize(directory)
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory)
+    )
+
+
+def is_append_only(model) -> bool:
+    """Rows are only ever inserted: auto-created many-to-many tables and ``BACKUP_APPEND_ONLY_MODELS``"""
+    if model._meta.auto_created:
+        return True
+    labels = {label.lower() for label in getattr(settings, 'BACKUP_APPEND_ONLY_MODELS', [])}
+    return model_label(model) in labels
+
+
+def watermark_field(model) -> Optional[str]:
+    """
+    Column used to find rows changed since an earlier backup.
+
+    ``updated_at`` catches both new and modified rows. ``created_at`` or an
+    integer ``pk`` only finds new rows, so they are used for append-only
+    tables alone; ``None`` means the table has to be copied in full every
+    time.
+    """
+    candidates = ['updated_at']
+    if is_append_only(model):
+        candidates.append('created_at')
+    for name in candidates:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if isinstance(field, models.DateField) and field.concrete:
+            return name
+
+    if is_append_only(model) and isinstance(model._meta.pk, models.IntegerField):
+        return 'pk'
+    return None
+
+
+def capture_natural_keys() -> Dict[str, Dict[str, List[str]]]:
+    """
+    Natural keys of content types (``[app_label, model]``) and permissions
+    (``[app_label, model, codename, name]``) by id, stored in the manifest
+    so restores can map the ids of excluded tables onto the target database.
+    """
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Permission = apps.get_model('auth', 'Permission')
+    return {
+        'contenttypes': {
+            str(pk): [app_label, model]
+            for pk, app_label, model in ContentType.objects.values_list('pk', 'app_label', 'model')
+        },
+        'permissions': {
+            str(pk): [app_label, model, codename, name]
+            for pk, app_label, model, codename, name in Permission.objects.values_list(
+                'pk', 'content_type__app_label', 'content_type__model', 'codename', 'name'
+            )
+        },
+    }
+
+
+def capture_watermarks(models_list: List, started_at) -> Dict[str, Dict[str, Any]]:
+    """
+    Record where each table stands as a backup starts.
+
+    Timestamp watermarks are the start time itself; primary-key watermarks
+    are the current maximum key, read before any rows are copied so rows
+    added during the backup are picked up (again) by the next one.
+    """
+    watermarks = {}
+    for model in models_list:
+        field = watermark_field(model)
+        if field == 'pk':
+            value = model._default_manager.aggregate(value=Max('pk'))['value']
+        elif field and not isinstance(model._meta.get_field(field), models.DateTimeField):
+            value = started_at.date()
+        else:
+            value = started_at if field else None
+        watermarks[model_label(model)] = {'field': field, 'value': value}
+    return watermarks
+
+
+def changed_since(model, watermark: Optional[Dict[str, Any]]):
+    """
+    Rows of ``model`` created or modified after ``watermark``.
+
+    Timestamp comparisons are widened by ``BACKUP_WATERMARK_OVERLAP``
+    seconds so rows saved by transactions still open when the previous
+    backup started are not missed; the resulting duplicates are harmless
+    because restores upsert by primary key. Primary-key watermarks only
+    see new rows, never updates.
+    """
+    queryset = model._default_manager.all()
+    if not watermark or watermark.get('value') is None or watermark.get('field') is None:
+        return queryset
+
+    field = watermark['field']
+    if field == 'pk':
+        return queryset.filter(pk__gt=watermark['value'])
+
+    value = model._meta.get_field(field).to_python(watermark['value'])
+    if isinstance(model._meta.get_field(field), models.DateTimeField):
+        value -= datetime.timedelta(seconds=getattr(settings, 'BACKUP_WATERMARK_OVERLAP', 300))
+    return queryset.filter(**{f"{field}__gte": value})
+
+
+def run_backup(directory: str, models_list: List, compression: str = 'gzip',
+               parent: Optional[Dict[str, Any]] = None, **extra) -> Dict[str, Any]:
+    """
+    Back up ``models_list`` into ``directory`` and return the manifest.
+
+    With a ``parent`` manifest only rows changed since its watermarks are
+    written, and the new manifest links back to it by name.
+    """
+    started_at = timezone.now()
+    watermarks = capture_watermarks(models_list, started_at)
+    parent_marks = parent['watermarks'] if parent else {}
+
+    if parent:
+        full_copies = [label for label, mark in watermarks.items() if mark['field'] is None]
+        if full_copies:
+            logger.info(f"Copying {len(full_copies)} tables in full (no updated_at): {', '.join(full_copies)}")
+
+    writer = BackupWriter(directory, compression)
+    for model in models_list:
+        queryset = changed_since(model, parent_marks.get(model_label(model))) if parent else None
+        writer.write_table(model, queryset)
+
+    return writer.write_manifest(
+        name=os.path.basename(os.path.normpath(directory)),
+        parent=parent['name'] if parent else None,
+        started_at=started_at,
+        watermarks=watermarks,
+        natural_keys=capture_natural_keys(),
+        **extra
+    )
+
+
+def resolve_chain(directory: str) -> List[str]:
+    """
+    Directories needed to restore the backup at ``directory``, oldest
+    first: its full base backup followed by each backup applied on top.
+    Parents are looked up next to ``directory`` by name.
+    """
+    root = os.path.dirname(os.path.normpath(directory))
+    chain = [directory]
+    manifest = read_manifest(directory)
+
+    while manifest.get('parent'):
+        parent_dir = os.path.join(root, manifest['parent'])
+        if not os.path.isfile(os.path.join(parent_dir, MANIFEST_NAME)):
+            raise FileNotFoundError(f"Backup {manifest['name']} needs missing parent {manifest['parent']}")
+        chain.append(parent_dir)
+        manifest = read_manifest(parent_dir)
+
+    chain.reverse()
+    return chain
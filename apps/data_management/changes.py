@@ -0,0 +1,170 @@
+# ==============================================================================
+# CHANGE DATA CAPTURE
+# ثبت تغییرات داده برای همگام‌سازی
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import time
+import logging
+from datetime import timedelta
+from typing import Dict, Any, Iterable, Iterator
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.db.models.signals import ModelSignal
+from django.utils import timezone
+from .models import ChangeLogEntry, DataSyncTask
+
+logger = logging.getLogger(__name__)
+
+# Models of this app are never watched (the log must not log itself)
+UNWATCHED_APPS = {'data_management', 'contenttypes', 'sessions', 'admin'}
+
+
+def normalize_label(label: str) -> str:
+    """Lower-case ``app_label.ModelName`` as used in the change log"""
+    return apps.get_model(label)._meta.label_lower
+
+# Sent by bulk writers (imports, restores, sync) after rows are written
+# without ``save()``, with ``pks`` and ``operation`` ('create'/'update'), so
+# the receivers that ``post_save`` would have reached still see the rows
+bulk_rows_written = ModelSignal(use_caching=True)
+
+
+class ChangeFeed:
+    """
+    Append-only change log feeding incremental sync tasks.
+
+    ``post_save``/``post_delete`` receivers append one ``ChangeLogEntry``
+    per change to a watched model, inside the transaction making the
+    change. Sync tasks read the log from their persisted cursor, so a run
+    only touches rows changed since the previous one. Bulk operations
+    (``bulk_create``, ``update()``) send no model signals; code using them
+    sends ``bulk_rows_written``, which records the rows of watched models
+    (the importer, the restorer and two-way sync all do).
+    """
+
+    def __init__(self, refresh_interval: float = 60.0):
+        self.refresh_interval = refresh_interval
+        self._watched = None
+        self._loaded_at = 0.0
+        self._tables_ready = False
+
+    def watched_models(self) -> set:
+        """Labels watched by any sync task, refreshed every ``refresh_interval`` seconds"""
+        if self._watched is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            labels = set(getattr(settings, 'DATA_SYNC_WATCHED_MODELS', []))
+            if self._ready():
+                labels.update(
+                    DataSyncTask.objects.exclude(status='disabled').values_list('source_model', flat=True)
+                )
+            watched = set()
+            for label in labels:
+                try:
+                    watched.add(normalize_label(label))
+                except (LookupError, ValueError):
+                    logger.warning(f"Ignoring unknown sync source model: {label}")
+            self._watched = watched
+            self._loaded_at = time.monotonic()
+        return self._watched
+
+    def _ready(self) -> bool:
+        # Saves can happen before this app is migrated (e.g. during migrate)
+        if not self._tables_ready:
+            self._tables_ready = DataSyncTask._meta.db_table in connection.introspection.table_names()
+        return self._tables_ready
+
+    def reset(self):
+        """Reload the watched models on next use"""
+        self._watched = None
+
+    def is_watched(self, model) -> bool:
+        opts = model._meta
+        if opts.app_label in UNWATCHED_APPS:
+            return False
+        return opts.label_lower in self.watched_models()
+
+    def record_changes(self, model, pks: Iterable[Any], operation: str):
+        """Append change entries for ``pks`` of ``model`` in one insert"""
+        ChangeLogEntry.objects.bulk_create([
+            ChangeLogEntry(model_label=model._meta.label_lower, object_pk=str(pk), operation=operation)
+            for pk in pks
+        ])
+
+    def latest_id(self) -> int:
+        """Id of the newest log entry (0 when the log is empty)"""
+        return ChangeLogEntry.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+    def pages(self, label: str, after_id: int, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the changes to ``label`` after ``after_id`` one page at a time.
+
+        Each page is ``{'changed': [pk, ...], 'deleted': [pk, ...], 'cursor': id}``
+        with the entries of the page collapsed to the last operation per row.
+        Entries newer than ``DATA_SYNC_CHANGE_LAG`` seconds are left for the
+        next run, giving transactions that took their ids earlier time to
+        commit before the cursor moves past them.
+        """
+        model = apps.get_model(label)
+        to_pk = model._meta.pk.to_python
+        horizon = timezone.now() - timedelta(seconds=getattr(settings, 'DATA_SYNC_CHANGE_LAG', 5))
+        entries = ChangeLogEntry.objects.filter(
+            model_label=model._meta.label_lower
+        ).order_by('id').values_list('id', 'object_pk', 'operation', 'changed_at')
+
+        cursor = after_id
+        while True:
+            page = list(entries.filter(id__gt=cursor)[:page_size])
+
+            # Stop at the first entry that is too recent, never skip past it
+            last_operation = {}
+            reached_horizon = False
+            for entry_id, object_pk, operation, changed_at in page:
+                if changed_at > horizon:
+                    reached_horizon = True
+                    break
+                last_operation.pop(object_pk, None)
+                last_operation[object_pk] = operation
+                cursor = entry_id
+
+            if last_operation:
+                yield {
+                    'changed': [to_pk(pk) for pk, op in last_operation.items() if op != 'delete'],
+                    'deleted': [to_pk(pk) for pk, op in last_operation.items() if op == 'delete'],
+                    'cursor': cursor,
+                }
+
+            if reached_horizon or len(page) < page_size:
+                return
+
+    def prune(self) -> int:
+        """Delete entries every sync task watching their model has consumed"""
+        deleted = 0
+        cursors = {}
+        for source_model, cursor in DataSyncTask.objects.exclude(status='disabled').values_list(
+            'source_model', 'change_cursor'
+        ):
+            try:
+                label = normalize_label(source_model)
+            except (LookupError, ValueError):
+                continue
+            # A task that never ran (null cursor) starts with a full sync
+            # and needs nothing from the log
+            task_cursors = cursors.setdefault(label, [])
+            if cursor is not None:
+                task_cursors.append(cursor)
+
+        for label in ChangeLogEntry.objects.values_list('model_label', flat=True).distinct():
+            queryset = ChangeLogEntry.objects.filter(model_label=label)
+            if label in cursors:
+                if not cursors[label]:
+                    # Leave the log alone until a first run has set a cursor
+                    continue
+                queryset = queryset.filter(id__lte=min(cursors[label]))
+            deleted += queryset.delete()[0]
+        return deleted
+
+
+# Initialize change feed
+change_feed = ChangeFeed()
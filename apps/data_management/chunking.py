@@ -0,0 +1,65 @@
+# ==============================================================================
+# KEYSET CHUNK ITERATION
+# پیمایش دسته‌ای بر اساس کلید اصلی
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+from typing import Iterator, List, Any
+from django.db.models.query import ValuesIterable, ValuesListIterable, FlatValuesListIterable
+
+
+def _key_getter(queryset):
+    """Return a function reading the primary key from a row of ``queryset``"""
+    pk_name = queryset.model._meta.pk.attname
+    iterable_class = queryset._iterable_class
+
+    if iterable_class in (ValuesIterable, ValuesListIterable, FlatValuesListIterable):
+        fields = list(queryset._fields)
+        if not fields and iterable_class is ValuesIterable:
+            # Plain values() selects every concrete field by attname
+            return lambda row: row[pk_name]
+        for name in (pk_name, 'pk'):
+            if name not in fields:
+                continue
+            if iterable_class is ValuesIterable:
+                return lambda row: row[name]
+            if iterable_class is FlatValuesListIterable:
+                return lambda row: row
+            index = fields.index(name)
+            return lambda row: row[index]
+        raise ValueError("values() querysets must include the primary key for keyset iteration")
+
+    return lambda obj: obj.pk
+
+
+def keyset_chunks(queryset, chunk_size: int = 1000) -> Iterator[List[Any]]:
+    """
+    Yield lists of rows from ``queryset`` in primary-key order.
+
+    Each chunk is fetched with ``WHERE pk > <last pk> ORDER BY pk LIMIT n``
+    instead of an OFFSET, so every query costs the same regardless of how
+    far into the table it is, and rows inserted or deleted during iteration
+    never cause others to be skipped or repeated. Works with model, values()
+    and values_list() querysets (the latter two must select the primary key).
+    """
+    queryset = queryset.order_by('pk')
+    get_key = _key_getter(queryset)
+    last_key = None
+
+    while True:
+        page = queryset if last_key is None else queryset.filter(pk__gt=last_key)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+
+        yield chunk
+
+        if len(chunk) < chunk_size:
+            return
+        last_key = get_key(chunk[-1])
+
+
+def keyset_iterator(queryset, chunk_size: int = 1000) -> Iterator[Any]:
+    """Iterate rows one at a time, fetching them in keyset chunks"""
+    for chunk in keyset_chunks(queryset, chunk_size):
+        yield from chunk
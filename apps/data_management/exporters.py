@@ -0,0 +1,120 @@
+# ==============================================================================
+# STREAMING EXPORT WRITERS
+# نویسنده‌های جریانی خروجی داده
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import csv
+import io
+import json
+import uuid
+from typing import Iterable, List, Dict, Any
+from django.core.serializers.json import DjangoJSONEncoder
+from openpyxl import Workbook
+
+
+def export_value(value):
+    """Convert a database value to something every writer can store"""
+    if hasattr(value, 'isoformat'):  # Date/time fields
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class ExportWriter:
+    """
+    Base class for streaming export writers.
+
+    Writers receive rows incrementally and write them straight to a binary
+    stream, so memory use does not grow with the number of rows exported.
+    """
+
+    def __init__(self, stream, fieldnames: List[str], **options):
+        self.stream = stream
+        self.fieldnames = fieldnames
+        self.options = options
+
+    def open(self):
+        """Write any header before the first row"""
+
+    def write_rows(self, rows: Iterable[tuple]):
+        """Write value tuples in ``fieldnames`` order"""
+        raise NotImplementedError
+
+    def write_objects(self, objects: Iterable[Dict[str, Any]]):
+        """Write serialized objects (used by formats that keep object shape)"""
+        raise NotImplementedError
+
+    def close(self):
+        """Flush and finish the output without closing the underlying stream"""
+
+
+class CSVExportWriter(ExportWriter):
+    """Stream rows as UTF-8 CSV (``header=False`` omits the header row)"""
+
+    def open(self):
+        self.text = io.TextIOWrapper(self.stream, encoding='utf-8', newline='', write_through=True)
+        self.writer = csv.writer(self.text)
+        if self.options.get('header', True):
+            self.writer.writerow(self.fieldnames)
+
+    def write_rows(self, rows):
+        self.writer.writerows(
+            ['' if value is None else export_value(value) for value in row]
+            for row in rows
+        )
+
+    def close(self):
+        self.text.flush()
+        # Leave the binary stream open for the caller
+        self.text.detach()
+
+
+class JSONExportWriter(ExportWriter):
+    """
+    Stream serialized objects as a JSON array, or as NDJSON (one object per
+    line) when ``mode='ndjson'``.
+    """
+
+    def open(self):
+        self.ndjson = self.options.get('mode') == 'ndjson'
+        self.first = True
+        if not self.ndjson:
+            self.stream.write(b'[')
+
+    def write_objects(self, objects):
+        for obj in objects:
+            encoded = json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8')
+            if self.ndjson:
+                self.stream.write(encoded + b'\n')
+            else:
+                self.stream.write(encoded if self.first else b',\n' + encoded)
+            self.first = False
+
+    def close(self):
+        if not self.ndjson:
+            self.stream.write(b']')
+
+
+class ExcelExportWriter(ExportWriter):
+    """Stream rows into an openpyxl write-only workbook"""
+
+    def open(self):
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(self.options.get('sheet_name', 'Data'))
+        self.sheet.append(self.fieldnames)
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.sheet.append([export_value(value) for value in row])
+
+    def close(self):
+        self.workbook.save(self.stream)
+
+
+EXPORT_WRITERS = {
+    'csv': CSVExportWriter,
+    'json': JSONExportWriter,
+    'excel': ExcelExportWriter,
+}
@@ -0,0 +1,183 @@
+# ==============================================================================
+# BULK IMPORT ENGINE
+# موتور ورود دسته‌ای داده‌ها
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import logging
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+from django.db import connection, transaction, models
+from django.db.models import Max
+from .changes import bulk_rows_written
+
+logger = logging.getLogger(__name__)
+
+
+class BulkImporter:
+    """
+    Import mapped records in batches with ``bulk_create``.
+
+    Each batch is validated in Python, written with a single statement inside
+    its own atomic block (a savepoint when called within a transaction), and
+    only when that fails are its rows retried one by one to isolate the bad
+    ones. With ``upsert_key`` set, rows whose natural key already exists are
+    updated in place instead of inserted.
+
+    ``bulk_create`` skips ``save()`` and its signals, so every written batch
+    sends ``bulk_rows_written`` instead. Without an upsert key the pks come
+    from the insert itself; on backends that don't return them (MySQL) the
+    batch is selected again by a unique field, or else by auto-increment
+    pks above the maximum read before the insert.
+    """
+
+    def __init__(self, model_class, batch_size: int = 500,
+                 upsert_key: Optional[str] = None, update_fields: Optional[List[str]] = None):
+        self.model_class = model_class
+        self.batch_size = batch_size
+        self.upsert_key = upsert_key
+        self.update_fields = update_fields
+
+        opts = model_class._meta
+        self.fields = {}
+        for field in opts.concrete_fields:
+            self.fields[field.name] = field
+            self.fields[field.attname] = field
+        self.relation_fields = [
+            field.name for field in opts.concrete_fields if field.is_relation
+        ]
+
+        if upsert_key:
+            key_field = self.fields.get(upsert_key)
+            if key_field is None or not (key_field.unique or key_field.primary_key):
+                raise ValueError(f"Upsert key '{upsert_key}' must be a unique field of {opts.label}")
+
+    def import_batches(self, records: Iterable[Tuple[int, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """
+        Import ``(index, data)`` pairs, yielding one result per batch.
+
+        Each result has ``processed`` and ``success`` counts and an ``errors``
+        list of ``(index, message)`` tuples.
+        """
+        batch = []
+        for item in records:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield self._import_batch(batch)
+                batch = []
+        if batch:
+            yield self._import_batch(batch)
+
+    def build_instance(self, data: Dict[str, Any]):
+        """Build and field-validate a model instance from mapped data"""
+        kwargs = {}
+        for name, value in data.items():
+            field = self.fields.get(name)
+            if field is None:
+                raise ValueError(f"Unknown field '{name}'")
+            if field.is_relation and not isinstance(value, models.Model):
+                # Raw ids go straight to the column, no lookup per row
+                kwargs[field.attname] = value
+            else:
+                kwargs[field.name] = value
+
+        instance = self.model_class(**kwargs)
+        # Relations are left to the database constraint so validation
+        # doesn't issue an existence query per row
+        instance.clean_fields(exclude=self.relation_fields)
+        return instance
+
+    def _import_batch(self, batch: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        instances = []
+        errors = []
+        supplied = set()
+
+        for index, data in batch:
+            try:
+                instance = self.build_instance(data)
+            except Exception as e:
+                errors.append((index, str(e)))
+                continue
+            instances.append((index, instance, instance.pk))
+            supplied.update(self.fields[name].name for name in data)
+
+        success = 0
+        if instances:
+            try:
+                with transaction.atomic():
+                    self._write([instance for _, instance, _ in instances], supplied)
+                success = len(instances)
+            except Exception as e:
+                logger.warning(f"Bulk write of {len(instances)} rows failed, isolating rows: {e}")
+                for index, instance, original_pk in instances:
+                    # Undo any primary key assigned by the failed bulk insert
+                    instance.pk = original_pk
+                    instance._state.adding = True
+                    try:
+                        with transaction.atomic():
+                            self._write([instance], supplied)
+                        success += 1
+                    except Exception as row_error:
+                        errors.append((index, str(row_error)))
+
+        errors.sort(key=lambda error: error[0])
+        return {'processed': len(batch), 'success': success, 'errors': errors}
+
+    def _write(self, instances: List[models.Model], supplied: set):
+        if not self.upsert_key:
+            floor = None
+            if not connection.features.can_return_rows_from_bulk_insert:
+                floor = self.model_class.objects.aggregate(floor=Max('pk'))['floor'] or 0
+            self.model_class.objects.bulk_create(instances)
+            pks = [instance.pk for instance in instances]
+            if None in pks:
+                pks = self._recover_pks(instances, floor)
+            self._written(pks, 'create')
+            return
+
+        key_name = self.fields[self.upsert_key].name
+        self.model_class.objects.bulk_create(
+            instances,
+            update_conflicts=True,
+            # MySQL upserts on any unique key and rejects an explicit target
+            unique_fields=[key_name] if connection.features.supports_update_conflicts_with_target else None,
+            update_fields=self._update_fields(supplied, key_name),
+        )
+        # Upserts don't return pks, and the rows may have existed already
+        keys = [getattr(instance, self.fields[self.upsert_key].attname) for instance in instances]
+        pks = self.model_class.objects.filter(**{f'{key_name}__in': keys}).values_list('pk', flat=True)
+        self._written(list(pks), 'update')
+
+    def _recover_pks(self, instances: List[models.Model], floor: Optional[int]) -> List[Any]:
+        """Pks of inserted rows the backend did not return"""
+        queryset = self.model_class.objects.all()
+        for field in self.model_class._meta.concrete_fields:
+            if not field.unique or field.primary_key:
+                continue
+            keys = [getattr(instance, field.attname) for instance in instances]
+            if None not in keys:
+                return list(queryset.filter(**{f'{field.attname}__in': keys}).values_list('pk', flat=True))
+
+        # Rows this transaction inserted got ids above any it could read
+        # before; rows other writers added meanwhile are harmless extras
+        if floor is not None and isinstance(self.model_class._meta.pk, models.AutoField):
+            return list(queryset.filter(pk__gt=floor).values_list('pk', flat=True))
+        logger.warning(f"Could not identify {len(instances)} rows inserted into {self.model_class._meta.label}")
+        return []
+
+    def _written(self, pks: List[Any], operation: str):
+        # Inside the batch's transaction, like post_save receivers; sent even
+        # without pks so receivers that only need the model still run
+        bulk_rows_written.send(sender=self.model_class, pks=pks, operation=operation)
+
+    def _update_fields(self, supplied: set, key_name: str) -> List[str]:
+        """Fields overwritten on conflict: those supplied plus auto_now ones"""
+        if self.update_fields:
+            return list(self.update_fields)
+
+        names = []
+        for field in self.model_class._meta.concrete_fields:
+            if field.primary_key or field.name == key_name:
+                continue
+            if field.name in supplied or getattr(field, 'auto_now', False):
+                names.append(field.name)
+        return names
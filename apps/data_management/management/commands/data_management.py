@@ -7,8 +7,13 @@ Django management command for data management operations
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from apps.data_management.models import ImportExportJob, DataSyncTask, BackupSchedule
-from apps.data_management.services import import_export_service, backup_service, sync_service
+from apps.data_management.services import (
+    BackupService, import_export_service, backup_service, sync_service
+)
+from apps.data_management.changes import change_feed
 import logging
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -35,9 +40,17 @@ class Command(BaseCommand):
 
         # Backup command
         backup_parser = subparsers.add_parser('backup', help='Create backup')
-        backup_parser.add_argument('--type', choices=['full', 'incremental', 'differential'], default='full', help='Backup type')
-        backup_parser.add_argument('--output', help='Backup output path')
-        backup_parser.add_argument('--compress', action='store_true', help='Compress backup')
+        backup_parser.add_argument('--schedule', required=True, help='Backup schedule ID or name')
+        backup_parser.add_argument('--type', choices=['full', 'incremental', 'differential'], help='Backup type (default: the schedule\'s type)')
+        backup_parser.add_argument('--output', help='Backup directory (default: BACKUP_DIR)')
+
+        # Restore command
+        restore_parser = subparsers.add_parser('restore', help='Restore a backup')
+        restore_parser.add_argument('--backup', required=True, help='Backup name (directory under the backup directory)')
+        restore_parser.add_argument('--backup-dir', help='Backup directory (default: BACKUP_DIR)')
+        restore_parser.add_argument('--workers', type=int, help='Tables restored in parallel (default: BACKUP_RESTORE_WORKERS)')
+        restore_parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert (default: 5000)')
+        restore_parser.add_argument('--no-chain', action='store_true', help='Restore only this backup, not the backups it builds on')
 
         # Sync command
         sync_parser = subparsers.add_parser('sync', help='Sync data')
@@ -67,6 +80,8 @@ class Command(BaseCommand):
                 self.handle_export(options)
             elif action == 'backup':
                 self.handle_backup(options)
+            elif action == 'restore':
+                self.handle_restore(options)
             elif action == 'sync':
                 self.handle_sync(options)
             elif action == 'status':
@@ -163,27 +178,69 @@ class Command(BaseCommand):
         """Handle backup creation"""
         self.stdout.write(self.style.SUCCESS('🔄 Starting backup...'))
         
-        backup_type = options['type']
+        backup_type = options.get('type')
         output_path = options.get('output')
-        compress = options.get('compress', False)
         
         try:
-            # Use the service to create backup
-            result = backup_service.create_backup(
-                backup_type=backup_type,
-                output_path=output_path,
-                compress=compress
-            )
+            schedule = self.get_schedule(options['schedule'])
+            service = BackupService(backup_dir=output_path) if output_path else backup_service
             
+            if not service.create_backup(schedule, backup_type=backup_type):
+                raise CommandError(f'Backup of schedule "{schedule.name}" failed')
+            
+            latest = service.list_backups(schedule)[0]
             self.stdout.write(
-                self.style.SUCCESS(f'✅ Backup completed. File: {result.get("file_path")}')
+                self.style.SUCCESS(f'✅ {latest["type"].capitalize()} backup completed. File: {latest["filename"]}')
             )
-            self.stdout.write(f'📊 Size: {result.get("size_mb", 0):.2f} MB')
+            self.stdout.write(f'📊 Size: {latest["size"] / (1024 * 1024):.2f} MB, {latest["rows"]} rows')
             
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'❌ Backup failed: {e}'))
             raise
 
+    def handle_restore(self, options):
+        """Handle backup restore"""
+        self.stdout.write(self.style.SUCCESS('🔄 Starting restore...'))
+        
+        backup_dir = options.get('backup_dir')
+        service = BackupService(backup_dir=backup_dir) if backup_dir else backup_service
+        started = time.monotonic()
+        
+        try:
+            totals = service.restore_backup(
+                options['backup'],
+                chain=not options.get('no_chain', False),
+                workers=options.get('workers'),
+                batch_size=options['batch_size']
+            )
+            
+            for label, rows in sorted(totals.items()):
+                if rows:
+                    self.stdout.write(f'  {label}: {rows} rows')
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'✅ Restore completed. {sum(totals.values())} rows into {len(totals)} tables '
+                    f'in {time.monotonic() - started:.1f}s'
+                )
+            )
+            
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ Restore failed: {e}'))
+            raise
+
+    def get_schedule(self, identifier):
+        """Find a backup schedule by ID or name"""
+        schedules = BackupSchedule.objects.filter(name=identifier)
+        try:
+            schedules = schedules | BackupSchedule.objects.filter(id=uuid.UUID(identifier))
+        except ValueError:
+            pass
+        
+        schedule = schedules.first()
+        if schedule is None:
+            raise CommandError(f'Backup schedule not found: {identifier}')
+        return schedule
+
     def handle_sync(self, options):
         """Handle data synchronization"""
         self.stdout.write(self.style.SUCCESS('🔄 Starting data sync...'))
@@ -306,5 +363,8 @@ class Command(BaseCommand):
         
         self.stdout.write(f'  ✅ Cleaned up {job_count} old import/export jobs')
         
-        # Could add more cleanup logic here
+        # Change log entries every sync task has consumed
+        entry_count = change_feed.prune()
+        self.stdout.write(f'  ✅ Cleaned up {entry_count} consumed change log entries')
+        
         self.stdout.write(self.style.SUCCESS('🧹 Cleanup completed'))
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:30
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportExportJobError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_number', models.IntegerField()),
+                ('data', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='record_errors', to='data_management.importexportjob')),
+            ],
+            options={
+                'verbose_name': 'Import/Export Job Error',
+                'verbose_name_plural': 'Import/Export Job Errors',
+                'db_table': 'data_import_export_job_errors',
+                'ordering': ['job', 'record_number'],
+                'indexes': [models.Index(fields=['job', 'record_number'], name='data_import_job_id_c88513_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0002_job_record_errors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasynctask',
+            name='change_cursor',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model_label', models.CharField(max_length=100)),
+                ('object_pk', models.CharField(max_length=64)),
+                ('operation', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=10)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Change Log Entry',
+                'verbose_name_plural': 'Change Log Entries',
+                'db_table': 'data_change_log',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['model_label', 'id'], name='data_change_model_l_2a81a9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0003_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasynctask',
+            name='integrations',
+            field=models.ManyToManyField(blank=True, related_name='sync_tasks', to='data_management.externalsystemintegration'),
+        ),
+    ]
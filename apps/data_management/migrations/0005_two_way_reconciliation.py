@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0004_sync_task_integrations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasynctask',
+            name='conflict_policy',
+            field=models.CharField(choices=[('last_writer_wins', 'Last Writer Wins'), ('local_priority', 'Local Priority'), ('remote_priority', 'Remote Priority'), ('field_merge', 'Field-level Merge')], default='last_writer_wins', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='datasynctask',
+            name='remote_cursor',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='SyncRecordVersion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('object_pk', models.CharField(max_length=64)),
+                ('row_hash', models.CharField(max_length=32)),
+                ('field_hashes', models.JSONField(blank=True, default=dict)),
+                ('local_version', models.PositiveIntegerField(default=0)),
+                ('remote_version', models.PositiveIntegerField(default=0)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='record_versions', to='data_management.datasynctask')),
+            ],
+            options={
+                'verbose_name': 'Sync Record Version',
+                'verbose_name_plural': 'Sync Record Versions',
+                'db_table': 'data_sync_record_versions',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='syncrecordversion',
+            constraint=models.UniqueConstraint(fields=('task', 'object_pk'), name='unique_sync_record_version'),
+        ),
+    ]
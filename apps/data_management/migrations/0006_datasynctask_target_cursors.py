@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0005_two_way_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasynctask',
+            name='target_cursors',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
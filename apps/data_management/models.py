@@ -138,6 +138,28 @@ class ImportExportJob(models.Model):
         self.save(update_fields=['status', 'completed_at', 'errors'])
 
 
+class ImportExportJobError(models.Model):
+    """Append-only store of per-record errors raised while running a job"""
+
+    job = models.ForeignKey(ImportExportJob, on_delete=models.CASCADE, related_name='record_errors')
+    record_number = models.IntegerField()
+    data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'data_import_export_job_errors'
+        verbose_name = 'Import/Export Job Error'
+        verbose_name_plural = 'Import/Export Job Errors'
+        ordering = ['job', 'record_number']
+        indexes = [
+            models.Index(fields=['job', 'record_number']),
+        ]
+
+    def __str__(self):
+        return f"Record {self.record_number}: {self.message[:50]}"
+
+
 class DataSyncTask(models.Model):
     """Model for data synchronization tasks"""
     
@@ -155,12 +177,22 @@ class DataSyncTask(models.Model):
         ('error', 'Error'),
     ]
     
+    CONFLICT_POLICIES = [
+        ('last_writer_wins', 'Last Writer Wins'),
+        ('local_priority', 'Local Priority'),
+        ('remote_priority', 'Remote Priority'),
+        ('field_merge', 'Field-level Merge'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     
     # Sync configuration
     sync_type = models.CharField(max_length=20, choices=SYNC_TYPES, default='one_way')
+    conflict_policy = models.CharField(
+        max_length=20, choices=CONFLICT_POLICIES, default='last_writer_wins'
+    )  # Two-way sync only
     source_model = models.CharField(max_length=100)
     target_model = models.CharField(max_length=100, blank=True)
     
@@ -168,6 +200,10 @@ class DataSyncTask(models.Model):
     external_system_name = models.CharField(max_length=100, blank=True)
     external_endpoint = models.URLField(blank=True)
     auth_config = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # Systems every sync batch is delivered to
+    integrations = models.ManyToManyField(
+        'ExternalSystemIntegration', blank=True, related_name='sync_tasks'
+    )
     
     # Scheduling
     schedule_enabled = models.BooleanField(default=False)
@@ -186,6 +222,14 @@ class DataSyncTask(models.Model):
     last_sync_message = models.TextField(blank=True)
     total_synced_records = models.IntegerField(default=0)
     
+    # Change capture: id of the last ChangeLogEntry processed (null until the first full sync)
+    change_cursor = models.BigIntegerField(null=True, blank=True)
+    # One-way sync: change_cursor of each integration ({integration id: cursor}),
+    # so a failing endpoint does not hold back the others
+    target_cursors = models.JSONField(default=dict, blank=True)
+    # Two-way sync: position in the remote system's change feed
+    remote_cursor = models.CharField(max_length=255, blank=True)
+    
     # Metadata
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -206,6 +250,60 @@ class DataSyncTask(models.Model):
         return self.name
 
 
+class ChangeLogEntry(models.Model):
+    """Append-only log of row changes on models watched by sync tasks"""
+    
+    OPERATIONS = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    model_label = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=64)
+    operation = models.CharField(max_length=10, choices=OPERATIONS)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'data_change_log'
+        verbose_name = 'Change Log Entry'
+        verbose_name_plural = 'Change Log Entries'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['model_label', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.operation} {self.model_label}:{self.object_pk}"
+
+
+class SyncRecordVersion(models.Model):
+    """Last reconciled state of one row of a two-way sync task"""
+    
+    id = models.BigAutoField(primary_key=True)
+    task = models.ForeignKey(DataSyncTask, on_delete=models.CASCADE, related_name='record_versions')
+    object_pk = models.CharField(max_length=64)
+    # Hash of the row both sides agreed on, and per-field hashes for merging
+    row_hash = models.CharField(max_length=32)
+    field_hashes = models.JSONField(default=dict, blank=True)
+    # Two-entry vector clock: changes seen on each side
+    local_version = models.PositiveIntegerField(default=0)
+    remote_version = models.PositiveIntegerField(default=0)
+    synced_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'data_sync_record_versions'
+        verbose_name = 'Sync Record Version'
+        verbose_name_plural = 'Sync Record Versions'
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'object_pk'], name='unique_sync_record_version'),
+        ]
+    
+    def __str__(self):
+        return f"{self.task_id}:{self.object_pk} ({self.local_version}/{self.remote_version})"
+
+
 class BackupSchedule(models.Model):
     """Model for backup scheduling and management"""
     
@@ -0,0 +1,132 @@
+# ==============================================================================
+# JOB PROGRESS REPORTING
+# گزارش پیشرفت کارهای ورود و خروج داده
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import time
+import logging
+from typing import Dict, Any, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import ImportExportJob, ImportExportJobError
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CACHE_PREFIX = 'data_job_progress'
+PROGRESS_CACHE_TIMEOUT = 60 * 60
+
+
+def progress_cache_key(job_id) -> str:
+    """Cache key holding the live progress of a job"""
+    return f"{PROGRESS_CACHE_PREFIX}:{job_id}"
+
+
+def get_live_progress(job_id) -> Optional[Dict[str, Any]]:
+    """Return the live progress of a running job, or None if not published"""
+    return cache.get(progress_cache_key(job_id))
+
+
+class JobProgressReporter:
+    """
+    Coalesce progress updates for a running ``ImportExportJob``.
+
+    Every update is published to the cache straight away for polling
+    clients, but the job row is written at most once per ``interval``
+    seconds. Record errors are buffered and appended to
+    ``ImportExportJobError`` on the same schedule; only the first
+    ``max_errors`` are stored while ``error_records`` keeps the full count.
+    """
+
+    FIELDS = ['processed_records', 'success_records', 'error_records', 'progress_percentage']
+
+    def __init__(self, job: ImportExportJob, interval: float = None, max_errors: int = None):
+        self.job = job
+        self.interval = interval if interval is not None else getattr(
+            settings, 'DATA_JOB_PROGRESS_INTERVAL', 2.0
+        )
+        self.max_errors = max_errors if max_errors is not None else job.config.get(
+            'max_stored_errors', getattr(settings, 'DATA_JOB_MAX_STORED_ERRORS', 1000)
+        )
+        self.stored_errors = 0
+        self.pending_errors = []
+        self.truncation_noted = False
+        self.dirty = False
+        self.last_flush = time.monotonic()
+
+    def update(self, processed: int = None, success: int = None,
+               errors: int = None, percentage: float = None):
+        """Record new counters, publish them and flush if the interval elapsed"""
+        if processed is not None:
+            self.job.processed_records = processed
+        if success is not None:
+            self.job.success_records = success
+        if errors is not None:
+            self.job.error_records = errors
+        if percentage is not None:
+            self.job.progress_percentage = min(percentage, 100.0)
+
+        self.dirty = True
+        self.publish()
+        self.flush()
+
+    def add_error(self, record_number: int, message: str, data: Dict = None):
+        """Queue a record error for the append-only store"""
+        if self.stored_errors + len(self.pending_errors) >= self.max_errors:
+            return
+        self.pending_errors.append(ImportExportJobError(
+            job=self.job,
+            record_number=record_number,
+            data=data,
+            message=message
+        ))
+
+    def flush(self, force: bool = False):
+        """Write counters and queued errors if due (or ``force`` is set)"""
+        if not force and time.monotonic() - self.last_flush < self.interval:
+            return
+
+        if self.pending_errors:
+            ImportExportJobError.objects.bulk_create(self.pending_errors)
+            self.stored_errors += len(self.pending_errors)
+            self.pending_errors = []
+            self.dirty = True
+
+        if self.dirty:
+            fields = list(self.FIELDS)
+            if self.stored_errors < self.job.error_records and not self.truncation_noted:
+                self.job.warnings.append({
+                    'timestamp': timezone.now().isoformat(),
+                    'message': f"Only the first {self.max_errors} record errors are stored"
+                })
+                fields.append('warnings')
+                self.truncation_noted = True
+            self.job.save(update_fields=fields)
+            self.dirty = False
+
+        self.last_flush = time.monotonic()
+
+    def publish(self):
+        """Publish the current counters to the cache"""
+        job = self.job
+        cache.set(progress_cache_key(job.id), {
+            'id': str(job.id),
+            'status': job.status,
+            'created_by': str(job.created_by_id),
+            'total_records': job.total_records,
+            'processed_records': job.processed_records,
+            'success_records': job.success_records,
+            'error_records': job.error_records,
+            'progress_percentage': job.progress_percentage,
+            'updated_at': timezone.now().isoformat(),
+        }, PROGRESS_CACHE_TIMEOUT)
+
+    def close(self):
+        """Flush what is left and drop the live entry; the row is now authoritative"""
+        try:
+            self.flush(force=True)
+        except Exception as e:
+            logger.error(f"Error flushing progress for job {self.job.id}: {e}")
+        cache.delete(progress_cache_key(self.job.id))
+
@@ -0,0 +1,185 @@
+# ==============================================================================
+# STREAMING IMPORT READERS
+# خواننده‌های جریانی فایل‌های ورودی
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import csv
+import io
+import json
+import os
+from typing import Dict, Any, Iterator
+from openpyxl import load_workbook
+
+
+class CountingStream(io.RawIOBase):
+    """Raw binary stream over a file object that counts bytes consumed"""
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.file.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        self.bytes_read += size
+        return size
+
+
+class RecordReader:
+    """
+    Base class for streaming record readers.
+
+    Readers yield one ``dict`` per record straight from the file handle and
+    report progress as a percentage of the file consumed, so nothing needs
+    to be read ahead to know how far an import has got.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.file.seek(0)
+        self.total_bytes = self._file_size(file)
+        self.counter = CountingStream(file)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @property
+    def progress(self) -> float:
+        """Percentage of the input consumed so far"""
+        if not self.total_bytes:
+            return 0.0
+        return min(self.counter.bytes_read / self.total_bytes * 100, 100.0)
+
+    def text_stream(self):
+        """Decode the counted byte stream incrementally as UTF-8"""
+        return io.TextIOWrapper(io.BufferedReader(self.counter), encoding='utf-8', newline='')
+
+    def _file_size(self, file):
+        size = getattr(file, 'size', None)
+        if size is not None:
+            return size
+        try:
+            return os.fstat(file.fileno()).st_size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            position = file.tell()
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            file.seek(position)
+            return size
+
+
+class CSVRecordReader(RecordReader):
+    """Yield CSV rows as dicts keyed by the header row"""
+
+    def __iter__(self):
+        yield from csv.DictReader(self.text_stream())
+
+
+class JSONRecordReader(RecordReader):
+    """
+    Yield the elements of a top-level JSON array, or the lines of an NDJSON
+    file, decoding one object at a time from a bounded text buffer.
+    """
+
+    read_size = 64 * 1024
+
+    def __iter__(self):
+        text = self.text_stream()
+        decoder = json.JSONDecoder()
+        buffer = ''
+        eof = False
+
+        def fill():
+            nonlocal buffer, eof
+            chunk = text.read(self.read_size)
+            if chunk:
+                buffer += chunk
+            else:
+                eof = True
+
+        # Find the first significant character to pick array or NDJSON mode
+        while not eof and not buffer.strip():
+            fill()
+        buffer = buffer.lstrip()
+        if not buffer:
+            return
+
+        in_array = buffer.startswith('[')
+        if in_array:
+            buffer = buffer[1:]
+
+        while True:
+            # Skip separators between values
+            buffer = buffer.lstrip(' \t\r\n,' if in_array else ' \t\r\n')
+            if not buffer:
+                if eof:
+                    return
+                fill()
+                continue
+
+            if in_array and buffer.startswith(']'):
+                return
+
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+
+            # A value ending exactly at the buffer edge may be truncated
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+
+            yield value
+            buffer = buffer[end:]
+
+
+class ExcelRecordReader(RecordReader):
+    """Yield rows of the first worksheet using openpyxl read-only mode"""
+
+    def __init__(self, file):
+        super().__init__(file)
+        self.rows_read = 0
+        self.total_rows = 0
+
+    def __iter__(self):
+        workbook = load_workbook(self.file, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[0]
+            self.total_rows = max((sheet.max_row or 1) - 1, 0)
+            rows = sheet.iter_rows(values_only=True)
+
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [str(name) if name is not None else '' for name in header]
+
+            for row in rows:
+                self.rows_read += 1
+                if all(value is None for value in row):
+                    continue
+                yield dict(zip(header, row))
+        finally:
+            workbook.close()
+
+    @property
+    def progress(self) -> float:
+        # Byte offsets inside a zip archive don't track rows; count rows instead
+        if not self.total_rows:
+            return 0.0
+        return min(self.rows_read / self.total_rows * 100, 100.0)
+
+
+RECORD_READERS = {
+    'csv': CSVRecordReader,
+    'json': JSONRecordReader,
+    'excel': ExcelRecordReader,
+}
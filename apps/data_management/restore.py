@@ -0,0 +1,241 @@
+# ==============================================================================
+# BACKUP RESTORE
+# بازیابی نسخه‌های پشتیبان
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Any
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from .backups import read_manifest, read_table, resolve_chain
+from .changes import bulk_rows_written
+
+logger = logging.getLogger(__name__)
+
+
+def dependency_waves(tables: List[Dict[str, Any]]) -> List[List[List[Dict[str, Any]]]]:
+    """
+    Group manifest tables into waves that can be restored one after another.
+
+    Every table in a wave only references tables of earlier waves, so the
+    tables of one wave are independent and may load in parallel. Each wave
+    is a list of groups, a group being tables one worker restores in a
+    single transaction: normally one table each, but tables caught in a
+    foreign-key cycle share a final group so their checks can be deferred
+    together. Dependencies outside the backup are ignored.
+    """
+    remaining = {table['model']: table for table in tables}
+    waves = []
+
+    while remaining:
+        ready = [
+            table for label, table in remaining.items()
+            if not any(dep in remaining and dep != label for dep in table['depends_on'])
+        ]
+        if not ready:
+            waves.append([list(remaining.values())])
+            break
+        waves.append([[table] for table in ready])
+        for table in ready:
+            del remaining[table['model']]
+
+    return waves
+
+
+def table_order(tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Manifest tables in an order that respects foreign keys"""
+    return [table for wave in dependency_waves(tables) for group in wave for table in group]
+
+
+@contextmanager
+def preserve_timestamps(model):
+    """
+    Switch off ``auto_now``/``auto_now_add`` on ``model`` so ``bulk_create``
+    writes the backed-up timestamps instead of the current time.
+    """
+    changed = []
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            changed.append((field, field.auto_now, field.auto_now_add))
+            field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+class BackupRestorer:
+    """
+    Restore backups written by ``BackupWriter``.
+
+    A backup is restored together with the chain it was taken against (its
+    full base plus every incremental or differential on top), oldest first.
+    Within a backup, tables load wave by wave in dependency order, with up
+    to ``workers`` independent tables of a wave loading at once on their
+    own connections (one at a time on SQLite, which allows a single
+    writer). Rows are upserted by primary key with ``bulk_create`` so
+    replaying overlapping backups converges on the newest copy of each
+    row. Foreign-key checks are deferred to commit where the backend
+    supports it, or switched off and verified once the backup is loaded,
+    and pk sequences are reset after each table so later inserts don't
+    reuse restored keys. Ids of content types and permissions, which
+    backups leave out, are mapped by natural key.
+    """
+
+    def __init__(self, batch_size: int = 5000, workers: int = 1):
+        self.batch_size = batch_size
+        self.workers = workers
+        # Backup directory -> {related model: {backed-up id: local id}}
+        self._remaps = {}
+
+    def restore(self, directory: str, chain: bool = True) -> Dict[str, int]:
+        """Restore the backup at ``directory`` and return rows per table"""
+        directories = resolve_chain(directory) if chain else [directory]
+        totals = {}
+        for path in directories:
+            manifest = read_manifest(path)
+            logger.info(f"Restoring {manifest.get('backup_type', 'full')} backup {path}")
+            self._remaps[path] = self._natural_key_remap(manifest)
+            for wave in dependency_waves(manifest['tables']):
+                for label, rows in self._restore_wave(path, manifest, wave).items():
+                    totals[label] = totals.get(label, 0) + rows
+
+            if not connection.features.can_defer_constraint_checks:
+                # Checks were switched off while loading; verify them now
+                connection.check_constraints(
+                    table_names=[entry['db_table'] for entry in manifest['tables']]
+                )
+        return totals
+
+    def _natural_key_remap(self, manifest: Dict[str, Any]) -> Dict[Any, Dict[int, int]]:
+        """
+        Map the content type and permission ids of a backup to this
+        database's by natural key, creating any that are missing here.
+        """
+        natural_keys = manifest.get('natural_keys')
+        if natural_keys is None:
+            logger.warning("Backup has no natural keys; content type and permission ids are restored as-is")
+            return {}
+
+        ContentType = apps.get_model('contenttypes', 'ContentType')
+        Permission = apps.get_model('auth', 'Permission')
+        content_types = {}
+        by_natural_key = {}
+        for pk, (app_label, model) in natural_keys['contenttypes'].items():
+            content_type, _ = ContentType.objects.get_or_create(app_label=app_label, model=model)
+            content_types[int(pk)] = content_type.pk
+            by_natural_key[(app_label, model)] = content_type
+        permissions = {}
+        for pk, (app_label, model, codename, name) in natural_keys['permissions'].items():
+            content_type = by_natural_key.get((app_label, model))
+            if content_type is None:
+                content_type, _ = ContentType.objects.get_or_create(app_label=app_label, model=model)
+            permission, _ = Permission.objects.get_or_create(
+                content_type=content_type, codename=codename, defaults={'name': name}
+            )
+            permissions[int(pk)] = permission.pk
+        return {ContentType: content_types, Permission: permissions}
+
+    def _restore_wave(self, directory: str, manifest: Dict[str, Any],
+                      wave: List[List[Dict[str, Any]]]) -> Dict[str, int]:
+        def run(group):
+            return self._restore_group(directory, manifest, group)
+
+        max_workers = min(self.workers, len(wave))
+        if connection.vendor == 'sqlite':
+            # SQLite allows one writer at a time; parallel loads only hit "database is locked"
+            max_workers = 1
+        if max_workers <= 1:
+            results = [run(group) for group in wave]
+        else:
+            def run_in_thread(group):
+                try:
+                    return run(group)
+                finally:
+                    # Worker threads open their own connections; don't leak them
+                    connections.close_all()
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(run_in_thread, wave))
+
+        return {label: rows for result in results for label, rows in result.items()}
+
+    def _restore_group(self, directory: str, manifest: Dict[str, Any],
+                       group: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Restore a group of tables in one transaction"""
+        restored = {}
+        deferrable = connection.features.can_defer_constraint_checks
+        with nullcontext() if deferrable else connection.constraint_checks_disabled():
+            with transaction.atomic():
+                if connection.vendor in ('postgresql', 'oracle'):
+                    # Django declares foreign keys DEFERRABLE; check them at commit
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+                for entry in group:
+                    restored[entry['model']] = self.restore_table(directory, manifest, entry)
+                    self._reset_sequences(apps.get_model(entry['model']))
+                    logger.info(f"Restored {restored[entry['model']]} rows into {entry['db_table']}")
+        return restored
+
+    def restore_table(self, directory: str, manifest: Dict[str, Any], entry: Dict[str, Any]) -> int:
+        """Upsert every row of one table of a backup"""
+        model = apps.get_model(entry['model'])
+        by_attname = {field.attname: field for field in model._meta.concrete_fields}
+        fields = [by_attname[name] for name in entry['fields']]
+        # Columns pointing at content types or permissions, by position
+        remap = self._remaps.get(directory, {})
+        remapped = [
+            (index, remap[field.related_model]) for index, field in enumerate(fields)
+            if field.is_relation and field.related_model in remap
+        ]
+
+        restored = 0
+        batch = []
+        with preserve_timestamps(model):
+            for row in read_table(directory, manifest, entry):
+                for index, ids in remapped:
+                    if row[index] is not None:
+                        row[index] = ids.get(row[index], row[index])
+                batch.append(model(**{
+                    field.attname: field.to_python(value) if value is not None else None
+                    for field, value in zip(fields, row)
+                }))
+                if len(batch) >= self.batch_size:
+                    restored += self._write(model, batch)
+                    batch = []
+            if batch:
+                restored += self._write(model, batch)
+        return restored
+
+    def _reset_sequences(self, model):
+        """Move the pk sequence past the restored keys, as ``loaddata`` does"""
+        statements = connection.ops.sequence_reset_sql(no_style(), [model])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def _write(self, model, instances: List) -> int:
+        pk_name = model._meta.pk.name
+        update_fields = [
+            field.name for field in model._meta.concrete_fields if not field.primary_key
+        ]
+        if update_fields:
+            model._default_manager.bulk_create(
+                instances,
+                update_conflicts=True,
+                # MySQL upserts on any unique key and rejects an explicit target
+                unique_fields=[pk_name] if connection.features.supports_update_conflicts_with_target else None,
+                update_fields=update_fields,
+            )
+        else:
+            model._default_manager.bulk_create(instances, ignore_conflicts=True)
+        # Restored rows reach sync tasks and caches like any other write
+        bulk_rows_written.send(sender=model, pks=[instance.pk for instance in instances], operation='update')
+        return len(instances)
@@ -6,7 +6,10 @@
 
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import ImportExportJob, DataSyncTask, BackupSchedule, ExternalSystemIntegration
+from .models import (
+    ImportExportJob, ImportExportJobError, DataSyncTask, BackupSchedule, ExternalSystemIntegration
+)
+from .transforms import compile_rules
 
 User = get_user_model()
 
@@ -54,6 +57,15 @@ class ImportExportJobSerializer(serializers.ModelSerializer):
         return None
 
 
+class ImportExportJobErrorSerializer(serializers.ModelSerializer):
+    """Serializer for per-record job errors"""
+    
+    class Meta:
+        model = ImportExportJobError
+        fields = ['id', 'record_number', 'data', 'message', 'created_at']
+        read_only_fields = fields
+
+
 class ExportJobCreateSerializer(serializers.Serializer):
     """Serializer for creating export jobs"""
     
@@ -92,19 +104,19 @@ class DataSyncTaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = DataSyncTask
         fields = [
-            'id', 'name', 'description', 'sync_type', 'sync_type_display',
-            'source_model', 'target_model', 'external_system_name',
+            'id', 'name', 'description', 'sync_type', 'sync_type_display', 'conflict_policy',
+            'source_model', 'target_model', 'integrations', 'external_system_name',
             'external_endpoint', 'auth_config', 'schedule_enabled',
             'schedule_cron', 'last_run', 'next_run', 'next_run_display',
             'field_mapping', 'filters', 'transform_rules',
             'status', 'status_display', 'last_sync_status',
-            'last_sync_message', 'total_synced_records',
+            'last_sync_message', 'total_synced_records', 'change_cursor', 'remote_cursor',
             'created_by', 'created_by_name', 'created_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'created_by', 'created_at', 'updated_at',
             'last_run', 'next_run', 'last_sync_status',
-            'last_sync_message', 'total_synced_records'
+            'last_sync_message', 'total_synced_records', 'change_cursor', 'remote_cursor'
         ]
     
     def get_next_run_display(self, obj):
@@ -112,6 +124,16 @@ class DataSyncTaskSerializer(serializers.ModelSerializer):
         if obj.next_run:
             return obj.next_run.strftime('%Y-%m-%d %H:%M')
         return None
+    
+    def validate_transform_rules(self, value):
+        """Reject rules the transform pipeline cannot compile"""
+        if not isinstance(value, list):
+            raise serializers.ValidationError("Transform rules must be a list")
+        try:
+            compile_rules(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
 
 
 class BackupScheduleSerializer(serializers.ModelSerializer):
@@ -6,22 +6,38 @@
 
 import os
 import csv
+import shutil
 import json
 import uuid
 import zipfile
+import tempfile
 import pandas as pd
 from io import StringIO, BytesIO
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Union
 from django.apps import apps
-from django.core.management import call_command
 from django.core.serializers import serialize, deserialize
-from django.db import transaction, models
+from django.db import connection, transaction, models
 from django.conf import settings
 from django.utils import timezone
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
 from django.core.files.storage import default_storage
-from .models import ImportExportJob, DataSyncTask, BackupSchedule, ExternalSystemIntegration
+from .models import ImportExportJob, DataSyncTask, BackupSchedule, ExternalSystemIntegration, SyncRecordVersion
+from .exporters import EXPORT_WRITERS, CSVExportWriter, JSONExportWriter, ExcelExportWriter
+from .chunking import keyset_chunks
+from .importers import BulkImporter
+from .readers import CSVRecordReader, JSONRecordReader, ExcelRecordReader
+from .progress import JobProgressReporter
+from .sharding import plan_shards, part_path, run_shards, merge_parts
+from .backups import (
+    DEFAULT_EXCLUDE, MANIFEST_NAME, backup_models, backup_size, read_manifest, resolve_chain,
+    run_backup
+)
+from .restore import BackupRestorer, preserve_timestamps
+from .changes import bulk_rows_written, change_feed
+from .transforms import TransformPlan, compile_rules
+from .delivery import delivery_engine, target_from_integration
+from .reconcile import Reconciler, row_hash, strip_remote
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,6 +49,7 @@ class DataImportExportService:
     def __init__(self):
         self.supported_formats = ['csv', 'json', 'excel', 'xml']
         self.chunk_size = 1000  # Process records in chunks
+        self.import_batch_size = 500  # Rows per bulk_create on import
     
     def create_export_job(self, user, model_name: str, format: str = 'csv', 
                          filters: Dict = None, config: Dict = None) -> ImportExportJob:
@@ -61,6 +78,7 @@ class DataImportExportService:
     
     def execute_export_job(self, job: ImportExportJob) -> bool:
         """Execute an export job"""
+        progress = JobProgressReporter(job)
         try:
             job.start_job()
             
@@ -75,20 +93,27 @@ class DataImportExportService:
             job.total_records = queryset.count()
             job.save(update_fields=['total_records'])
             
-            # Export based on format
-            if job.format == 'csv':
-                result_content = self._export_to_csv(queryset, job)
-            elif job.format == 'json':
-                result_content = self._export_to_json(queryset, job)
-            elif job.format == 'excel':
-                result_content = self._export_to_excel(queryset, job)
-            else:
+            # Stream the export into a temporary file, then hand it to storage
+            if job.format not in EXPORT_WRITERS:
                 raise ValueError(f"Unsupported format: {job.format}")
             
-            # Save result file
-            filename = f"export_{job.model_name}_{job.id}.{job.format}"
-            job.result_file.save(filename, ContentFile(result_content))
+            with tempfile.TemporaryFile() as stream:
+                shard_count = int(job.config.get('shards', 1))
+                if shard_count > 1:
+                    self._export_sharded(queryset, job, stream, progress, shard_count)
+                elif job.format == 'csv':
+                    self._export_to_csv(queryset, job, stream, progress)
+                elif job.format == 'json':
+                    self._export_to_json(queryset, job, stream, progress)
+                elif job.format == 'excel':
+                    self._export_to_excel(queryset, job, stream, progress)
+                
+                # Save result file
+                stream.seek(0)
+                filename = f"export_{job.model_name}_{job.id}.{job.format}"
+                job.result_file.save(filename, File(stream))
             
+            progress.flush(force=True)
             job.complete_job()
             logger.info(f"Export job {job.id} completed successfully")
             return True
@@ -98,98 +123,100 @@ class DataImportExportService:
             job.fail_job(error_msg)
             logger.error(error_msg)
             return False
+        finally:
+            progress.close()
+    
+    def _export_to_csv(self, queryset, job: ImportExportJob, stream, progress: JobProgressReporter):
+        """Stream queryset rows to CSV"""
+        self._export_rows(queryset, job, CSVExportWriter, stream, progress)
     
-    def _export_to_csv(self, queryset, job: ImportExportJob) -> bytes:
-        """Export queryset to CSV format"""
-        output = StringIO()
-        writer = None
+    def _export_to_json(self, queryset, job: ImportExportJob, stream, progress: JobProgressReporter):
+        """Stream serialized objects as a JSON array or NDJSON"""
+        writer = JSONExportWriter(stream, [], mode=job.config.get('json_mode', 'array'))
+        writer.open()
         processed = 0
         
         for chunk in self._get_chunks(queryset, self.chunk_size):
-            for obj in chunk:
-                if writer is None:
-                    # Initialize CSV writer with field names
-                    fieldnames = [f.name for f in obj._meta.fields]
-                    writer = csv.DictWriter(output, fieldnames=fieldnames)
-                    writer.writeheader()
-                
-                # Convert object to dict
-                row_data = {}
-                for field in obj._meta.fields:
-                    value = getattr(obj, field.name)
-                    if hasattr(value, 'isoformat'):  # DateTime fields
-                        value = value.isoformat()
-                    elif hasattr(value, '__str__'):  # Convert to string
-                        value = str(value)
-                    row_data[field.name] = value
-                
-                writer.writerow(row_data)
-                processed += 1
-                
-                # Update progress
-                if processed % 100 == 0:
-                    job.processed_records = processed
-                    job.progress_percentage = (processed / job.total_records) * 100
-                    job.save(update_fields=['processed_records', 'progress_percentage'])
-        
-        job.success_records = processed
-        job.save(update_fields=['success_records'])
+            objects = serialize('python', chunk)
+            writer.write_objects(objects)
+            
+            processed += len(objects)
+            self._update_export_progress(job, progress, processed)
         
-        return output.getvalue().encode('utf-8')
+        writer.close()
+        progress.update(success=processed)
+    
+    def _export_to_excel(self, queryset, job: ImportExportJob, stream, progress: JobProgressReporter):
+        """Stream queryset rows into a write-only Excel workbook"""
+        self._export_rows(queryset, job, ExcelExportWriter, stream, progress)
     
-    def _export_to_json(self, queryset, job: ImportExportJob) -> bytes:
-        """Export queryset to JSON format"""
-        data = []
+    def _export_rows(self, queryset, job: ImportExportJob, writer_class, stream,
+                     progress: JobProgressReporter):
+        """
+        Stream flat rows through a writer.
+        
+        Rows are read with ``values_list`` so no model instances (or related
+        objects) are built; foreign keys are exported as their raw ids.
+        """
+        fields = queryset.model._meta.concrete_fields
+        writer = writer_class(stream, [field.name for field in fields])
+        writer.open()
         processed = 0
         
-        for chunk in self._get_chunks(queryset, self.chunk_size):
-            serialized_chunk = serialize('json', chunk)
-            chunk_data = json.loads(serialized_chunk)
-            data.extend(chunk_data)
+        rows = queryset.values_list(*[field.attname for field in fields])
+        for chunk in self._get_chunks(rows, self.chunk_size):
+            writer.write_rows(chunk)
             
             processed += len(chunk)
-            job.processed_records = processed
-            job.progress_percentage = (processed / job.total_records) * 100
-            job.save(update_fields=['processed_records', 'progress_percentage'])
-        
-        job.success_records = processed
-        job.save(update_fields=['success_records'])
+            self._update_export_progress(job, progress, processed)
         
-        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+        writer.close()
+        progress.update(success=processed)
     
-    def _export_to_excel(self, queryset, job: ImportExportJob) -> bytes:
-        """Export queryset to Excel format"""
-        # Convert to DataFrame
-        data = []
-        processed = 0
+    def _export_sharded(self, queryset, job: ImportExportJob, stream,
+                        progress: JobProgressReporter, shard_count: int):
+        """
+        Export primary-key range shards in parallel and merge the parts.
         
-        for chunk in self._get_chunks(queryset, self.chunk_size):
-            for obj in chunk:
-                row_data = {}
-                for field in obj._meta.fields:
-                    value = getattr(obj, field.name)
-                    if hasattr(value, 'isoformat'):  # DateTime fields
-                        value = value.isoformat()
-                    row_data[field.name] = value
-                
-                data.append(row_data)
-                processed += 1
-                
-                if processed % 100 == 0:
-                    job.processed_records = processed
-                    job.progress_percentage = (processed / job.total_records) * 100
-                    job.save(update_fields=['processed_records', 'progress_percentage'])
-        
-        # Create Excel file
-        df = pd.DataFrame(data)
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Data')
+        Each shard is written to its own part file by a worker process (up
+        to ``DATA_EXPORT_WORKERS``); the parts are then concatenated, or
+        copied into one sheet for Excel, in key order.
+        """
+        fieldnames = [field.name for field in queryset.model._meta.concrete_fields]
         
-        job.success_records = processed
-        job.save(update_fields=['success_records'])
+        with tempfile.TemporaryDirectory() as directory:
+            specs = [
+                {
+                    'index': index,
+                    'model_name': job.model_name,
+                    'filters': job.filters,
+                    'format': job.format,
+                    'lower': lower,
+                    'upper': upper,
+                    'path': part_path(directory, index, job.format),
+                    'chunk_size': self.chunk_size,
+                }
+                for index, (lower, upper) in enumerate(plan_shards(queryset, shard_count))
+            ]
+            
+            processed = run_shards(
+                specs,
+                getattr(settings, 'DATA_EXPORT_WORKERS', 1),
+                lambda processed: self._update_export_progress(job, progress, processed)
+            )
+            merge_parts(
+                [spec['path'] for spec in specs], job.format, fieldnames, stream,
+                json_mode=job.config.get('json_mode', 'array')
+            )
         
-        return output.getvalue()
+        progress.update(success=processed)
+    
+    def _update_export_progress(self, job: ImportExportJob, progress: JobProgressReporter, processed: int):
+        """Report export progress; the reporter decides when to write it"""
+        progress.update(
+            processed=processed,
+            percentage=(processed / job.total_records) * 100 if job.total_records else 100.0
+        )
     
     def create_import_job(self, user, model_name: str, source_file, 
                          format: str = 'csv', field_mapping: Dict = None,
@@ -220,61 +247,63 @@ class DataImportExportService:
     
     def execute_import_job(self, job: ImportExportJob) -> bool:
         """Execute an import job"""
+        progress = JobProgressReporter(job)
         try:
             job.start_job()
+            # Errors from an earlier failed run no longer apply
+            job.record_errors.all().delete()
             
-            # Read and parse source file
+            # Stream records from the source file
             if job.format == 'csv':
-                data = self._read_csv_file(job.source_file)
+                reader = self._read_csv_file(job.source_file)
             elif job.format == 'json':
-                data = self._read_json_file(job.source_file)
+                reader = self._read_json_file(job.source_file)
             elif job.format == 'excel':
-                data = self._read_excel_file(job.source_file)
+                reader = self._read_excel_file(job.source_file)
             else:
                 raise ValueError(f"Unsupported format: {job.format}")
             
-            job.total_records = len(data)
-            job.save(update_fields=['total_records'])
-            
-            # Import data
+            # Import data in validated bulk batches
             model_class = apps.get_model(job.model_name)
+            importer = BulkImporter(
+                model_class,
+                batch_size=job.config.get('batch_size', self.import_batch_size),
+                upsert_key=job.config.get('upsert_key'),
+                update_fields=job.config.get('update_fields'),
+            )
+            
+            # Raw records of the batch in flight, kept only for error reports
+            pending = {}
+            
+            def records():
+                for i, record in enumerate(reader):
+                    pending[i] = record
+                    yield i, self._apply_field_mapping(record, job.field_mapping)
+            
+            processed = 0
             success_count = 0
             error_count = 0
             
-            with transaction.atomic():
-                for i, record in enumerate(data):
-                    try:
-                        # Apply field mapping
-                        mapped_data = self._apply_field_mapping(record, job.field_mapping)
-                        
-                        # Create or update object
-                        obj = model_class(**mapped_data)
-                        obj.save()
-                        
-                        success_count += 1
-                        
-                    except Exception as e:
-                        error_count += 1
-                        job.errors.append({
-                            'record': i + 1,
-                            'data': record,
-                            'error': str(e)
-                        })
-                    
-                    # Update progress
-                    if (i + 1) % 100 == 0:
-                        job.processed_records = i + 1
-                        job.success_records = success_count
-                        job.error_records = error_count
-                        job.progress_percentage = ((i + 1) / job.total_records) * 100
-                        job.save(update_fields=[
-                            'processed_records', 'success_records', 
-                            'error_records', 'progress_percentage', 'errors'
-                        ])
-            
-            job.processed_records = len(data)
-            job.success_records = success_count
-            job.error_records = error_count
+            for result in importer.import_batches(records()):
+                processed += result['processed']
+                success_count += result['success']
+                error_count += len(result['errors'])
+                
+                for index, message in result['errors']:
+                    progress.add_error(index + 1, message, pending.get(index))
+                pending.clear()
+                
+                # Update progress from the share of the file consumed
+                progress.update(
+                    processed=processed,
+                    success=success_count,
+                    errors=error_count,
+                    percentage=reader.progress
+                )
+            
+            job.total_records = processed
+            job.save(update_fields=['total_records'])
+            progress.flush(force=True)
             job.complete_job()
             
             logger.info(f"Import job {job.id} completed: {success_count} success, {error_count} errors")
@@ -285,25 +314,20 @@ class DataImportExportService:
             job.fail_job(error_msg)
             logger.error(error_msg)
             return False
+        finally:
+            progress.close()
+    
+    def _read_csv_file(self, file) -> CSVRecordReader:
+        """Stream records from a CSV file"""
+        return CSVRecordReader(file)
+    
+    def _read_json_file(self, file) -> JSONRecordReader:
+        """Stream records from a JSON array or NDJSON file"""
+        return JSONRecordReader(file)
     
-    def _read_csv_file(self, file) -> List[Dict]:
-        """Read data from CSV file"""
-        file.seek(0)
-        content = file.read().decode('utf-8')
-        csv_data = csv.DictReader(StringIO(content))
-        return list(csv_data)
-    
-    def _read_json_file(self, file) -> List[Dict]:
-        """Read data from JSON file"""
-        file.seek(0)
-        content = file.read().decode('utf-8')
-        return json.loads(content)
-    
-    def _read_excel_file(self, file) -> List[Dict]:
-        """Read data from Excel file"""
-        file.seek(0)
-        df = pd.read_excel(file)
-        return df.to_dict('records')
+    def _read_excel_file(self, file) -> ExcelRecordReader:
+        """Stream records from the first sheet of an Excel file"""
+        return ExcelRecordReader(file)
     
     def _apply_field_mapping(self, record: Dict, field_mapping: Dict) -> Dict:
         """Apply field mapping to record"""
@@ -323,46 +347,54 @@ class DataImportExportService:
         return mapped_record
     
     def _get_chunks(self, queryset, chunk_size: int):
-        """Yield chunks of queryset"""
-        count = queryset.count()
-        for i in range(0, count, chunk_size):
-            yield queryset[i:i + chunk_size]
+        """Yield chunks of queryset using primary-key keyset pagination"""
+        return keyset_chunks(queryset, chunk_size)
 
 
 class BackupService:
     """Service for handling database backups"""
     
-    def __init__(self):
-        self.backup_dir = getattr(settings, 'BACKUP_DIR', 'backups')
+    def __init__(self, backup_dir: str = None):
+        self.backup_dir = backup_dir or getattr(settings, 'BACKUP_DIR', 'backups')
         self.ensure_backup_dir()
     
     def ensure_backup_dir(self):
         """Ensure backup directory exists"""
         os.makedirs(self.backup_dir, exist_ok=True)
     
-    def create_backup(self, schedule: BackupSchedule) -> bool:
+    def create_backup(self, schedule: BackupSchedule, backup_type: str = None) -> bool:
         """Create a backup based on schedule configuration"""
         try:
-            backup_filename = self._generate_backup_filename(schedule)
+            backup_type = backup_type or schedule.backup_type
+            parent = None
+            if backup_type in ('incremental', 'differential'):
+                parent = self._find_parent(schedule, backup_type)
+                if parent is None:
+                    logger.info(f"No full backup of {schedule.name} to build on, taking a full backup")
+                    backup_type = 'full'
+            
+            backup_filename = self._generate_backup_filename(schedule, backup_type)
             backup_path = os.path.join(self.backup_dir, backup_filename)
             
             logger.info(f"Starting backup: {schedule.name}")
             
-            if schedule.backup_type == 'full':
+            if backup_type == 'full':
                 success = self._create_full_backup(backup_path, schedule)
-            elif schedule.backup_type == 'schema_only':
+            elif backup_type in ('incremental', 'differential'):
+                success = self._create_incremental_backup(backup_path, schedule, backup_type, parent)
+            elif backup_type == 'schema_only':
                 success = self._create_schema_backup(backup_path, schedule)
-            elif schedule.backup_type == 'data_only':
+            elif backup_type == 'data_only':
                 success = self._create_data_backup(backup_path, schedule)
             else:
-                logger.error(f"Unsupported backup type: {schedule.backup_type}")
+                logger.error(f"Unsupported backup type: {backup_type}")
                 return False
             
             if success:
                 # Update schedule status
                 schedule.last_backup = timezone.now()
                 schedule.last_backup_status = 'completed'
-                schedule.last_backup_size = os.path.getsize(backup_path)
+                schedule.last_backup_size = backup_size(backup_path)
                 schedule.save(update_fields=[
                     'last_backup', 'last_backup_status', 'last_backup_size'
                 ])
@@ -383,23 +415,29 @@ class BackupService:
     def _create_full_backup(self, backup_path: str, schedule: BackupSchedule) -> bool:
         """Create a full database backup"""
         try:
-            # Use Django's dumpdata command
-            with open(backup_path, 'w', encoding='utf-8') as f:
-                call_command('dumpdata', 
-                           exclude=['contenttypes', 'auth.permission'],
-                           indent=2,
-                           stdout=f)
-            
-            # Compress if enabled
-            if schedule.compress_backup:
-                self._compress_backup(backup_path)
-            
+            manifest = self._run_backup(backup_path, schedule, DEFAULT_EXCLUDE, 'full')
+            logger.info(f"Backed up {manifest['total_rows']} rows from {len(manifest['tables'])} tables")
             return True
             
         except Exception as e:
             logger.error(f"Full backup failed: {e}")
             return False
     
+    def _create_incremental_backup(self, backup_path: str, schedule: BackupSchedule,
+                                   backup_type: str, parent: Dict) -> bool:
+        """
+        Back up only rows changed since ``parent``: the previous backup for
+        incrementals, the last full backup for differentials.
+        """
+        try:
+            manifest = self._run_backup(backup_path, schedule, DEFAULT_EXCLUDE, backup_type, parent)
+            logger.info(f"Backed up {manifest['total_rows']} changed rows since {parent['name']}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"{backup_type.capitalize()} backup failed: {e}")
+            return False
+    
     def _create_schema_backup(self, backup_path: str, schedule: BackupSchedule) -> bool:
         """Create a schema-only backup"""
         try:
@@ -418,40 +456,81 @@ class BackupService:
     def _create_data_backup(self, backup_path: str, schedule: BackupSchedule) -> bool:
         """Create a data-only backup"""
         try:
-            # Use dumpdata but exclude certain apps/models
-            with open(backup_path, 'w', encoding='utf-8') as f:
-                call_command('dumpdata',
-                           exclude=['contenttypes', 'auth.permission', 'sessions'],
-                           indent=2,
-                           stdout=f)
-            
+            self._run_backup(backup_path, schedule, DEFAULT_EXCLUDE + ['sessions'], 'data_only')
             return True
             
         except Exception as e:
             logger.error(f"Data backup failed: {e}")
             return False
     
-    def _generate_backup_filename(self, schedule: BackupSchedule) -> str:
-        """Generate backup filename"""
-        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+    def _run_backup(self, backup_path: str, schedule: BackupSchedule, exclude: List[str],
+                    backup_type: str, parent: Dict = None) -> Dict:
+        """Stream the selected tables of a schedule into a backup directory"""
+        models = backup_models(
+            exclude=exclude + list(schedule.exclude_tables),
+            include=schedule.include_tables
+        )
+        return run_backup(
+            backup_path,
+            models,
+            compression=self._compression(schedule),
+            parent=parent,
+            backup_type=backup_type,
+            schedule=str(schedule.id)
+        )
+    
+    def _find_parent(self, schedule: BackupSchedule, backup_type: str) -> Optional[Dict]:
+        """Manifest an incremental or differential backup is taken against"""
+        for backup in self.list_backups(schedule):
+            if backup_type == 'incremental' and backup['type'] in ('full', 'incremental', 'differential'):
+                return read_manifest(os.path.join(self.backup_dir, backup['filename']))
+            if backup_type == 'differential' and backup['type'] == 'full':
+                return read_manifest(os.path.join(self.backup_dir, backup['filename']))
+        return None
+    
+    def restore_backup(self, backup_name: str, chain: bool = True,
+                       workers: int = None, batch_size: int = 5000) -> Dict[str, int]:
+        """Restore a backup, with the chain of backups it builds on"""
+        restorer = BackupRestorer(
+            batch_size=batch_size,
+            workers=workers or getattr(settings, 'BACKUP_RESTORE_WORKERS', 4)
+        )
+        return restorer.restore(os.path.join(self.backup_dir, backup_name), chain=chain)
+    
+    def _compression(self, schedule: BackupSchedule) -> str:
+        """Compression codec for a schedule's backups"""
+        if not schedule.compress_backup:
+            return 'none'
+        return getattr(settings, 'BACKUP_COMPRESSION', 'gzip')
+    
+    def _generate_backup_filename(self, schedule: BackupSchedule, backup_type: str) -> str:
+        """Generate backup directory name"""
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S_%f')
         name_slug = schedule.name.replace(' ', '_').lower()
-        extension = 'json'
-        
-        if schedule.compress_backup:
-            extension = 'json.gz'
         
-        return f"{name_slug}_{schedule.backup_type}_{timestamp}.{extension}"
+        return f"{name_slug}_{backup_type}_{timestamp}"
     
-    def _compress_backup(self, backup_path: str):
-        """Compress backup file"""
-        import gzip
+    def list_backups(self, schedule: BackupSchedule) -> List[Dict]:
+        """List the backups of a schedule, newest first"""
+        name_slug = schedule.name.replace(' ', '_').lower()
+        backups = []
         
-        with open(backup_path, 'rb') as f_in:
-            with gzip.open(f"{backup_path}.gz", 'wb') as f_out:
-                f_out.writelines(f_in)
+        for filename in os.listdir(self.backup_dir):
+            path = os.path.join(self.backup_dir, filename)
+            if not filename.startswith(name_slug) or not os.path.isfile(os.path.join(path, MANIFEST_NAME)):
+                continue
+            manifest = read_manifest(path)
+            backups.append({
+                'filename': filename,
+                'size': backup_size(path),
+                'created_at': manifest['created_at'],
+                'type': manifest.get('backup_type', schedule.backup_type),
+                'tables': len(manifest['tables']),
+                'rows': manifest['total_rows'],
+            })
         
-        # Remove original file
-        os.remove(backup_path)
+        backups.sort(key=lambda backup: backup['created_at'], reverse=True)
+        return backups
     
     def _cleanup_old_backups(self, schedule: BackupSchedule):
         """Remove old backups beyond retention limit"""
@@ -471,10 +550,22 @@ class BackupService:
             # Sort by modification time (newest first)
             backup_files.sort(key=lambda x: x['mtime'], reverse=True)
             
+            # Keep the backups that retained incrementals still build on
+            keep = set()
+            for backup_file in backup_files[:schedule.max_backups_to_keep]:
+                keep.add(os.path.normpath(backup_file['path']))
+                if os.path.isfile(os.path.join(backup_file['path'], MANIFEST_NAME)):
+                    keep.update(os.path.normpath(path) for path in resolve_chain(backup_file['path']))
+            
             # Remove old backups
             if len(backup_files) > schedule.max_backups_to_keep:
                 for backup_file in backup_files[schedule.max_backups_to_keep:]:
-                    os.remove(backup_file['path'])
+                    if os.path.normpath(backup_file['path']) in keep:
+                        continue
+                    if os.path.isdir(backup_file['path']):
+                        shutil.rmtree(backup_file['path'])
+                    else:
+                        os.remove(backup_file['path'])
                     logger.info(f"Removed old backup: {backup_file['path']}")
             
         except Exception as e:
@@ -485,13 +576,30 @@ class DataSyncService:
     """Service for data synchronization with external systems"""
     
     def __init__(self):
-        self.timeout = 30
+        self.chunk_size = 1000
+        self.delivery = delivery_engine
+    
+    @property
+    def delivery_window(self) -> int:
+        """Batches delivered concurrently before the cursor is saved"""
+        return getattr(settings, 'DATA_SYNC_DELIVERY_WINDOW', 8)
     
     def execute_sync_task(self, task: DataSyncTask) -> bool:
-        """Execute a data synchronization task"""
+        """
+        Execute a data synchronization task.
+
+        The first run (no ``change_cursor`` yet) syncs every source row; later
+        runs only sync rows the change feed recorded since the task's cursor,
+        which advances after each window of batches is delivered. One-way
+        tasks keep that cursor per integration (see ``_push_changes``).
+        """
         try:
             logger.info(f"Starting sync task: {task.name}")
             
+            if task.sync_type not in ('one_way', 'two_way'):
+                logger.error(f"Unsupported sync type: {task.sync_type}")
+                return False
+            
             # Get source data
             source_model = apps.get_model(task.source_model)
             source_data = source_model.objects.all()
@@ -499,23 +607,20 @@ class DataSyncService:
             if task.filters:
                 source_data = source_data.filter(**task.filters)
             
-            # Apply transformations
-            transformed_data = self._apply_transformations(source_data, task.transform_rules)
+            # Compile the rules once per run; filters they allow go to the database
+            plan = compile_rules(task.transform_rules, source_model)
+            source_data = plan.filter_queryset(source_data).values()
             
-            # Sync based on sync type
-            if task.sync_type == 'one_way':
-                success = self._one_way_sync(transformed_data, task)
-            elif task.sync_type == 'two_way':
-                success = self._two_way_sync(transformed_data, task)
+            if task.sync_type == 'two_way':
+                success, synced = self._two_way_sync(task, source_data, plan)
             else:
-                logger.error(f"Unsupported sync type: {task.sync_type}")
-                return False
+                success, synced = self._push_changes(task, source_data, plan)
             
             if success:
                 task.last_run = timezone.now()
                 task.last_sync_status = 'success'
-                task.last_sync_message = f"Synced {len(transformed_data)} records"
-                task.total_synced_records += len(transformed_data)
+                task.last_sync_message = f"Synced {synced} records"
+                task.total_synced_records += synced
             else:
                 task.last_sync_status = 'failed'
                 task.last_sync_message = "Sync operation failed"
@@ -533,42 +638,288 @@ class DataSyncService:
             task.save(update_fields=['last_sync_status', 'last_sync_message'])
             return False
     
-    def _apply_transformations(self, data, transform_rules: List) -> List:
-        """Apply transformation rules to data"""
-        if not transform_rules:
-            return data
+    def _sync_batches(self, task: DataSyncTask, source_data, after: Optional[int]):
+        """
+        Yield ``(records, deleted pks, cursor, key)`` batches to sync from change log id ``after``.
+
+        A full sync yields keyset chunks of the whole source and the cursor
+        only with its last batch: the change log position is read before
+        the source, so changes made while copying are replayed next run.
+        ``key`` names the batch for idempotent delivery; incremental batches
+        are named by their change log range so reruns reuse the key.
+        """
+        if after is None:
+            cursor = change_feed.latest_id()
+            started = timezone.now().isoformat()
+            for number, batch in enumerate(keyset_chunks(source_data, self.chunk_size)):
+                yield batch, [], None, f"full:{started}:{number}"
+            yield [], [], cursor, None
+            return
+        
+        previous = after
+        for page in change_feed.pages(task.source_model, after, self.chunk_size):
+            records = list(source_data.filter(pk__in=page['changed']).order_by('pk'))
+            yield records, page['deleted'], page['cursor'], f"changes:{previous}-{page['cursor']}"
+            previous = page['cursor']
+    
+    def _delivery_windows(self, task: DataSyncTask, source_data, plan: TransformPlan, after: Optional[int]):
+        """Group transformed batches into windows of ``delivery_window``, with the cursor after each"""
+        window, window_cursor = [], None
+        for records, deleted, cursor, key in self._sync_batches(task, source_data, after):
+            transformed_data = self._apply_transformations(records, plan)
+            if transformed_data or deleted:
+                window.append({'key': key, 'records': transformed_data, 'deleted': deleted})
+            if cursor is not None:
+                window_cursor = cursor
+            if len(window) >= self.delivery_window:
+                yield window, window_cursor
+                window, window_cursor = [], None
+        if window or window_cursor is not None:
+            yield window, window_cursor
+    
+    def _push_changes(self, task: DataSyncTask, source_data, plan: TransformPlan):
+        """
+        Deliver every window of changes one way; returns ``(success, records synced)``.
+
+        Each integration keeps its own cursor in ``target_cursors``, so one
+        failing or slow endpoint only holds back itself. Targets at the same
+        cursor share a lane and receive its windows together; a target whose
+        delivery fails leaves the lane at its last delivered window and
+        retries from there next run, while the rest keep advancing.
+        ``change_cursor`` follows the slowest target that has one.
+        """
+        targets = self._delivery_targets(task)
+        if not targets:
+            logger.error(f"Sync task {task.name} has no active integration to deliver to")
+            return False, 0
+        
+        # Integrations added later start from the task's cursor
+        cursors = {target['id']: task.target_cursors.get(target['id'], task.change_cursor) for target in targets}
+        lanes = {}
+        for target in targets:
+            lanes.setdefault(cursors[target['id']], []).append(target)
+        
+        success = True
+        synced = 0
+        for after, lane in lanes.items():
+            lane_synced = 0
+            for window, cursor in self._delivery_windows(task, source_data, plan, after):
+                if window:
+                    failed = set(self._one_way_sync(window, task, lane))
+                    if failed:
+                        success = False
+                        lane = [target for target in lane if target['id'] not in failed]
+                        if not lane:
+                            break
+                    lane_synced += sum(len(batch['records']) + len(batch['deleted']) for batch in window)
+                if cursor is not None:
+                    cursors.update((target['id'], cursor) for target in lane)
+                    self._save_target_cursors(task, cursors)
+            synced = max(synced, lane_synced)
+        return success, synced
+    
+    def _save_target_cursors(self, task: DataSyncTask, cursors: Dict[str, Optional[int]]):
+        task.target_cursors = cursors
+        # Targets without a cursor still need a full sync, not the log
+        positions = [cursor for cursor in cursors.values() if cursor is not None]
+        task.change_cursor = min(positions) if positions else None
+        task.save(update_fields=['target_cursors', 'change_cursor'])
+    
+    def _save_cursor(self, task: DataSyncTask, cursor: Optional[int]):
+        if cursor is not None:
+            task.change_cursor = cursor
+            task.save(update_fields=['change_cursor'])
+    
+    def _apply_transformations(self, data, plan: TransformPlan) -> List:
+        """Apply compiled transformation rules to a batch of row dicts"""
+        return plan.run(data)
+    
+    def _delivery_targets(self, task: DataSyncTask) -> List[Dict[str, Any]]:
+        """Active integrations of ``task``, plus the one named by ``external_system_name``"""
+        integrations = ExternalSystemIntegration.objects.filter(is_active=True).exclude(endpoint_url='')
+        query = models.Q(sync_tasks=task)
+        if task.external_system_name:
+            query |= models.Q(name=task.external_system_name)
+        return [target_from_integration(integration) for integration in integrations.filter(query).distinct()]
+    
+    def _deliver(self, batches: List[Dict[str, Any]], task: DataSyncTask,
+                 targets: List[Dict[str, Any]] = None) -> List[str]:
+        """
+        Deliver a window of batches to ``targets`` (default: every target of
+        ``task``) concurrently; returns the ids of the targets that failed.
+        """
+        if targets is None:
+            targets = self._delivery_targets(task)
         
-        transformed = []
-        for item in data:
-            # Apply each transformation rule
-            for rule in transform_rules:
-                # This would implement various transformation logic
-                # For now, just pass through
-                pass
-            transformed.append(item)
+        context = {'task': task.name, 'source_model': task.source_model, 'sync_type': task.sync_type}
+        results = self.delivery.deliver(targets, batches, context)
         
-        return transformed
+        for target, result in zip(targets, results):
+            ExternalSystemIntegration.objects.filter(pk=target['id']).update(
+                last_connection_status=not result['failed'],
+                last_error_message=result['errors'][0] if result['errors'] else ''
+            )
+            logger.info(
+                f"Delivered {result['delivered']}/{len(batches)} batches of {task.name} to {result['target']}"
+            )
+        return [target['id'] for target, result in zip(targets, results) if result['failed']]
     
-    def _one_way_sync(self, data, task: DataSyncTask) -> bool:
-        """Perform one-way synchronization"""
+    def _one_way_sync(self, batches: List[Dict[str, Any]], task: DataSyncTask,
+                      targets: List[Dict[str, Any]]) -> List[str]:
+        """Perform one-way synchronization; returns the ids of the targets that failed"""
         try:
-            # This would implement the actual sync logic
-            # For now, just simulate
-            logger.info(f"One-way sync: {len(data)} records")
-            return True
+            return self._deliver(batches, task, targets)
         except Exception as e:
             logger.error(f"One-way sync failed: {e}")
-            return False
+            return [target['id'] for target in targets]
     
-    def _two_way_sync(self, data, task: DataSyncTask) -> bool:
-        """Perform two-way synchronization"""
+    def _two_way_sync(self, task: DataSyncTask, source_data, plan: TransformPlan):
+        """
+        Perform two-way synchronization; returns ``(success, rows reconciled)``.
+
+        Local changes come from the change feed and remote changes from the
+        integration's change feed; both are reconciled batch by batch
+        against the task's ``SyncRecordVersion`` rows, then the winners are
+        pushed out in one request per batch and applied locally in bulk.
+        """
         try:
-            # This would implement bidirectional sync logic
-            logger.info(f"Two-way sync: {len(data)} records")
-            return True
+            targets = self._delivery_targets(task)
+            if len(targets) != 1:
+                logger.error(f"Two-way sync task {task.name} needs exactly one integration, found {len(targets)}")
+                return False, 0
+            target = targets[0]
+            key_field = target['key_field']
+            pk = plan.model._meta.pk
+            if plan.source_field(key_field) not in (pk.name, pk.attname):
+                raise ValueError(f"Two-way sync key '{key_field}' must hold the source primary key")
+            
+            reconciler = Reconciler(task.conflict_policy, target['timestamp_field'])
+            records, remote_cursor = self.delivery.fetch_changes(target, task.remote_cursor)
+            remote = {str(record[key_field]): strip_remote(record) for record in records}
+            
+            synced = 0
+            for window, cursor in self._delivery_windows(task, source_data, plan, task.change_cursor):
+                local = {}
+                for batch in window:
+                    local.update((str(row[key_field]), row) for row in batch['records'])
+                    local.update((str(key), None) for key in batch['deleted'])
+                changed = {key: remote.pop(key) for key in list(local) if key in remote}
+                synced += self._reconcile(task, reconciler, plan, local, changed)
+                self._save_cursor(task, cursor)
+            
+            # Rows only the remote side changed
+            keys = list(remote)
+            for start in range(0, len(keys), self.chunk_size):
+                local = self._local_rows(source_data, plan, key_field, keys[start:start + self.chunk_size])
+                changed = {key: remote[key] for key in local}
+                synced += self._reconcile(task, reconciler, plan, local, changed)
+            
+            task.remote_cursor = remote_cursor
+            task.save(update_fields=['remote_cursor'])
+            return True, synced
         except Exception as e:
             logger.error(f"Two-way sync failed: {e}")
-            return False
+            return False, 0
+    
+    def _local_rows(self, source_data, plan: TransformPlan, key_field: str, keys: List[str]) -> Dict:
+        """
+        Current transformed rows for ``keys``; None for rows that do not
+        exist. Rows excluded by the task's filters are left out.
+        """
+        model = plan.model
+        pks = [model._meta.pk.to_python(key) for key in keys]
+        local = {str(row[key_field]): row for row in plan.run(source_data.filter(pk__in=pks))}
+        missing = [pk for key, pk in zip(keys, pks) if key not in local]
+        existing = {str(pk) for pk in model._default_manager.filter(pk__in=missing).values_list('pk', flat=True)}
+        local.update((key, None) for key in keys if key not in local and key not in existing)
+        return local
+    
+    def _reconcile(self, task: DataSyncTask, reconciler: Reconciler, plan: TransformPlan,
+                   local: Dict, remote: Dict) -> int:
+        """Reconcile one batch of rows, push and apply the outcome, and store the new versions"""
+        versions = {
+            version['object_pk']: version
+            for version in SyncRecordVersion.objects.filter(task=task, object_pk__in=list(local)).values(
+                'object_pk', 'row_hash', 'field_hashes', 'local_version', 'remote_version'
+            )
+        }
+        result = reconciler.reconcile(local, remote, versions)
+        if result['conflicts']:
+            logger.info(f"Resolved {result['conflicts']} conflicts for {task.name} ({task.conflict_policy})")
+        
+        if result['push'] or result['push_deleted']:
+            # Named by the new versions, so a retried push reuses its key
+            key = row_hash({key: [version['local_version'], version['remote_version']]
+                            for key, version in result['versions'].items()})
+            batch = {'key': f"reconcile:{key}", 'records': result['push'], 'deleted': result['push_deleted']}
+            if self._deliver([batch], task):
+                raise ConnectionError(f"Pushing reconciled rows of {task.name} failed")
+        
+        with transaction.atomic():
+            self._apply_remote(plan, result['apply'], result['apply_deleted'])
+            SyncRecordVersion.objects.bulk_create(
+                [SyncRecordVersion(task=task, object_pk=key, **version)
+                 for key, version in result['versions'].items()],
+                update_conflicts=True,
+                # MySQL upserts on any unique key and rejects an explicit target
+                unique_fields=(
+                    ['task', 'object_pk'] if connection.features.supports_update_conflicts_with_target else None
+                ),
+                update_fields=['row_hash', 'field_hashes', 'local_version', 'remote_version', 'synced_at'],
+            )
+        return len(result['versions'])
+    
+    def _apply_remote(self, plan: TransformPlan, rows: Dict[str, Dict], deleted: List[str]):
+        """Write remote rows and deletions to the source model in bulk"""
+        model = plan.model
+        pk = model._meta.pk
+        if deleted:
+            model._default_manager.filter(pk__in=[pk.to_python(key) for key in deleted]).delete()
+        if not rows:
+            return
+        
+        existing = {
+            str(value) for value in model._default_manager.filter(
+                pk__in=[pk.to_python(key) for key in rows]
+            ).values_list('pk', flat=True)
+        }
+        now = timezone.now()
+        stamped = [
+            field for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        ]
+        updates = {}
+        creates = []
+        for key, row in rows.items():
+            # Only columns that map straight back to a source field are written
+            values = {}
+            for name, value in row.items():
+                source = plan.source_field(name)
+                if source and source not in (pk.name, pk.attname):
+                    field = model._meta.get_field(source)
+                    values[field.attname] = None if value is None else field.to_python(value)
+            instance = model(pk=pk.to_python(key), **values)
+            if key in existing:
+                updates.setdefault(tuple(sorted(values)), []).append(instance)
+            else:
+                # Remote timestamps are kept; those the row lacks are stamped now
+                for field in stamped:
+                    if getattr(instance, field.attname) is None:
+                        setattr(instance, field.attname, now if isinstance(field, models.DateTimeField) else now.date())
+                creates.append(instance)
+        
+        for fields, instances in updates.items():
+            if fields:
+                model._default_manager.bulk_update(instances, list(fields), batch_size=self.chunk_size)
+        if creates:
+            with preserve_timestamps(model):
+                model._default_manager.bulk_create(creates, batch_size=self.chunk_size)
+        # Bulk writes send no model signals; let other sync tasks see these rows
+        updated = [instance.pk for instances in updates.values() for instance in instances]
+        if updated:
+            bulk_rows_written.send(sender=model, pks=updated, operation='update')
+        if creates:
+            bulk_rows_written.send(sender=model, pks=[instance.pk for instance in creates], operation='create')
 
 
 # Initialize services
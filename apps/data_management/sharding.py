@@ -0,0 +1,200 @@
+# ==============================================================================
+# SHARDED PARALLEL EXPORT
+# خروجی موازی داده‌ها بر اساس بازه‌های کلید اصلی
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import os
+import shutil
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Any, Callable, Optional, Tuple
+from django.apps import apps
+from django.core.serializers import serialize
+from openpyxl import load_workbook
+from .chunking import keyset_chunks
+from .exporters import CSVExportWriter, JSONExportWriter, ExcelExportWriter
+
+logger = logging.getLogger(__name__)
+
+# Set in each worker process by _init_worker
+_progress_queue = None
+
+
+def plan_shards(queryset, shard_count: int) -> List[Tuple[Any, Any]]:
+    """
+    Split ``queryset`` into up to ``shard_count`` primary-key ranges of
+    roughly equal row counts.
+
+    Ranges are ``(lower, upper)`` pairs meaning ``lower < pk <= upper``,
+    with ``None`` for an open end. Boundaries are read from the pk index
+    once per shard, so this works for integer and UUID keys alike.
+    """
+    total = queryset.count()
+    if shard_count <= 1 or total == 0:
+        return [(None, None)]
+
+    step = -(-total // shard_count)
+    keys = queryset.order_by('pk').values_list('pk', flat=True)
+    boundaries = []
+    for position in range(step - 1, total - 1, step):
+        key = keys[position]
+        if not boundaries or boundaries[-1] != key:
+            boundaries.append(key)
+
+    lowers = [None] + boundaries
+    uppers = boundaries + [None]
+    return list(zip(lowers, uppers))
+
+
+def shard_queryset(queryset, lower, upper):
+    """Restrict ``queryset`` to the shard ``lower < pk <= upper``"""
+    if lower is not None:
+        queryset = queryset.filter(pk__gt=lower)
+    if upper is not None:
+        queryset = queryset.filter(pk__lte=upper)
+    return queryset
+
+
+def export_shard(spec: Dict[str, Any], report: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Export one shard to its part file and return the number of rows written.
+
+    ``spec`` holds only picklable values (model label, filters, bounds, part
+    path) so it can be sent to a worker process. ``report`` is called with
+    ``(shard index, rows so far)`` after each chunk.
+    """
+    model_class = apps.get_model(spec['model_name'])
+    queryset = model_class.objects.all()
+    if spec['filters']:
+        queryset = queryset.filter(**spec['filters'])
+    queryset = shard_queryset(queryset, spec['lower'], spec['upper'])
+
+    processed = 0
+    with open(spec['path'], 'wb') as stream:
+        if spec['format'] == 'json':
+            # Parts are always NDJSON; array output is assembled on merge
+            writer = JSONExportWriter(stream, [], mode='ndjson')
+            writer.open()
+            for chunk in keyset_chunks(queryset, spec['chunk_size']):
+                writer.write_objects(serialize('python', chunk))
+                processed += len(chunk)
+                if report:
+                    report(spec['index'], processed)
+        else:
+            fields = model_class._meta.concrete_fields
+            if spec['format'] == 'csv':
+                writer = CSVExportWriter(stream, [field.name for field in fields], header=False)
+            else:
+                writer = ExcelExportWriter(stream, [field.name for field in fields])
+            writer.open()
+            rows = queryset.values_list(*[field.attname for field in fields])
+            for chunk in keyset_chunks(rows, spec['chunk_size']):
+                writer.write_rows(chunk)
+                processed += len(chunk)
+                if report:
+                    report(spec['index'], processed)
+        writer.close()
+
+    return processed
+
+
+def part_path(directory: str, index: int, format: str) -> str:
+    """Path of the part file for shard ``index``"""
+    extension = {'csv': 'csv', 'json': 'ndjson', 'excel': 'xlsx'}[format]
+    return os.path.join(directory, f"part-{index:04d}.{extension}")
+
+
+def merge_parts(paths: List[str], format: str, fieldnames: List[str], stream, json_mode: str = 'array'):
+    """Combine shard part files, in shard order, into the final export"""
+    if format == 'csv':
+        writer = CSVExportWriter(stream, fieldnames)
+        writer.open()
+        writer.close()
+        for path in paths:
+            with open(path, 'rb') as part:
+                shutil.copyfileobj(part, stream)
+
+    elif format == 'json' and json_mode == 'ndjson':
+        for path in paths:
+            with open(path, 'rb') as part:
+                shutil.copyfileobj(part, stream)
+
+    elif format == 'json':
+        stream.write(b'[')
+        first = True
+        for path in paths:
+            with open(path, 'rb') as part:
+                for line in part:
+                    stream.write(line.rstrip(b'\n') if first else b',\n' + line.rstrip(b'\n'))
+                    first = False
+        stream.write(b']')
+
+    else:
+        writer = ExcelExportWriter(stream, fieldnames)
+        writer.open()
+        for path in paths:
+            workbook = load_workbook(path, read_only=True)
+            try:
+                rows = workbook.worksheets[0].iter_rows(values_only=True)
+                next(rows, None)  # Header row
+                writer.write_rows(rows)
+            finally:
+                workbook.close()
+        writer.close()
+
+
+def _init_worker(queue):
+    """Prepare a freshly spawned worker process"""
+    global _progress_queue
+    import django
+    django.setup()
+    _progress_queue = queue
+
+
+def _run_shard(spec: Dict[str, Any]) -> int:
+    return export_shard(spec, lambda index, processed: _progress_queue.put((index, processed)))
+
+
+def run_shards(specs: List[Dict[str, Any]], max_workers: int,
+               on_progress: Callable[[int], None]) -> int:
+    """
+    Export every shard, in worker processes when ``max_workers`` > 1, and
+    return the total row count.
+
+    ``on_progress`` receives the running total across all shards. Workers
+    are spawned rather than forked so none inherits the parent's database
+    connections.
+    """
+    counts = [0] * len(specs)
+
+    def record(index, processed):
+        counts[index] = max(counts[index], processed)
+        on_progress(sum(counts))
+
+    if max_workers <= 1 or len(specs) == 1:
+        for spec in specs:
+            counts[spec['index']] = export_shard(spec, record)
+        return sum(counts)
+
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(specs)), mp_context=context,
+                             initializer=_init_worker, initargs=(queue,)) as executor:
+        futures = {executor.submit(_run_shard, spec): spec['index'] for spec in specs}
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                while not queue.empty():
+                    record(*queue.get())
+                for future in done:
+                    record(futures[future], future.result())
+        except Exception:
+            # Don't start shards still queued once one has failed
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+    return sum(counts)
+
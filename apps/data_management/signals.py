@@ -0,0 +1,52 @@
+# ==============================================================================
+# DATA MANAGEMENT SIGNAL HANDLERS
+# سیگنال‌های مدیریت داده‌ها
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+from django.db.models.signals import post_save, post_delete
+
+from .changes import bulk_rows_written, change_feed
+from .models import ChangeLogEntry, DataSyncTask
+
+
+def record_save(sender, instance, created, raw=False, **kwargs):
+    """Append a change log entry when a watched model is saved"""
+    if raw or not change_feed.is_watched(sender):
+        return
+    # Written in the saving transaction, so a rollback drops the entry too
+    ChangeLogEntry.objects.create(
+        model_label=sender._meta.label_lower,
+        object_pk=str(instance.pk),
+        operation='create' if created else 'update'
+    )
+
+
+def record_delete(sender, instance, **kwargs):
+    """Append a change log entry when a watched model is deleted"""
+    if not change_feed.is_watched(sender):
+        return
+    ChangeLogEntry.objects.create(
+        model_label=sender._meta.label_lower,
+        object_pk=str(instance.pk),
+        operation='delete'
+    )
+
+
+def record_bulk_write(sender, pks, operation, **kwargs):
+    """Append change log entries for rows written by a bulk writer"""
+    if not pks or not change_feed.is_watched(sender):
+        return
+    change_feed.record_changes(sender, pks, operation)
+
+
+def reload_watched_models(sender, **kwargs):
+    """Pick up added, removed or re-pointed sync tasks"""
+    change_feed.reset()
+
+
+post_save.connect(record_save, dispatch_uid='data_sync_change_save')
+post_delete.connect(record_delete, dispatch_uid='data_sync_change_delete')
+bulk_rows_written.connect(record_bulk_write, dispatch_uid='data_sync_change_bulk_write')
+post_save.connect(reload_watched_models, sender=DataSyncTask, dispatch_uid='data_sync_task_saved')
+post_delete.connect(reload_watched_models, sender=DataSyncTask, dispatch_uid='data_sync_task_deleted')
@@ -0,0 +1,976 @@
+# ==============================================================================
+# TESTS FOR DATA MANAGEMENT APP
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth.models import Permission
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from openpyxl import Workbook, load_workbook
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.courses.models import Course
+from apps.data_management.backups import read_manifest, read_table, watermark_field
+from apps.data_management.changes import bulk_rows_written, change_feed
+from apps.data_management.delivery import DeliveryEngine, target_from_integration
+from apps.data_management.chunking import keyset_chunks, keyset_iterator
+from apps.data_management.importers import BulkImporter
+from apps.data_management.models import (
+    BackupSchedule, ChangeLogEntry, DataSyncTask, ExternalSystemIntegration, ImportExportJob,
+    SyncRecordVersion
+)
+from apps.data_management.reconcile import Reconciler, field_hashes, row_hash
+from apps.data_management.progress import JobProgressReporter, get_live_progress
+from apps.data_management.restore import dependency_waves
+from apps.data_management.readers import CSVRecordReader, ExcelRecordReader, JSONRecordReader
+from apps.data_management.services import BackupService, DataImportExportService, DataSyncService
+from apps.data_management.sharding import plan_shards, shard_queryset
+from apps.data_management.transforms import compile_rules
+from apps.data_management.views import ImportExportJobViewSet
+from apps.users.models import User
+
+
+class DataManagementTestCase(TestCase):
+    """Base test case writing job files to a throwaway MEDIA_ROOT"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+        self.addCleanup(self.media_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        self.user = User.objects.create_user(
+            username='admin1',
+            national_id='1234567890',
+            email='admin@test.com',
+            password='testpass123',
+            user_type='EMPLOYEE'
+        )
+        self.service = DataImportExportService()
+        self.service.chunk_size = 7
+
+    def create_courses(self, count):
+        Course.objects.bulk_create([
+            Course(title=f'Course {index}', code=f'C{index:04d}', professor=self.user)
+            for index in range(count)
+        ])
+
+    def run_export(self, format, **config):
+        job = self.service.create_export_job(self.user, 'courses.Course', format=format, config=config)
+        self.assertTrue(self.service.execute_export_job(job))
+        job.refresh_from_db()
+        return job
+
+
+class StreamingExportTest(DataManagementTestCase):
+    """Test streaming export writers"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_courses(20)
+
+    def test_csv_export(self):
+        job = self.run_export('csv')
+        with job.result_file.open('rb') as f:
+            rows = list(csv.DictReader(io.TextIOWrapper(f, encoding='utf-8')))
+
+        self.assertEqual(job.success_records, 20)
+        self.assertEqual(len(rows), 20)
+        self.assertEqual({row['code'] for row in rows}, {f'C{index:04d}' for index in range(20)})
+        self.assertEqual(rows[0]['professor'], str(self.user.id))
+
+    def test_json_array_export(self):
+        job = self.run_export('json')
+        with job.result_file.open('rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+
+        self.assertEqual(len(data), 20)
+        self.assertEqual(data[0]['model'], 'courses.course')
+        self.assertIn('code', data[0]['fields'])
+
+    def test_ndjson_export(self):
+        job = self.run_export('json', json_mode='ndjson')
+        with job.result_file.open('rb') as f:
+            lines = f.read().decode('utf-8').splitlines()
+
+        self.assertEqual(len(lines), 20)
+        self.assertEqual(json.loads(lines[-1])['model'], 'courses.course')
+
+    def test_excel_export(self):
+        job = self.run_export('excel')
+        with job.result_file.open('rb') as f:
+            sheet = load_workbook(io.BytesIO(f.read()), read_only=True)['Data']
+            rows = list(sheet.iter_rows(values_only=True))
+
+        self.assertEqual(rows[0][:3], ('id', 'title', 'code'))
+        self.assertEqual(len(rows), 21)
+
+
+class ShardedExportTest(DataManagementTestCase):
+    """Test primary-key sharded exports (run in-process under test settings)"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_courses(23)
+
+    def test_shards_partition_the_table(self):
+        shards = plan_shards(Course.objects.all(), 4)
+        self.assertEqual(len(shards), 4)
+
+        sizes = [shard_queryset(Course.objects.all(), lower, upper).count() for lower, upper in shards]
+        self.assertEqual(sizes, [6, 6, 6, 5])
+
+    def test_sharded_csv_matches_single_export(self):
+        single = self.run_export('csv')
+        sharded = self.run_export('csv', shards=4)
+
+        with single.result_file.open('rb') as a, sharded.result_file.open('rb') as b:
+            self.assertEqual(a.read(), b.read())
+        self.assertEqual(sharded.success_records, 23)
+        self.assertEqual(sharded.processed_records, 23)
+
+    def test_sharded_json_and_excel(self):
+        job = self.run_export('json', shards=3)
+        with job.result_file.open('rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        self.assertEqual([obj['fields']['code'] for obj in data], [f'C{index:04d}' for index in range(23)])
+
+        job = self.run_export('excel', shards=3)
+        with job.result_file.open('rb') as f:
+            rows = list(load_workbook(io.BytesIO(f.read()), read_only=True)['Data'].iter_rows(values_only=True))
+        self.assertEqual(len(rows), 24)
+        self.assertEqual(rows[0][:3], ('id', 'title', 'code'))
+
+
+class KeysetChunkTest(DataManagementTestCase):
+    """Test keyset chunk iteration"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_courses(25)
+
+    def test_chunks_cover_table_in_pk_order(self):
+        chunks = list(keyset_chunks(Course.objects.all(), 10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+
+        pks = [obj.pk for chunk in chunks for obj in chunk]
+        self.assertEqual(pks, sorted(Course.objects.values_list('pk', flat=True)))
+
+    def test_values_querysets(self):
+        rows = list(keyset_iterator(Course.objects.values('id', 'code'), 4))
+        self.assertEqual(len(rows), 25)
+
+        rows = list(keyset_iterator(Course.objects.values_list('code', 'id'), 4))
+        self.assertEqual(len({row[1] for row in rows}), 25)
+
+        with self.assertRaises(ValueError):
+            list(keyset_chunks(Course.objects.values_list('code'), 4))
+
+    def test_no_offset_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            list(keyset_chunks(Course.objects.all(), 10))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+
+    def test_rows_deleted_mid_iteration_do_not_shift_chunks(self):
+        seen = []
+        for chunk in keyset_chunks(Course.objects.all(), 10):
+            seen.extend(obj.pk for obj in chunk)
+            if len(seen) == 10:
+                Course.objects.filter(pk__in=seen[:5]).delete()
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+
+class BulkImportTest(DataManagementTestCase):
+    """Test the bulk import pipeline"""
+
+    def run_import(self, rows, **config):
+        content = io.StringIO()
+        writer = csv.DictWriter(content, fieldnames=['title', 'code', 'professor'])
+        writer.writeheader()
+        writer.writerows(rows)
+        upload = SimpleUploadedFile('courses.csv', content.getvalue().encode('utf-8'))
+
+        job = self.service.create_import_job(self.user, 'courses.Course', upload, config=config)
+        self.assertTrue(self.service.execute_import_job(job))
+        job.refresh_from_db()
+        return job
+
+    def test_bulk_insert_isolates_bad_rows(self):
+        rows = [
+            {'title': f'Course {index}', 'code': f'C{index:04d}', 'professor': self.user.id}
+            for index in range(12)
+        ]
+        rows[3]['code'] = 'C0002'              # duplicate key: fails in the database
+        rows[8]['professor'] = 'not-a-number'  # fails field validation
+
+        job = self.run_import(rows, batch_size=5)
+
+        self.assertEqual(job.success_records, 10)
+        self.assertEqual(job.error_records, 2)
+        self.assertEqual(list(job.record_errors.values_list('record_number', flat=True)), [4, 9])
+        self.assertEqual(job.record_errors.get(record_number=4).data['code'], 'C0002')
+        self.assertEqual(Course.objects.count(), 10)
+
+    def test_bulk_insert_query_count(self):
+        rows = [
+            {'title': f'Course {index}', 'code': f'C{index:04d}', 'professor': self.user.id}
+            for index in range(40)
+        ]
+        importer = BulkImporter(Course, batch_size=20)
+        with CaptureQueriesContext(connection) as queries:
+            results = list(importer.import_batches(enumerate(rows)))
+
+        self.assertEqual(sum(result['success'] for result in results), 40)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+
+    def test_upsert_on_natural_key(self):
+        self.create_courses(3)
+        rows = [
+            {'title': 'Renamed', 'code': 'C0001', 'professor': self.user.id},
+            {'title': 'New', 'code': 'C0100', 'professor': self.user.id},
+        ]
+
+        job = self.run_import(rows, upsert_key='code')
+
+        self.assertEqual(job.success_records, 2)
+        self.assertEqual(Course.objects.count(), 4)
+        self.assertEqual(Course.objects.get(code='C0001').title, 'Renamed')
+        self.assertEqual(Course.objects.get(code='C0000').title, 'Course 0')
+
+    def test_batches_signal_their_pks_when_the_backend_returns_none(self):
+        written = []
+
+        def receiver(sender, pks, operation, **kwargs):
+            written.append((sender, sorted(pks), operation))
+        bulk_rows_written.connect(receiver)
+        self.addCleanup(bulk_rows_written.disconnect, receiver)
+
+        rows = [{'title': f'Course {index}', 'code': f'C{index:04d}', 'professor': self.user.id} for index in range(3)]
+        entries = [{'model_label': 'courses.course', 'object_pk': str(index), 'operation': 'create'} for index in range(2)]
+        features = type(connection.features)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock,
+                               return_value=False), \
+                mock.patch.object(features, 'supports_update_conflicts_with_target', new_callable=mock.PropertyMock,
+                                  return_value=False):
+            list(BulkImporter(Course).import_batches(enumerate(rows[:2])))
+            list(BulkImporter(Course, upsert_key='code').import_batches([(2, rows[2])]))
+            list(BulkImporter(ChangeLogEntry).import_batches(enumerate(entries)))
+
+        courses = list(Course.objects.order_by('code').values_list('pk', flat=True))
+        self.assertEqual(written, [
+            (Course, courses[:2], 'create'),
+            (Course, courses[2:], 'update'),
+            (ChangeLogEntry, sorted(ChangeLogEntry.objects.values_list('pk', flat=True)), 'create'),
+        ])
+
+    def test_upsert_key_must_be_unique(self):
+        with self.assertRaises(ValueError):
+            BulkImporter(Course, upsert_key='title')
+
+
+class StreamingReaderTest(DataManagementTestCase):
+    """Test streaming import readers"""
+
+    records = [
+        {'title': f'Course {index}', 'code': f'C{index:04d}', 'note': 'x' * (index * 3)}
+        for index in range(30)
+    ]
+
+    def test_json_array_reader_across_buffer_edges(self):
+        payload = json.dumps(self.records, indent=2).encode('utf-8')
+        reader = JSONRecordReader(io.BytesIO(payload))
+        reader.read_size = 17
+
+        self.assertEqual(list(reader), self.records)
+        self.assertEqual(reader.progress, 100.0)
+
+    def test_ndjson_reader(self):
+        payload = '\n'.join(json.dumps(record) for record in self.records).encode('utf-8')
+        reader = JSONRecordReader(io.BytesIO(payload))
+        reader.read_size = 23
+
+        self.assertEqual(list(reader), self.records)
+
+    def test_csv_reader_reports_byte_progress(self):
+        content = io.StringIO()
+        writer = csv.DictWriter(content, fieldnames=['title', 'code', 'note'])
+        writer.writeheader()
+        writer.writerows(self.records)
+        reader = CSVRecordReader(io.BytesIO(content.getvalue().encode('utf-8')))
+
+        iterator = iter(reader)
+        first = next(iterator)
+        self.assertEqual(first['code'], 'C0000')
+        self.assertGreater(reader.progress, 0)
+        self.assertEqual(len(list(iterator)), 29)
+        self.assertEqual(reader.progress, 100.0)
+
+    def test_excel_reader(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['title', 'code'])
+        for record in self.records:
+            sheet.append([record['title'], record['code']])
+        output = io.BytesIO()
+        workbook.save(output)
+
+        reader = ExcelRecordReader(output)
+        rows = list(reader)
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(rows[-1], {'title': 'Course 29', 'code': 'C0029'})
+        self.assertEqual(reader.progress, 100.0)
+
+    def test_json_import_job(self):
+        records = [
+            {'title': f'Course {index}', 'code': f'C{index:04d}', 'professor': str(self.user.id)}
+            for index in range(15)
+        ]
+        upload = SimpleUploadedFile('courses.json', json.dumps(records).encode('utf-8'))
+        job = self.service.create_import_job(self.user, 'courses.Course', upload, format='json')
+
+        self.assertTrue(self.service.execute_import_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.total_records, 15)
+        self.assertEqual(job.success_records, 15)
+        self.assertEqual(Course.objects.count(), 15)
+
+
+class ProgressReportingTest(DataManagementTestCase):
+    """Test throttled job progress reporting"""
+
+    def setUp(self):
+        super().setUp()
+        self.job = self.service.create_export_job(self.user, 'courses.Course')
+
+    def test_updates_are_published_but_written_once_per_interval(self):
+        progress = JobProgressReporter(self.job, interval=3600)
+        with CaptureQueriesContext(connection) as queries:
+            for processed in range(10, 110, 10):
+                progress.update(processed=processed, percentage=processed)
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(get_live_progress(self.job.id)['processed_records'], 100)
+        stored = ImportExportJob.objects.get(pk=self.job.pk)
+        self.assertEqual(stored.processed_records, 0)
+
+        progress.close()
+        stored.refresh_from_db()
+        self.assertEqual(stored.processed_records, 100)
+        self.assertIsNone(get_live_progress(self.job.id))
+
+    def test_record_errors_are_capped(self):
+        progress = JobProgressReporter(self.job, interval=0, max_errors=3)
+        for record in range(1, 6):
+            progress.add_error(record, 'bad value', {'code': record})
+        progress.update(errors=5)
+        progress.close()
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.error_records, 5)
+        self.assertEqual(self.job.record_errors.count(), 3)
+        self.assertEqual(len(self.job.warnings), 1)
+
+    def test_record_errors_limit_is_clamped(self):
+        progress = JobProgressReporter(self.job, interval=0)
+        progress.add_error(1, 'bad value', {})
+        progress.close()
+        view = ImportExportJobViewSet.as_view({'get': 'record_errors'})
+
+        def get(limit):
+            request = APIRequestFactory().get('/jobs/errors/', {'limit': limit})
+            force_authenticate(request, user=self.user)
+            return view(request, pk=self.job.pk)
+
+        self.assertEqual(len(get('-5').data['errors']), 1)
+        self.assertEqual(get('abc').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BackupTestCase(DataManagementTestCase):
+    """Base test case writing backups to the throwaway MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_courses(30)
+        self.backup_dir = os.path.join(self.media_root, 'backups')
+        with override_settings(BACKUP_DIR=self.backup_dir):
+            self.backup_service = BackupService()
+
+    def create_schedule(self, **kwargs):
+        kwargs.setdefault('include_tables', ['courses.course', 'courses.course_students'])
+        return BackupSchedule.objects.create(
+            name='Nightly Courses',
+            storage_path=self.backup_dir,
+            created_by=self.user,
+            **kwargs
+        )
+
+    def backup_dir_of(self, schedule, position=0):
+        return os.path.join(self.backup_dir, self.backup_service.list_backups(schedule)[position]['filename'])
+
+
+class StreamingBackupTest(BackupTestCase):
+    """Test the streaming NDJSON backup engine"""
+
+    def test_backup_writes_manifest_and_tables(self):
+        schedule = self.create_schedule()
+        self.assertTrue(self.backup_service.create_backup(schedule))
+
+        backups = self.backup_service.list_backups(schedule)
+        self.assertEqual(len(backups), 1)
+        directory = os.path.join(self.backup_dir, backups[0]['filename'])
+        manifest = read_manifest(directory)
+
+        tables = {table['model']: table for table in manifest['tables']}
+        self.assertEqual(set(tables), {'courses.course', 'courses.course_students'})
+        course_table = tables['courses.course']
+        self.assertEqual(course_table['rows'], 30)
+        self.assertTrue(course_table['file'].endswith('.ndjson.gz'))
+        self.assertIn('users.user', course_table['depends_on'])
+
+        rows = list(read_table(directory, manifest, course_table))
+        code_index = course_table['fields'].index('code')
+        self.assertEqual([row[code_index] for row in rows], [f'C{index:04d}' for index in range(30)])
+
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.last_backup_status, 'completed')
+        self.assertGreater(schedule.last_backup_size, 0)
+
+    def test_checksum_mismatch_is_detected(self):
+        schedule = self.create_schedule(compress_backup=False)
+        self.assertTrue(self.backup_service.create_backup(schedule))
+        directory = os.path.join(self.backup_dir, self.backup_service.list_backups(schedule)[0]['filename'])
+        manifest = read_manifest(directory)
+        entry = next(table for table in manifest['tables'] if table['model'] == 'courses.course')
+
+        with open(os.path.join(directory, entry['file']), 'ab') as f:
+            f.write(b'[1]\n')
+        with self.assertRaises(ValueError):
+            list(read_table(directory, manifest, entry))
+
+
+@override_settings(BACKUP_WATERMARK_OVERLAP=0)
+class IncrementalBackupTest(BackupTestCase):
+    """Test watermark-driven incremental backups and chain restores"""
+
+    def course_rows(self, directory):
+        manifest = read_manifest(directory)
+        entry = next(table for table in manifest['tables'] if table['model'] == 'courses.course')
+        return manifest, entry['rows']
+
+    def test_incremental_chain_restore(self):
+        schedule = self.create_schedule()
+        self.assertTrue(self.backup_service.create_backup(schedule))
+
+        Course.objects.create(title='Added', code='N0001', professor=self.user)
+        renamed = Course.objects.get(code='C0003')
+        renamed.title = 'Renamed'
+        renamed.save()
+        self.assertTrue(self.backup_service.create_backup(schedule, backup_type='incremental'))
+
+        manifest, rows = self.course_rows(self.backup_dir_of(schedule))
+        self.assertEqual(manifest['backup_type'], 'incremental')
+        self.assertEqual(rows, 2)
+
+        Course.objects.create(title='Added later', code='N0002', professor=self.user)
+        self.assertTrue(self.backup_service.create_backup(schedule, backup_type='incremental'))
+        latest = self.backup_service.list_backups(schedule)[0]['filename']
+
+        created_at = Course.objects.get(code='C0000').created_at
+        Course.objects.all().delete()
+        totals = self.backup_service.restore_backup(latest)
+
+        self.assertEqual(totals['courses.course'], 30 + 2 + 1)
+        self.assertEqual(Course.objects.count(), 32)
+        self.assertEqual(Course.objects.get(code='C0003').title, 'Renamed')
+        self.assertEqual(Course.objects.get(code='C0000').created_at, created_at)
+
+    def test_tables_without_updated_at_are_copied_in_full(self):
+        self.assertEqual(watermark_field(Course), 'updated_at')
+        self.assertEqual(watermark_field(Course.students.through), 'pk')
+        self.assertIsNone(watermark_field(ChangeLogEntry))
+        with override_settings(BACKUP_APPEND_ONLY_MODELS=['data_management.ChangeLogEntry']):
+            self.assertEqual(watermark_field(ChangeLogEntry), 'pk')
+
+    def test_differential_builds_on_last_full(self):
+        schedule = self.create_schedule()
+        self.assertTrue(self.backup_service.create_backup(schedule, backup_type='differential'))
+        full = read_manifest(self.backup_dir_of(schedule))
+        self.assertEqual(full['backup_type'], 'full')
+
+        Course.objects.create(title='First', code='N0001', professor=self.user)
+        self.assertTrue(self.backup_service.create_backup(schedule, backup_type='incremental'))
+        Course.objects.create(title='Second', code='N0002', professor=self.user)
+        self.assertTrue(self.backup_service.create_backup(schedule, backup_type='differential'))
+
+        manifest, rows = self.course_rows(self.backup_dir_of(schedule))
+        self.assertEqual(manifest['parent'], full['name'])
+        self.assertEqual(rows, 2)
+
+
+class ParallelRestoreTest(BackupTestCase):
+    """Test dependency-ordered restores and the restore command"""
+
+    def test_dependency_waves(self):
+        tables = [
+            {'model': 'courses.course_students', 'depends_on': ['courses.course', 'users.user']},
+            {'model': 'courses.course', 'depends_on': ['users.user']},
+            {'model': 'users.user', 'depends_on': []},
+            {'model': 'app.unit', 'depends_on': ['app.unit', 'other.missing']},
+            {'model': 'app.a', 'depends_on': ['app.b']},
+            {'model': 'app.b', 'depends_on': ['app.a']},
+        ]
+        waves = [[[table['model'] for table in group] for group in wave] for wave in dependency_waves(tables)]
+
+        self.assertEqual(waves, [
+            [['users.user'], ['app.unit']],
+            [['courses.course']],
+            [['courses.course_students']],
+            [['app.a', 'app.b']],
+        ])
+
+    def test_restore_command(self):
+        course = Course.objects.get(code='C0000')
+        course.students.add(self.user)
+        schedule = self.create_schedule()
+        self.assertTrue(self.backup_service.create_backup(schedule))
+        name = self.backup_service.list_backups(schedule)[0]['filename']
+        Course.objects.all().delete()
+
+        output = io.StringIO()
+        call_command(
+            'data_management', 'restore', '--backup', name,
+            '--backup-dir', self.backup_dir, '--batch-size', '8', stdout=output
+        )
+
+        self.assertIn('courses.course: 30 rows', output.getvalue())
+        self.assertEqual(Course.objects.count(), 30)
+        self.assertEqual(list(Course.objects.get(code='C0000').students.all()), [self.user])
+
+    def test_permissions_are_restored_by_natural_key(self):
+        permission = Permission.objects.get(codename='change_course')
+        self.user.user_permissions.add(permission)
+        schedule = self.create_schedule(include_tables=['users.user_user_permissions'])
+        self.assertTrue(self.backup_service.create_backup(schedule))
+        name = self.backup_service.list_backups(schedule)[0]['filename']
+
+        # As on a freshly migrated database: the permission has another id,
+        # and its old id belongs to a different permission
+        old_id, content_type = permission.pk, permission.content_type
+        permission.delete()
+        Permission.objects.create(pk=old_id, codename='delete_everything', name='Decoy', content_type=content_type)
+        Permission.objects.create(codename='change_course', name='Can change course', content_type=content_type)
+
+        self.backup_service.restore_backup(name)
+
+        self.assertEqual(
+            list(User.objects.get(pk=self.user.pk).user_permissions.values_list('codename', flat=True)),
+            ['change_course']
+        )
+
+    def test_restore_resets_pk_sequences(self):
+        schedule = self.create_schedule()
+        self.assertTrue(self.backup_service.create_backup(schedule))
+        name = self.backup_service.list_backups(schedule)[0]['filename']
+        Course.objects.all().delete()
+
+        # SQLite needs no reset; check the statements a sequence backend gets are run
+        reset = mock.Mock(side_effect=lambda style, models: [f"SELECT '{models[0]._meta.label_lower}'"])
+        with mock.patch.object(connection.ops, 'sequence_reset_sql', reset), \
+                CaptureQueriesContext(connection) as queries:
+            self.backup_service.restore_backup(name)
+
+        self.assertIn("SELECT 'courses.course'", [query['sql'] for query in queries])
+        added = Course.objects.create(title='After restore', code='N0001', professor=self.user)
+        self.assertGreater(added.pk, Course.objects.exclude(pk=added.pk).order_by('-pk').first().pk)
+
+
+@override_settings(DATA_SYNC_CHANGE_LAG=0)
+class ChangeCaptureTest(DataManagementTestCase):
+    """Test the change log and incremental sync runs"""
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(change_feed.reset)
+        self.create_courses(5)
+        self.task = DataSyncTask.objects.create(
+            name='Ministry courses', source_model='courses.Course', created_by=self.user
+        )
+        self.task.integrations.create(
+            name='Ministry', system_type='api', endpoint_url='http://ministry.test/', created_by=self.user
+        )
+        self.sync_service = DataSyncService()
+        self.sync_service.chunk_size = 2
+        self.batches = []
+
+        def record(batches, task, targets):
+            self.batches.extend(
+                ([item['code'] for item in batch['records']], list(batch['deleted'])) for batch in batches
+            )
+            return []
+        self.sync_service._one_way_sync = record
+
+    def run_sync(self):
+        self.batches = []
+        self.assertTrue(self.sync_service.execute_sync_task(self.task))
+        self.task.refresh_from_db()
+        return self.batches
+
+    def test_changes_are_logged_for_watched_models(self):
+        course = Course.objects.create(title='New', code='N0001', professor=self.user)
+        course.title = 'Renamed'
+        course.save()
+        pk = str(course.pk)
+        course.delete()
+
+        self.assertEqual(
+            list(ChangeLogEntry.objects.values_list('model_label', 'object_pk', 'operation')),
+            [('courses.course', pk, op) for op in ('create', 'update', 'delete')]
+        )
+
+    def test_bulk_imports_are_logged(self):
+        self.run_sync()
+        rows = [
+            {'title': f'Imported {index}', 'code': f'IM{index:02d}', 'professor': self.user.id}
+            for index in range(3)
+        ]
+        list(BulkImporter(Course).import_batches(enumerate(rows)))
+        rows[0]['title'] = 'Reimported'
+        list(BulkImporter(Course, upsert_key='code').import_batches([(0, rows[0])]))
+
+        pks = dict(Course.objects.filter(code__startswith='IM').values_list('code', 'pk'))
+        self.assertEqual(
+            list(ChangeLogEntry.objects.values_list('object_pk', 'operation')),
+            [(str(pks[code]), 'create') for code in ('IM00', 'IM01', 'IM02')] + [(str(pks['IM00']), 'update')]
+        )
+        synced = {code for codes, _ in self.run_sync() for code in codes}
+        self.assertEqual(synced, {'IM00', 'IM01', 'IM02'})
+
+    def test_runs_after_the_first_only_sync_changes(self):
+        first = self.run_sync()
+        self.assertEqual(sum(len(codes) for codes, _ in first), 5)
+        self.assertEqual(self.task.change_cursor, 0)
+        self.assertEqual(self.run_sync(), [])
+
+        changed = Course.objects.get(code='C0001')
+        changed.title = 'Updated'
+        changed.save()
+        changed.save()
+        removed = Course.objects.get(code='C0003')
+        removed_pk = removed.pk
+        removed.delete()
+        Course.objects.create(title='New', code='N0001', professor=self.user)
+
+        batches = self.run_sync()
+        self.assertEqual(batches, [(['C0001'], []), (['N0001'], [removed_pk])])
+        self.assertEqual(self.task.change_cursor, change_feed.latest_id())
+        self.assertEqual(self.task.total_synced_records, 8)
+        self.assertEqual(self.run_sync(), [])
+
+    def test_prune_keeps_unconsumed_entries(self):
+        self.run_sync()
+        Course.objects.get(code='C0001').save()
+        self.run_sync()
+        Course.objects.get(code='C0002').save()
+
+        self.assertEqual(change_feed.prune(), 1)
+        self.assertEqual(list(ChangeLogEntry.objects.values_list('operation', flat=True)), ['update'])
+
+
+class TransformPipelineTest(DataManagementTestCase):
+    """Test compiled transform rules and filter pushdown"""
+
+    rules = [
+        {'type': 'rename', 'fields': {'title': 'name'}},
+        {'type': 'filter', 'field': 'code', 'op': 'in', 'value': ['C0001', 'C0002', 'C0003']},
+        {'type': 'map', 'field': 'code', 'mapping': {'C0001': 'first'}},
+        {'type': 'cast', 'field': 'id', 'to': 'str'},
+        {'type': 'computed', 'field': 'label', 'operation': 'concat',
+         'fields': ['code', 'name'], 'separator': ': '},
+        {'type': 'filter', 'field': 'code', 'op': 'ne', 'value': 'C0002'},
+        {'type': 'drop', 'fields': ['description', 'professor_id']},
+    ]
+
+    def test_rules_run_over_values_batches(self):
+        self.create_courses(5)
+        plan = compile_rules(self.rules, Course)
+        queryset = plan.filter_queryset(Course.objects.all()).values(
+            'id', 'code', 'title', 'description', 'professor_id'
+        )
+        self.assertEqual(queryset.count(), 3)
+
+        rows = plan.run(queryset.order_by('code'))
+
+        self.assertEqual([row['label'] for row in rows], ['first: Course 1', 'C0003: Course 3'])
+        self.assertEqual(set(rows[0]), {'id', 'code', 'name', 'label'})
+        self.assertIsInstance(rows[0]['id'], str)
+
+    def test_only_filters_on_source_values_are_pushed_down(self):
+        plan = compile_rules(self.rules, Course)
+        self.assertEqual(len(plan.pushdown), 1)
+        self.assertEqual(len(plan.steps), 6)
+
+        self.assertEqual(len(compile_rules(self.rules).steps), 7)
+
+    def test_invalid_rules_are_rejected(self):
+        for rules in ([{'type': 'explode'}], [{'type': 'cast', 'field': 'x', 'to': 'uuid'}],
+                      [{'type': 'map', 'field': 'x'}]):
+            with self.assertRaises(ValueError):
+                compile_rules(rules)
+        with self.assertRaises(ValueError):
+            compile_rules([{'type': 'cast', 'field': 'x', 'to': 'int'}]).run([{'x': 'abc'}])
+        self.assertEqual(
+            compile_rules([{'type': 'cast', 'field': 'x', 'to': 'int', 'on_error': 'null'}]).run([{'x': 'abc'}]),
+            [{'x': None}]
+        )
+
+
+class StubEndpoint(BaseHTTPRequestHandler):
+    """Records deliveries; paths listed in ``server.failures`` answer with those statuses first"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.server.lock:
+            self.server.requests.append((self.path, dict(self.headers), body))
+            failures = self.server.failures.get(self.path, [])
+            status = failures.pop(0) if failures else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        with self.server.lock:
+            page = self.server.changes.pop(0) if self.server.changes else {'records': [], 'cursor': 'end'}
+        body = json.dumps(dict(page, has_more=bool(self.server.changes))).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(DATA_SYNC_RETRY_BACKOFF=0)
+class DeliveryEngineTest(DataManagementTestCase):
+    """Test delivering sync batches to a local stub server"""
+
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubEndpoint)
+        self.server.requests = []
+        self.server.failures = {}
+        self.server.changes = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(change_feed.reset)
+
+        self.create_courses(5)
+        self.task = DataSyncTask.objects.create(
+            name='Ministry courses', source_model='courses.Course', created_by=self.user
+        )
+        self.sync_service = DataSyncService()
+        self.sync_service.chunk_size = 2
+
+    def add_integration(self, path, **kwargs):
+        integration = ExternalSystemIntegration.objects.create(
+            name=path, system_type='api', created_by=self.user,
+            endpoint_url=f"http://127.0.0.1:{self.server.server_port}{path}",
+            rate_limit_per_minute=0, rate_limit_per_hour=0, **kwargs
+        )
+        self.task.integrations.add(integration)
+        return integration
+
+    def received(self, path):
+        return [request for request in self.server.requests if request[0] == path]
+
+    def test_batches_fan_out_with_retries_and_idempotency_keys(self):
+        self.add_integration('/ministry', auth_type='token', auth_token='secret')
+        self.add_integration('/bank')
+        self.server.failures['/bank'] = [503]
+
+        self.assertTrue(self.sync_service.execute_sync_task(self.task))
+
+        ministry = self.received('/ministry')
+        self.assertEqual(len(ministry), 3)
+        self.assertEqual(sorted(len(body['records']) for _, _, body in ministry), [1, 2, 2])
+        self.assertEqual(ministry[0][1]['Authorization'], 'Bearer secret')
+        self.assertEqual(ministry[0][2]['task'], 'Ministry courses')
+
+        bank = self.received('/bank')
+        self.assertEqual(len(bank), 4)
+        keys = [headers['Idempotency-Key'] for _, headers, _ in bank]
+        self.assertEqual(len(set(keys)), 3)
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.change_cursor, 0)
+        self.assertEqual(self.task.total_synced_records, 5)
+
+    def test_rate_limit_holds_across_deliveries(self):
+        target = target_from_integration(self.add_integration('/ministry'))
+        target['interval'] = 0.2
+        engine = DeliveryEngine()
+        batch = {'key': 'window', 'records': [{'code': 'C0000'}], 'deleted': []}
+
+        started = time.monotonic()
+        for _ in range(3):
+            self.assertEqual(engine.deliver([target], [batch])[0]['delivered'], 1)
+        # The first request goes out at once, each later window waits its slot
+        self.assertGreaterEqual(time.monotonic() - started, 0.4)
+
+    def test_failed_delivery_keeps_the_cursor(self):
+        integration = self.add_integration('/ministry', retry_attempts=2)
+        self.server.failures['/ministry'] = [400]
+
+        self.assertFalse(self.sync_service.execute_sync_task(self.task))
+
+        self.assertEqual(len(self.received('/ministry')), 3)
+        self.task.refresh_from_db()
+        self.assertIsNone(self.task.change_cursor)
+        integration.refresh_from_db()
+        self.assertFalse(integration.last_connection_status)
+        self.assertIn('HTTP 400', integration.last_error_message)
+
+
+    def test_failing_endpoint_does_not_hold_back_the_others(self):
+        bank = self.add_integration('/bank', retry_attempts=0)
+        self.add_integration('/ministry')
+        self.server.failures['/bank'] = [400] * 10
+
+        self.assertFalse(self.sync_service.execute_sync_task(self.task))
+        Course.objects.create(title='New', code='N0001', professor=self.user)
+        with override_settings(DATA_SYNC_CHANGE_LAG=0):
+            self.assertFalse(self.sync_service.execute_sync_task(self.task))
+
+        ministry = [row['code'] for _, _, body in self.received('/ministry') for row in body['records']]
+        self.assertEqual(sorted(ministry), ['C0000', 'C0001', 'C0002', 'C0003', 'C0004', 'N0001'])
+        self.task.refresh_from_db()
+        self.assertIsNone(self.task.target_cursors[str(bank.pk)])
+        self.assertEqual(self.task.change_cursor, change_feed.latest_id())
+
+        # Once the endpoint recovers it catches up with a full sync of its own
+        self.server.failures['/bank'] = []
+        self.server.requests = []
+        with override_settings(DATA_SYNC_CHANGE_LAG=0):
+            self.assertTrue(self.sync_service.execute_sync_task(self.task))
+        self.assertEqual(sum(len(body['records']) for _, _, body in self.received('/bank')), 6)
+        self.assertEqual(self.received('/ministry'), [])
+
+    def test_two_way_sync_reconciles_both_sides(self):
+        self.add_integration('/sis')
+        self.task.sync_type = 'two_way'
+        self.task.save()
+
+        self.assertTrue(self.sync_service.execute_sync_task(self.task))
+        pushed = {row['code']: row for _, _, body in self.received('/sis') for row in body['records']}
+        self.assertEqual(len(pushed), 5)
+        self.assertEqual(SyncRecordVersion.objects.filter(task=self.task).count(), 5)
+
+        # Concurrent edits of C0000 (remote is newer), a remote-only edit and delete
+        local = Course.objects.get(code='C0000')
+        local.title = 'Local title'
+        local.save()
+        self.server.changes = [
+            {'records': [dict(pushed['C0000'], title='Remote title', updated_at='2999-01-01T00:00:00Z'),
+                         dict(pushed['C0001'], description='Remote description')],
+             'cursor': '1'},
+            {'records': [{'id': pushed['C0002']['id'], '_deleted': True}], 'cursor': '2'},
+        ]
+        self.server.requests = []
+
+        self.assertTrue(self.sync_service.execute_sync_task(self.task))
+
+        self.assertEqual(Course.objects.get(code='C0000').title, 'Remote title')
+        self.assertEqual(Course.objects.get(code='C0001').description, 'Remote description')
+        self.assertFalse(Course.objects.filter(code='C0002').exists())
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.remote_cursor, '2')
+        version = SyncRecordVersion.objects.get(task=self.task, object_pk=str(local.pk))
+        self.assertEqual((version.local_version, version.remote_version), (2, 1))
+
+    def test_two_way_sync_creates_remote_rows_without_timestamps(self):
+        self.add_integration('/sis')
+        self.task.sync_type = 'two_way'
+        self.task.save()
+        self.assertTrue(self.sync_service.execute_sync_task(self.task))
+        pushed = next(row for _, _, body in self.received('/sis') for row in body['records'])
+
+        created = {key: value for key, value in pushed.items() if key not in ('created_at', 'updated_at')}
+        created.update(id=9999, code='R0001', title='Remote only')
+        self.server.changes = [{'records': [created], 'cursor': '1'}]
+
+        self.assertTrue(self.sync_service.execute_sync_task(self.task))
+        course = Course.objects.get(pk=9999)
+        self.assertEqual(course.code, 'R0001')
+        self.assertIsNotNone(course.created_at)
+        self.assertIsNotNone(course.updated_at)
+
+
+class ReconcilerTest(TestCase):
+    """Test conflict resolution policies"""
+
+    base = {'id': 1, 'title': 'Algebra', 'room': 'A1', 'updated_at': '2024-01-01T10:00:00Z'}
+
+    def reconcile(self, policy, local, remote):
+        version = {'row_hash': row_hash(self.base), 'field_hashes': field_hashes(self.base),
+                   'local_version': 1, 'remote_version': 1}
+        return Reconciler(policy).reconcile({'1': local}, {'1': remote}, {'1': version})
+
+    def test_one_sided_changes_are_routed(self):
+        local = dict(self.base, title='Algebra I')
+        result = Reconciler().reconcile({'1': local}, {}, {'1': {
+            'row_hash': row_hash(self.base), 'field_hashes': {}, 'local_version': 1, 'remote_version': 1,
+        }})
+        self.assertEqual(result['push'], [local])
+        self.assertEqual(result['apply'], {})
+        self.assertEqual(result['versions']['1']['local_version'], 2)
+
+        result = Reconciler().reconcile({'1': self.base}, {'1': None}, {'1': {
+            'row_hash': row_hash(self.base), 'field_hashes': {}, 'local_version': 1, 'remote_version': 1,
+        }})
+        self.assertEqual(result['apply_deleted'], ['1'])
+        self.assertEqual(result['conflicts'], 0)
+
+    def test_conflict_policies(self):
+        local = dict(self.base, title='Local', updated_at='2024-01-02T10:00:00Z')
+        remote = dict(self.base, room='B2', updated_at='2024-01-03T10:00:00Z')
+
+        result = self.reconcile('last_writer_wins', local, remote)
+        self.assertEqual(result['conflicts'], 1)
+        self.assertEqual(result['apply'], {'1': remote})
+        self.assertEqual(result['push'], [])
+
+        result = self.reconcile('local_priority', local, remote)
+        self.assertEqual(result['push'], [local])
+        self.assertEqual(result['apply'], {})
+
+        result = self.reconcile('field_merge', local, remote)
+        merged = dict(self.base, title='Local', room='B2', updated_at='2024-01-03T10:00:00Z')
+        self.assertEqual(result['push'], [merged])
+        self.assertEqual(result['apply'], {'1': merged})
+        self.assertEqual(result['versions']['1']['row_hash'], row_hash(merged))
+
+        # An update beats a concurrent deletion
+        result = self.reconcile('last_writer_wins', None, remote)
+        self.assertEqual(result['push'], [])
+        self.assertEqual(result['apply'], {'1': remote})
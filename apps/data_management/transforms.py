@@ -0,0 +1,371 @@
+# ==============================================================================
+# COMPILED TRANSFORM PIPELINE
+# خط لوله تبدیل داده‌ها برای همگام‌سازی
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import operator
+import logging
+from decimal import Decimal
+from itertools import compress
+from typing import Dict, List, Any, Callable, Iterable, Optional
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+logger = logging.getLogger(__name__)
+
+TRUE_STRINGS = {'1', 'true', 'yes', 'y', 'on'}
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_STRINGS
+    return bool(value)
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f"Invalid date: {value}")
+        return parsed
+    return value.date() if hasattr(value, 'date') else value
+
+
+def _to_datetime(value):
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"Invalid datetime: {value}")
+        return parsed
+    return value
+
+
+CASTS = {
+    'int': int,
+    'float': float,
+    'str': str,
+    'bool': _to_bool,
+    'decimal': lambda value: Decimal(str(value)),
+    'date': _to_date,
+    'datetime': _to_datetime,
+}
+
+# Filter operators: (queryset lookup, Python test)
+FILTER_OPERATORS = {
+    'eq': ('exact', operator.eq),
+    'ne': ('exact', operator.ne),
+    'gt': ('gt', operator.gt),
+    'gte': ('gte', operator.ge),
+    'lt': ('lt', operator.lt),
+    'lte': ('lte', operator.le),
+    'in': ('in', lambda value, options: value in options),
+    'contains': ('contains', lambda value, part: part in value),
+    'isnull': ('isnull', lambda value, flag: (value is None) == bool(flag)),
+}
+
+COMPUTE_OPERATIONS = {
+    'add': operator.add,
+    'sub': operator.sub,
+    'mul': operator.mul,
+    'div': operator.truediv,
+}
+
+
+def to_columns(records: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Turn a list of row dicts (e.g. from ``values()``) into columns"""
+    if not records:
+        return {}
+    names = list(records[0])
+    if len(names) == 1:
+        return {names[0]: [record[names[0]] for record in records]}
+    getter = operator.itemgetter(*names)
+    return dict(zip(names, map(list, zip(*map(getter, records)))))
+
+
+def to_records(columns: Dict[str, List[Any]], count: int) -> List[Dict[str, Any]]:
+    """Turn columns back into a list of row dicts"""
+    if not columns:
+        return [{} for _ in range(count)]
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+class TransformPlan:
+    """
+    A compiled list of ``transform_rules``.
+
+    The plan works on columnar batches (``{field: [values]}``): every step
+    transforms whole columns, so renames and drops cost nothing per row and
+    casts, lookups and arithmetic run through ``map`` instead of a Python
+    loop over rule dicts. Filters on untouched source fields are moved into
+    ``filter_queryset`` so filtered rows are never fetched; a plan compiled
+    against a model expects its rows to come from that queryset.
+    """
+
+    def __init__(self, steps: List[Callable], pushdown: Q, rules: List[Dict[str, Any]],
+                 model=None, origins: Dict[str, Optional[str]] = None):
+        self.steps = steps
+        self.pushdown = pushdown
+        self.rules = rules
+        self.model = model
+        self.origins = origins or {}
+
+    def source_field(self, name: str) -> Optional[str]:
+        """Source field an output column still holds unchanged, or None if it is derived"""
+        if name in self.origins:
+            return self.origins[name]
+        return _source_field(self.model, name)
+
+    def filter_queryset(self, queryset):
+        """Apply the filters that were pushed down to the database"""
+        return queryset.filter(self.pushdown) if self.pushdown else queryset
+
+    def run_columns(self, columns: Dict[str, List[Any]], count: int):
+        """Transform one columnar batch of ``count`` rows; returns ``(columns, count)``"""
+        for step in self.steps:
+            if not count:
+                break
+            count = step(columns, count)
+        return columns, count
+
+    def run(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Transform a batch of row dicts"""
+        records = list(records)
+        if not self.steps:
+            return records
+        columns, count = self.run_columns(to_columns(records), len(records))
+        return to_records(columns, count)
+
+
+def _column(columns: Dict[str, List[Any]], name: str) -> List[Any]:
+    try:
+        return columns[name]
+    except KeyError:
+        raise ValueError(f"Transform rule refers to unknown field '{name}'")
+
+
+def _null_safe(function: Callable) -> Callable:
+    return lambda *values: None if any(value is None for value in values) else function(*values)
+
+
+def _rename_step(mapping: Dict[str, str]):
+    def step(columns, count):
+        moved = {new: _column(columns, old) for old, new in mapping.items()}
+        for old in mapping:
+            del columns[old]
+        columns.update(moved)
+        return count
+    return step
+
+
+def _drop_step(fields: List[str]):
+    def step(columns, count):
+        for name in fields:
+            columns.pop(name, None)
+        return count
+    return step
+
+
+def _cast_step(field: str, to: str, on_error: str):
+    cast = _null_safe(CASTS[to])
+    if on_error == 'null':
+        strict = cast
+
+        def cast(value):
+            try:
+                return strict(value)
+            except (TypeError, ValueError, ArithmeticError):
+                return None
+
+    def step(columns, count):
+        column = _column(columns, field)
+        try:
+            columns[field] = list(map(cast, column))
+        except (TypeError, ValueError, ArithmeticError) as e:
+            raise ValueError(f"Cannot cast '{field}' to {to}: {e}")
+        return count
+    return step
+
+
+def _lookup_key(value):
+    # JSON object keys are strings, so non-string values are matched by
+    # their JSON spelling
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _map_step(field: str, mapping: Dict[str, Any], rule: Dict[str, Any]):
+    get = dict(mapping).get
+    keep_unmapped = 'default' not in rule
+    default = rule.get('default')
+
+    def translate(value):
+        return get(_lookup_key(value), value if keep_unmapped else default)
+
+    def step(columns, count):
+        columns[field] = list(map(translate, _column(columns, field)))
+        return count
+    return step
+
+
+def _computed_step(rule: Dict[str, Any]):
+    field = rule['field']
+
+    if 'value' in rule:
+        value = rule['value']
+
+        def step(columns, count):
+            columns[field] = [value] * count
+            return count
+        return step
+
+    if 'template' in rule:
+        template = rule['template']
+
+        def step(columns, count):
+            try:
+                columns[field] = [template.format_map(record) for record in to_records(columns, count)]
+            except KeyError as e:
+                raise ValueError(f"Template of '{field}' refers to unknown field {e}")
+            return count
+        return step
+
+    operation = rule.get('operation')
+    sources = rule.get('fields') or []
+    if not sources:
+        raise ValueError(f"Computed field '{field}' needs 'fields', 'template' or 'value'")
+
+    if operation == 'concat':
+        separator = rule.get('separator', '')
+
+        def combine(*values):
+            return separator.join('' if value is None else str(value) for value in values)
+    elif operation == 'coalesce':
+        def combine(*values):
+            return next((value for value in values if value is not None), None)
+    elif operation in COMPUTE_OPERATIONS:
+        binary = _null_safe(COMPUTE_OPERATIONS[operation])
+
+        def combine(first, *rest):
+            for value in rest:
+                first = binary(first, value)
+            return first
+    else:
+        raise ValueError(f"Unknown computed operation: {operation}")
+
+    def step(columns, count):
+        columns[field] = list(map(combine, *[_column(columns, name) for name in sources]))
+        return count
+    return step
+
+
+def _filter_step(field: str, op: str, value: Any):
+    test = FILTER_OPERATORS[op][1]
+    if op in ('eq', 'ne', 'isnull'):
+        def keep(item):
+            return test(item, value)
+    else:
+        # Like SQL, a NULL never satisfies a comparison
+        def keep(item):
+            return item is not None and test(item, value)
+
+    def step(columns, count):
+        mask = list(map(keep, _column(columns, field)))
+        for name, column in columns.items():
+            columns[name] = list(compress(column, mask))
+        return sum(mask)
+    return step
+
+
+def _source_field(model, name: str) -> Optional[str]:
+    if model is None:
+        return None
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return name if getattr(field, 'concrete', False) else None
+
+
+def compile_rules(rules: List[Dict[str, Any]], model=None) -> TransformPlan:
+    """
+    Compile ``transform_rules`` into a ``TransformPlan``.
+
+    Supported rules::
+
+        {'type': 'rename', 'fields': {'old': 'new'}}
+        {'type': 'cast', 'field': 'credits', 'to': 'int', 'on_error': 'null'}
+        {'type': 'map', 'field': 'status', 'mapping': {'A': 'active'}, 'default': None}
+        {'type': 'computed', 'field': 'label', 'operation': 'concat',
+         'fields': ['code', 'title'], 'separator': ' - '}
+        {'type': 'computed', 'field': 'label', 'template': '{code} - {title}'}
+        {'type': 'filter', 'field': 'credits', 'op': 'gte', 'value': 3}
+        {'type': 'drop', 'fields': ['internal_notes']}
+
+    Computed operations are ``concat``, ``coalesce``, ``add``, ``sub``,
+    ``mul`` and ``div``; a constant is ``{'value': ...}``. With ``model``,
+    filters on fields still holding their source values become queryset
+    filters instead of plan steps. Invalid rules raise ``ValueError``.
+    """
+    steps = []
+    pushdown = Q()
+    # Current name -> source field it still holds unchanged (None: derived)
+    origins = {}
+
+    def origin(name):
+        return origins[name] if name in origins else _source_field(model, name)
+
+    for position, rule in enumerate(rules or []):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Transform rule {position} must be an object")
+        kind = rule.get('type')
+        try:
+            if kind == 'rename':
+                mapping = rule['fields']
+                sources = {new: origin(old) for old, new in mapping.items()}
+                for old in mapping:
+                    origins[old] = None
+                origins.update(sources)
+                steps.append(_rename_step(dict(mapping)))
+
+            elif kind == 'drop':
+                for name in rule['fields']:
+                    origins[name] = None
+                steps.append(_drop_step(list(rule['fields'])))
+
+            elif kind == 'cast':
+                if rule['to'] not in CASTS:
+                    raise ValueError(f"Unknown cast type: {rule['to']}")
+                origins[rule['field']] = None
+                steps.append(_cast_step(rule['field'], rule['to'], rule.get('on_error', 'raise')))
+
+            elif kind == 'map':
+                origins[rule['field']] = None
+                steps.append(_map_step(rule['field'], rule['mapping'], rule))
+
+            elif kind == 'computed':
+                steps.append(_computed_step(rule))
+                origins[rule['field']] = None
+
+            elif kind == 'filter':
+                op = rule.get('op', 'eq')
+                if op not in FILTER_OPERATORS:
+                    raise ValueError(f"Unknown filter operator: {op}")
+                source = origin(rule['field'])
+                if source is not None:
+                    condition = Q(**{f"{source}__{FILTER_OPERATORS[op][0]}": rule.get('value')})
+                    pushdown &= ~condition if op == 'ne' else condition
+                else:
+                    steps.append(_filter_step(rule['field'], op, rule.get('value')))
+
+            else:
+                raise ValueError(f"Unknown transform rule type: {kind}")
+        except KeyError as e:
+            raise ValueError(f"Transform rule {position} ({kind}) is missing {e}")
+
+    return TransformPlan(steps, pushdown, rules, model, origins)
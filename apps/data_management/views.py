@@ -18,8 +18,9 @@ from .models import ImportExportJob, DataSyncTask, BackupSchedule, ExternalSyste
 from .serializers import (
     ImportExportJobSerializer, DataSyncTaskSerializer, 
     BackupScheduleSerializer, ExternalSystemIntegrationSerializer,
-    ImportJobCreateSerializer, ExportJobCreateSerializer
+    ImportJobCreateSerializer, ExportJobCreateSerializer, ImportExportJobErrorSerializer
 )
+from .progress import get_live_progress
 from .services import import_export_service, backup_service, sync_service
 import logging
 
@@ -174,6 +175,60 @@ class ImportExportJobViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
     
+    @extend_schema(
+        summary="Job Progress",
+        description="Get the live progress of a job, served from the cache while it runs"
+    )
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """Get job progress without touching the database while the job runs"""
+        live = get_live_progress(pk)
+        if live and (request.user.is_superuser or live['created_by'] == str(request.user.id)):
+            return Response(live, status=status.HTTP_200_OK)
+        
+        job = self.get_object()
+        return Response({
+            'id': str(job.id),
+            'status': job.status,
+            'total_records': job.total_records,
+            'processed_records': job.processed_records,
+            'success_records': job.success_records,
+            'error_records': job.error_records,
+            'progress_percentage': job.progress_percentage,
+            'updated_at': job.updated_at.isoformat(),
+        }, status=status.HTTP_200_OK)
+    
+    @extend_schema(
+        summary="Job Record Errors",
+        description="List the stored per-record errors of a job",
+        parameters=[
+            OpenApiParameter(
+                name="limit",
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description="Maximum number of errors to return (default 100)"
+            )
+        ]
+    )
+    @action(detail=True, methods=['get'])
+    def record_errors(self, request, pk=None):
+        """List stored record errors of a job"""
+        try:
+            job = self.get_object()
+            limit = max(1, min(int(request.query_params.get('limit', 100)), 1000))
+            errors = job.record_errors.all()[:limit]
+            
+            return Response({
+                'error_records': job.error_records,
+                'errors': ImportExportJobErrorSerializer(errors, many=True).data
+            }, status=status.HTTP_200_OK)
+            
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
     @extend_schema(
         summary="Cancel Job",
         description="Cancel a running job"
@@ -364,17 +419,7 @@ class BackupScheduleViewSet(viewsets.ModelViewSet):
         """List backup files for this schedule"""
         try:
             schedule = self.get_object()
-            
-            # This would list actual backup files
-            # For now, return placeholder data
-            backup_files = [
-                {
-                    'filename': f'backup_{schedule.name}_{timezone.now().strftime("%Y%m%d")}.json',
-                    'size': schedule.last_backup_size,
-                    'created_at': schedule.last_backup,
-                    'type': schedule.backup_type
-                }
-            ]
+            backup_files = backup_service.list_backups(schedule)
             
             return Response(backup_files, status=status.HTTP_200_OK)
             
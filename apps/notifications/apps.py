@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.notifications'
+
+    def ready(self):
+        """Initialize the app when Django starts"""
+        try:
+            # Import signals to ensure they're registered
+            from . import signals
+        except ImportError:
+            pass
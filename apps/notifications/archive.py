@@ -0,0 +1,120 @@
+# ==============================================================================
+# NOTIFICATION ARCHIVAL
+# بایگانی اعلانات قدیمی
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import logging
+from datetime import timedelta
+from typing import Dict, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .counters import unread_counter
+from .models import Notification, NotificationArchive, NotificationArchiveState
+
+logger = logging.getLogger(__name__)
+
+# Fields copied to the archive
+ARCHIVED_FIELDS = (
+    'id', 'user_id', 'title', 'message', 'type', 'priority', 'extra_data',
+    'is_read', 'read_at', 'created_at',
+)
+
+
+class NotificationArchiver:
+    """
+    Move old notifications to ``NotificationArchive`` in bounded batches.
+
+    Read notifications are archived after ``days`` and every notification
+    after ``unread_days``. Each batch is copied and deleted in its own
+    short transaction, so no run holds long locks or one huge DELETE.
+    Everything older than the unread horizon is archived in
+    ``(created_at, id)`` order from the watermark kept in
+    ``NotificationArchiveState``, so a run starts where the previous one
+    stopped; read rows newer than the horizon are picked from the
+    ``created_at`` range between the two cutoffs. Archiving unread rows
+    lowers their users' unread counters.
+    """
+
+    def __init__(self, batch_size: int = None):
+        # Unset batch size is read from settings on every run
+        self._batch_size = batch_size
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size or getattr(settings, 'NOTIFICATION_ARCHIVE_BATCH_SIZE', 1000)
+
+    def run(self, days: int = None, unread_days: int = None, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """Archive due notifications; returns ``{'archived', 'unread', 'batches'}``"""
+        if days is None:
+            days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 30)
+        if unread_days is None:
+            unread_days = getattr(settings, 'NOTIFICATION_UNREAD_RETENTION_DAYS', 180)
+        now = timezone.now()
+        read_cutoff = now - timedelta(days=days)
+        unread_cutoff = min(now - timedelta(days=unread_days), read_cutoff)
+        stats = {'archived': 0, 'unread': 0, 'batches': 0}
+
+        def budget_left():
+            return max_batches is None or stats['batches'] < max_batches
+
+        # Everything before the unread horizon, from the watermark on
+        state, _ = NotificationArchiveState.objects.get_or_create(name='default')
+        while budget_left():
+            queryset = Notification.objects.filter(created_at__lt=unread_cutoff)
+            if state.watermark_created_at is not None:
+                queryset = queryset.filter(
+                    Q(created_at__gt=state.watermark_created_at)
+                    | Q(created_at=state.watermark_created_at, id__gt=state.watermark_id)
+                )
+            if not self._move(queryset, state, stats, advance=True):
+                break
+
+        # Read notifications past their retention, newer than the horizon
+        while budget_left():
+            queryset = Notification.objects.filter(
+                is_read=True, created_at__gte=unread_cutoff, created_at__lt=read_cutoff
+            )
+            if not self._move(queryset, state, stats, advance=False):
+                break
+
+        if stats['archived']:
+            logger.info(f"Archived {stats['archived']} notifications in {stats['batches']} batches")
+        return stats
+
+    def _move(self, queryset, state: NotificationArchiveState, stats: Dict[str, int], advance: bool) -> int:
+        """Archive the first batch of ``queryset``; returns the number of rows moved"""
+        with transaction.atomic():
+            rows = list(
+                queryset.select_for_update()
+                .order_by('created_at', 'id')
+                .values(*ARCHIVED_FIELDS)[:self.batch_size]
+            )
+            if not rows:
+                return 0
+
+            NotificationArchive.objects.bulk_create(
+                [NotificationArchive(**row) for row in rows], ignore_conflicts=True
+            )
+            Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+            unread = [row['user_id'] for row in rows if not row['is_read']]
+            if unread:
+                transaction.on_commit(lambda: unread_counter.decr_many(unread))
+
+            if advance:
+                state.watermark_created_at = rows[-1]['created_at']
+                state.watermark_id = rows[-1]['id']
+            state.archived_total += len(rows)
+            state.save(update_fields=['watermark_created_at', 'watermark_id', 'archived_total', 'updated_at'])
+
+        stats['archived'] += len(rows)
+        stats['unread'] += len(unread)
+        stats['batches'] += 1
+        return len(rows)
+
+
+# Initialize notification archiver
+notification_archiver = NotificationArchiver()
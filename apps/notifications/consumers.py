@@ -9,8 +9,12 @@ import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
 from django.utils import timezone
 from asgiref.sync import sync_to_async
+from .counters import unread_counter
+from .pagination import notification_page
+from .presence import presence_registry
 from .models import WebSocketConnection, Notification, NotificationPreference
 
 logger = logging.getLogger(__name__)
@@ -39,6 +43,12 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
+        # Join global group: broadcasts send no per-user copy
+        await self.channel_layer.group_add(
+            "global_notifications",
+            self.channel_name
+        )
+        
         # Accept WebSocket connection
         await self.accept()
         
@@ -58,6 +68,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 self.room_group_name,
                 self.channel_name
             )
+            await self.channel_layer.group_discard(
+                "global_notifications",
+                self.channel_name
+            )
         
         # Mark connection as disconnected in database
         await self.remove_connection()
@@ -111,6 +125,20 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'data': event['message']
         }))
     
+    async def broadcast_message(self, event):
+        """Handle broadcast messages"""
+        await self.send(text_data=json.dumps({
+            'type': 'broadcast',
+            'data': event['message']
+        }))
+    
+    async def system_announcement(self, event):
+        """Handle system announcements"""
+        await self.send(text_data=json.dumps({
+            'type': 'system_announcement',
+            'data': event['announcement']
+        }))
+    
     # Helper methods
     
     async def handle_mark_read(self, data):
@@ -149,18 +177,33 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         }))
     
     async def handle_get_notifications(self, data):
-        """Get paginated notifications"""
-        page = data.get('page', 1)
-        page_size = data.get('page_size', 20)
+        """Get notifications by keyset cursor (or page number for old clients)"""
+        page_size = min(max(int(data.get('page_size', 20)), 1), 100)
         
-        notifications = await self.get_user_notifications(page, page_size)
+        if 'page' in data and 'cursor' not in data and 'since' not in data:
+            notifications = await self.get_user_notifications(data['page'], page_size)
+            await self.send(text_data=json.dumps({
+                'type': 'notifications_list',
+                'data': notifications
+            }))
+            return
+        
+        try:
+            page = await self.get_notification_page(data.get('cursor'), data.get('since'), page_size)
+        except ValueError:
+            await self.send_error('مکان‌نمای صفحه نامعتبر است')
+            return
         await self.send(text_data=json.dumps({
             'type': 'notifications_list',
-            'data': notifications
+            'data': page['results'],
+            'next_cursor': page['next_cursor'],
+            'since_cursor': page['since_cursor'],
+            'has_more': page['has_more']
         }))
     
     async def handle_ping(self):
         """Handle ping for connection keep-alive"""
+        await self.record_heartbeat()
         await self.send(text_data=json.dumps({
             'type': 'pong',
             'timestamp': timezone.now().isoformat()
@@ -181,10 +224,12 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         }))
         
         # Send recent notifications
-        recent_notifications = await self.get_user_notifications(1, 5)
+        recent = await self.get_notification_page(None, None, 5)
         await self.send(text_data=json.dumps({
             'type': 'recent_notifications',
-            'data': recent_notifications
+            'data': recent['results'],
+            'next_cursor': recent['next_cursor'],
+            'since_cursor': recent['since_cursor']
         }))
     
     async def send_error(self, message):
@@ -198,46 +243,41 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def store_connection(self):
-        """Store WebSocket connection in database"""
+        """Register WebSocket connection with the presence registry"""
         try:
             # Get client info
             headers = dict(self.scope.get('headers', []))
             user_agent = headers.get(b'user-agent', b'').decode('utf-8')
+            client = self.scope.get('client') or [None]
             
-            # Create or update connection
-            connection, created = WebSocketConnection.objects.get_or_create(
-                user=self.user,
-                connection_id=self.channel_name,
-                defaults={
-                    'channel_name': self.channel_name,
-                    'user_agent': user_agent,
-                    'platform': 'web'  # Can be enhanced to detect platform
-                }
+            # Written to the database on the registry's next flush
+            presence_registry.connect(
+                self.channel_name,
+                self.user,
+                channel_name=self.channel_name,
+                user_agent=user_agent,
+                platform='web',  # Can be enhanced to detect platform
+                ip_address=client[0]
             )
-            
-            if not created:
-                connection.is_active = True
-                connection.last_activity = timezone.now()
-                connection.save()
-                
-            return connection
         except Exception as e:
             logger.error(f"Error storing WebSocket connection: {e}")
-            return None
     
     @database_sync_to_async
     def remove_connection(self):
-        """Remove WebSocket connection from database"""
+        """Unregister WebSocket connection from the presence registry"""
         try:
-            WebSocketConnection.objects.filter(
-                connection_id=self.channel_name
-            ).update(
-                is_active=False,
-                disconnected_at=timezone.now()
-            )
+            presence_registry.disconnect(self.channel_name)
         except Exception as e:
             logger.error(f"Error removing WebSocket connection: {e}")
     
+    @database_sync_to_async
+    def record_heartbeat(self):
+        """Refresh this connection's presence"""
+        try:
+            presence_registry.heartbeat(self.channel_name)
+        except Exception as e:
+            logger.error(f"Error recording WebSocket heartbeat: {e}")
+    
     @database_sync_to_async
     def mark_notification_read(self, notification_id):
         """Mark specific notification as read"""
@@ -265,6 +305,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 is_read=True,
                 read_at=timezone.now()
             )
+            # Recount rather than set 0: notifications created before the
+            # commit would be lost from the count
+            transaction.on_commit(lambda: unread_counter.invalidate([self.user.id]))
             return True
         except Exception as e:
             logger.error(f"Error marking all notifications as read: {e}")
@@ -274,14 +317,20 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     def get_unread_count(self):
         """Get unread notifications count"""
         try:
-            return Notification.objects.filter(
-                user=self.user,
-                is_read=False
-            ).count()
+            return unread_counter.get(self.user.id)
         except Exception as e:
             logger.error(f"Error getting unread count: {e}")
             return 0
     
+    @database_sync_to_async
+    def get_notification_page(self, cursor=None, since=None, page_size=20):
+        """Get a keyset page of user notifications; raises ValueError for a bad cursor"""
+        page = notification_page(
+            Notification.objects.filter(user=self.user), cursor=cursor, since=since, limit=page_size
+        )
+        page['results'] = [notification.to_websocket_dict() for notification in page['results']]
+        return page
+    
     @database_sync_to_async
     def get_user_notifications(self, page=1, page_size=20):
         """Get paginated user notifications"""
@@ -469,7 +518,7 @@ class AdminNotificationConsumer(AsyncWebsocketConsumer):
             
             # Get various statistics
             total_users = User.objects.count()
-            active_connections = WebSocketConnection.objects.filter(is_active=True).count()
+            active_connections = len(presence_registry.active_connections())
             total_notifications = Notification.objects.count()
             unread_notifications = Notification.objects.filter(is_read=False).count()
             
@@ -488,18 +537,7 @@ class AdminNotificationConsumer(AsyncWebsocketConsumer):
     def get_active_connections(self):
         """Get active WebSocket connections"""
         try:
-            connections = WebSocketConnection.objects.filter(
-                is_active=True
-            ).select_related('user').values(
-                'user__username',
-                'user__first_name',
-                'user__last_name',
-                'platform',
-                'connected_at',
-                'last_activity'
-            )
-            
-            return list(connections)
+            return presence_registry.active_connections()
         except Exception as e:
             logger.error(f"Error getting active connections: {e}")
             return []
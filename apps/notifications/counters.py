@@ -0,0 +1,121 @@
+# ==============================================================================
+# UNREAD NOTIFICATION COUNTERS
+# شمارنده اعلانات خوانده‌نشده
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import logging
+from collections import Counter
+from typing import Dict, Iterable, Any
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+class UnreadCounter:
+    """
+    Per-user unread notification counts kept in the cache.
+
+    Counts are adjusted with atomic ``incr``/``decr`` when notifications
+    are created, read or deleted, so reading a count costs no query. A
+    missing entry is recounted from the database on the next read, and
+    entries expire after ``NOTIFICATION_UNREAD_TTL`` seconds, so any drift
+    (an adjustment lost to a cache restart or a race with a recount) only
+    lasts until then. Adjusting a missing entry is a no-op.
+    """
+
+    prefix = 'notifications:unread'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'NOTIFICATION_COUNTER_CACHE', 'default')]
+
+    @property
+    def timeout(self) -> int:
+        return getattr(settings, 'NOTIFICATION_UNREAD_TTL', 3600)
+
+    def key(self, user_id) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def get(self, user_id) -> int:
+        """Unread count of one user"""
+        return self.get_many([user_id])[user_id]
+
+    def get_many(self, user_ids: Iterable[Any]) -> Dict[Any, int]:
+        """Unread counts of many users; missing entries are recounted in one query"""
+        keys = {self.key(user_id): user_id for user_id in user_ids}
+        counts = {}
+        try:
+            counts = {keys[key]: value for key, value in self.cache.get_many(list(keys)).items()}
+        except Exception as e:
+            logger.error(f"Error reading unread counters: {e}")
+
+        missing = [user_id for user_id in keys.values() if user_id not in counts]
+        if missing:
+            fresh = self.count(missing)
+            try:
+                self.cache.set_many({self.key(user_id): fresh[user_id] for user_id in missing}, self.timeout)
+            except Exception as e:
+                logger.error(f"Error storing unread counters: {e}")
+            counts.update(fresh)
+        return counts
+
+    def count(self, user_ids: Iterable[Any]) -> Dict[Any, int]:
+        """Unread counts straight from the database, in one grouped query"""
+        user_ids = list(user_ids)
+        counts = dict.fromkeys(user_ids, 0)
+        counts.update(
+            Notification.objects.filter(user_id__in=user_ids, is_read=False)
+            .values('user_id')
+            .annotate(count=Count('id'))
+            .values_list('user_id', 'count')
+        )
+        return counts
+
+    def incr(self, user_id, delta: int = 1):
+        try:
+            self.cache.incr(self.key(user_id), delta)
+        except ValueError:
+            # Not cached: the next read counts from the database
+            pass
+        except Exception as e:
+            logger.error(f"Error incrementing unread counter of user {user_id}: {e}")
+
+    def decr(self, user_id, delta: int = 1):
+        try:
+            if self.cache.decr(self.key(user_id), delta) < 0:
+                self.invalidate([user_id])
+        except ValueError:
+            pass
+        except Exception as e:
+            logger.error(f"Error decrementing unread counter of user {user_id}: {e}")
+
+    def incr_many(self, user_ids: Iterable[Any]):
+        """Add one per occurrence of each user id"""
+        for user_id, delta in Counter(user_ids).items():
+            self.incr(user_id, delta)
+
+    def decr_many(self, user_ids: Iterable[Any]):
+        """Subtract one per occurrence of each user id"""
+        for user_id, delta in Counter(user_ids).items():
+            self.decr(user_id, delta)
+
+    def set(self, user_id, value: int):
+        try:
+            self.cache.set(self.key(user_id), value, self.timeout)
+        except Exception as e:
+            logger.error(f"Error setting unread counter of user {user_id}: {e}")
+
+    def invalidate(self, user_ids: Iterable[Any]):
+        """Drop cached counts so they are recounted on next read"""
+        try:
+            self.cache.delete_many([self.key(user_id) for user_id in user_ids])
+        except Exception as e:
+            logger.error(f"Error invalidating unread counters: {e}")
+
+
+# Initialize unread counter
+unread_counter = UnreadCounter()
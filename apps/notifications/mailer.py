@@ -0,0 +1,167 @@
+# ==============================================================================
+# BATCHED NOTIFICATION EMAIL SENDER
+# ارسال دسته‌ای ایمیل اعلانات
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template import Context, Template
+from .models import Notification, NotificationTemplate
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateCache:
+    """
+    Compiled ``NotificationTemplate`` subjects and bodies by name.
+
+    A batch costs one query for the names and ``updated_at`` of the
+    templates it uses; template text is only fetched and compiled again
+    when a template changed.
+    """
+
+    def __init__(self):
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, names) -> Dict[str, Tuple[Template, Template]]:
+        names = {name for name in names if name}
+        if not names:
+            return {}
+        versions = dict(
+            NotificationTemplate.objects.filter(name__in=names, is_active=True).values_list('name', 'updated_at')
+        )
+        stale = [name for name, updated_at in versions.items()
+                 if self._compiled.get(name, (None,))[0] != updated_at]
+        if stale:
+            compiled = {
+                name: (updated_at, (Template(title), Template(message)))
+                for name, updated_at, title, message in NotificationTemplate.objects.filter(
+                    name__in=stale
+                ).values_list('name', 'updated_at', 'title_template', 'message_template')
+            }
+            with self._lock:
+                self._compiled.update(compiled)
+        return {name: self._compiled[name][1] for name in versions if name in self._compiled}
+
+    def clear(self):
+        with self._lock:
+            self._compiled.clear()
+
+
+class SendRateLimiter:
+    """Space messages to at most ``per_minute`` a minute across all threads (0: no limit)"""
+
+    def __init__(self, per_minute: int = 0):
+        self.per_minute = per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.per_minute:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + 60.0 / self.per_minute
+        if start > now:
+            time.sleep(start - now)
+
+
+class BatchMailer:
+    """
+    Send notification emails in batches over one connection.
+
+    Each call to ``send`` opens a single backend connection (one SMTP
+    session) and sends every message of the batch through it with
+    ``send_messages``, reconnecting only after a failure. Templates come
+    from a shared ``TemplateCache`` and sending is paced by
+    ``NOTIFICATION_EMAIL_RATE_LIMIT`` (messages per minute) to stay within
+    the provider's quota.
+    """
+
+    def __init__(self, rate_limit: int = None):
+        self.templates = TemplateCache()
+        if rate_limit is None:
+            rate_limit = getattr(settings, 'NOTIFICATION_EMAIL_RATE_LIMIT', 0)
+        self.limiter = SendRateLimiter(rate_limit)
+
+    def build_message(self, notification: Notification, templates: Dict[str, Tuple[Template, Template]],
+                      connection=None) -> EmailMultiAlternatives:
+        """The email for one notification, rendered from its template if it has one"""
+        user = notification.user
+        subject, html_content = notification.title, notification.message
+
+        template = templates.get(notification.extra_data.get('template_name'))
+        if template:
+            context = Context({
+                'user': user,
+                'notification': notification,
+                'data': notification.extra_data
+            })
+            subject = template[0].render(context).strip()
+            html_content = template[1].render(context)
+
+        message = EmailMultiAlternatives(
+            subject=subject,
+            body=notification.message,  # Plain text fallback
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[user.email],
+            connection=connection
+        )
+        message.attach_alternative(html_content, 'text/html')
+        return message
+
+    def send(self, notifications: List[Notification]) -> List[Optional[str]]:
+        """Send one email per notification; returns an error message (or None) for each"""
+        errors = [None] * len(notifications)
+        pending = []
+        for index, notification in enumerate(notifications):
+            if notification.user.email:
+                pending.append(index)
+            else:
+                logger.warning(f"User {notification.user.username} has no email address")
+        if not pending:
+            return errors
+
+        templates = self.templates.get_many(
+            notifications[index].extra_data.get('template_name') for index in pending
+        )
+        connection = get_connection(fail_silently=False)
+
+        try:
+            connection.open()
+            for position, index in enumerate(pending):
+                self.limiter.wait()
+                try:
+                    message = self.build_message(notifications[index], templates, connection)
+                    connection.send_messages([message])
+                except Exception as e:
+                    errors[index] = f"{type(e).__name__}: {e}"
+                    logger.error(f"Failed email delivery for notification {notifications[index].id}: {e}")
+                    # The session may be broken; start a new one for the rest
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception as e:
+                        for rest in pending[position + 1:]:
+                            errors[rest] = f"{type(e).__name__}: {e}"
+                        break
+        except Exception as e:
+            logger.error(f"Error opening email connection: {e}")
+            for index in pending:
+                errors[index] = errors[index] or f"{type(e).__name__}: {e}"
+        finally:
+            connection.close()
+
+        logger.info(f"Email batch sent: {errors.count(None)} of {len(notifications)} delivered")
+        return errors
+
+
+# Initialize batch mailer
+batch_mailer = BatchMailer()
@@ -0,0 +1,54 @@
+# ==============================================================================
+# NOTIFICATION ARCHIVAL COMMAND
+# دستور بایگانی اعلانات قدیمی
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+from django.core.management.base import BaseCommand
+from apps.notifications.archive import NotificationArchiver
+
+
+class Command(BaseCommand):
+    """Move old notifications to the archive table"""
+
+    help = 'Archive old notifications in batches, continuing from the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Archive read notifications older than this many days'
+        )
+
+        parser.add_argument(
+            '--unread-days',
+            type=int,
+            help='Archive all notifications older than this many days'
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Notifications moved per transaction'
+        )
+
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches (the next run continues)'
+        )
+
+    def handle(self, *args, **options):
+        archiver = NotificationArchiver(batch_size=options['batch_size'])
+        stats = archiver.run(
+            days=options['days'],
+            unread_days=options['unread_days'],
+            max_batches=options['max_batches']
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {stats['archived']} notifications ({stats['unread']} unread) "
+                f"in {stats['batches']} batches"
+            )
+        )
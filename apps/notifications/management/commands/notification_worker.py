@@ -0,0 +1,81 @@
+# ==============================================================================
+# NOTIFICATION DELIVERY WORKER COMMAND
+# دستور کارگر ارسال اعلانات
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import time
+import logging
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from apps.notifications.outbox import outbox_worker
+from apps.notifications.services import OUTBOX_CHANNELS
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Deliver queued notifications from the outbox"""
+
+    help = 'Deliver queued notifications (WebSocket, email, push) from the notification outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--channel',
+            action='append',
+            choices=OUTBOX_CHANNELS,
+            help='Channel to deliver (repeatable, default: all)'
+        )
+
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the outbox is empty'
+        )
+
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Deliver until the outbox is empty, then exit'
+        )
+
+        parser.add_argument(
+            '--requeue-dead',
+            action='store_true',
+            help='Retry dead-lettered entries and exit'
+        )
+
+    def handle(self, *args, **options):
+        channels = options['channel'] or list(OUTBOX_CHANNELS)
+
+        if options['requeue_dead']:
+            count = sum(outbox_worker.requeue_dead(channel) for channel in channels)
+            self.stdout.write(self.style.SUCCESS(f'Requeued {count} dead outbox entries'))
+            return
+
+        self.stdout.write(f"Delivering notifications on: {', '.join(channels)}")
+        totals = {'sent': 0, 'retried': 0, 'dead': 0}
+
+        try:
+            while True:
+                close_old_connections()
+                results = outbox_worker.run_once(channels)
+                for stats in results.values():
+                    for key in totals:
+                        totals[key] += stats[key]
+
+                # Poll again right away while there is work
+                if any(sum(stats.values()) for stats in results.values()):
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping worker')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sent {totals['sent']}, retried {totals['retried']}, dead-lettered {totals['dead']}"
+            )
+        )
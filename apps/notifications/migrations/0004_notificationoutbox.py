@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notificationpreference_notificationtemplate_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('in_app', 'درون برنامه'), ('email', 'ایمیل'), ('sms', 'پیامک'), ('push', 'اعلان پوش'), ('websocket', 'وب\u200cسوکت'), ('web', 'وب'), ('flutter', 'اپلیکیشن موبایل'), ('telegram', 'تلگرام'), ('discord', 'دیسکورد'), ('slack', 'اسلک')], max_length=20, verbose_name='کانال')),
+                ('status', models.CharField(choices=[('pending', 'در انتظار'), ('processing', 'در حال ارسال'), ('dead', 'ناموفق')], default='pending', max_length=20, verbose_name='وضعیت')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='تعداد تلاش')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='قابل ارسال از')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='قفل تا')),
+                ('last_error', models.TextField(blank=True, verbose_name='آخرین خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_entries', to='notifications.notification', verbose_name='اعلان')),
+            ],
+            options={
+                'verbose_name': 'صف ارسال اعلان',
+                'verbose_name_plural': 'صف ارسال اعلانات',
+                'db_table': 'notification_outbox',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['channel', 'status', 'available_at'], name='notificatio_channel_e49bcb_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0005_notification_feed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchiveState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='default', max_length=50, unique=True, verbose_name='نام')),
+                ('watermark_created_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان نشانگر')),
+                ('watermark_id', models.UUIDField(blank=True, null=True, verbose_name='شناسه نشانگر')),
+                ('archived_total', models.BigIntegerField(default=0, verbose_name='تعداد کل بایگانی')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ به\u200cروزرسانی')),
+            ],
+            options={
+                'verbose_name': 'وضعیت بایگانی اعلانات',
+                'verbose_name_plural': 'وضعیت بایگانی اعلانات',
+                'db_table': 'notification_archive_state',
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200, verbose_name='عنوان')),
+                ('message', models.TextField(verbose_name='پیام')),
+                ('type', models.CharField(choices=[('info', 'اطلاعات'), ('success', 'موفقیت'), ('warning', 'هشدار'), ('error', 'خطا'), ('urgent', 'فوری'), ('announcement', 'اعلان'), ('assignment', 'تکلیف'), ('grade', 'نمره'), ('schedule', 'برنامه زمانی'), ('exam', 'امتحان'), ('attendance', 'حضور و غیاب'), ('payment', 'پرداخت'), ('library', 'کتابخانه'), ('message', 'پیام')], max_length=20, verbose_name='نوع اعلان')),
+                ('priority', models.CharField(choices=[('low', 'پایین'), ('normal', 'عادی'), ('high', 'بالا'), ('critical', 'بحرانی')], max_length=20, verbose_name='اولویت')),
+                ('extra_data', models.JSONField(blank=True, default=dict)),
+                ('is_read', models.BooleanField(default=False, verbose_name='خوانده شده')),
+                ('read_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان خواندن')),
+                ('created_at', models.DateTimeField(verbose_name='تاریخ ایجاد')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ بایگانی')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'اعلان بایگانی\u200cشده',
+                'verbose_name_plural': 'اعلانات بایگانی\u200cشده',
+                'db_table': 'notification_archive',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='notification_archive_user_idx')],
+            },
+        ),
+    ]
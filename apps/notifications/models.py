@@ -156,6 +156,7 @@ class Notification(models.Model):
         ordering = ['-created_at', '-priority']
         indexes = [
             models.Index(fields=['user', 'is_read']),
+            models.Index(fields=['user', '-created_at', '-id'], name='notifications_user_feed_idx'),
             models.Index(fields=['type', 'priority']),
             models.Index(fields=['created_at']),
             models.Index(fields=['scheduled_for']),
@@ -338,3 +339,107 @@ class WebSocketConnection(models.Model):
         self.is_active = False
         self.disconnected_at = timezone.now()
         self.save(update_fields=['is_active', 'disconnected_at'])
+
+
+class OutboxStatus(models.TextChoices):
+    """Delivery states of an outbox entry"""
+    PENDING = 'pending', _('در انتظار')
+    PROCESSING = 'processing', _('در حال ارسال')
+    DEAD = 'dead', _('ناموفق')
+
+
+class NotificationOutbox(models.Model):
+    """
+    Pending delivery of a notification through one channel.
+
+    Entries are written in the transaction creating the notification and
+    delivered by the ``notification_worker`` command; delivered entries are
+    deleted, and entries failing every attempt are kept as ``dead``.
+    """
+    
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.CASCADE,
+        related_name='outbox_entries',
+        verbose_name=_('اعلان')
+    )
+    channel = models.CharField(
+        max_length=20,
+        choices=NotificationChannel.choices,
+        verbose_name=_('کانال')
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=OutboxStatus.choices,
+        default=OutboxStatus.PENDING,
+        verbose_name=_('وضعیت')
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_('تعداد تلاش'))
+    available_at = models.DateTimeField(default=timezone.now, verbose_name=_('قابل ارسال از'))
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name=_('قفل تا'))
+    last_error = models.TextField(blank=True, verbose_name=_('آخرین خطا'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('تاریخ ایجاد'))
+    
+    class Meta:
+        db_table = 'notification_outbox'
+        verbose_name = _('صف ارسال اعلان')
+        verbose_name_plural = _('صف ارسال اعلانات')
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['channel', 'status', 'available_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.channel} - {self.notification_id} ({self.status})"
+
+
+class NotificationArchive(models.Model):
+    """
+    Compact copy of an archived notification.
+
+    Old notifications are moved here in batches by the
+    ``archive_notifications`` command, keeping the hot ``notifications``
+    table small; only what a user may still look up is kept.
+    """
+    
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    title = models.CharField(max_length=200, verbose_name=_('عنوان'))
+    message = models.TextField(verbose_name=_('پیام'))
+    type = models.CharField(max_length=20, choices=NotificationType.choices, verbose_name=_('نوع اعلان'))
+    priority = models.CharField(max_length=20, choices=NotificationPriority.choices, verbose_name=_('اولویت'))
+    extra_data = models.JSONField(default=dict, blank=True)
+    is_read = models.BooleanField(default=False, verbose_name=_('خوانده شده'))
+    read_at = models.DateTimeField(null=True, blank=True, verbose_name=_('زمان خواندن'))
+    created_at = models.DateTimeField(verbose_name=_('تاریخ ایجاد'))
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name=_('تاریخ بایگانی'))
+    
+    class Meta:
+        db_table = 'notification_archive'
+        verbose_name = _('اعلان بایگانی‌شده')
+        verbose_name_plural = _('اعلانات بایگانی‌شده')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notification_archive_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.title}"
+
+
+class NotificationArchiveState(models.Model):
+    """Watermark of the archival job: everything before it has been archived"""
+    
+    name = models.CharField(max_length=50, unique=True, default='default', verbose_name=_('نام'))
+    watermark_created_at = models.DateTimeField(null=True, blank=True, verbose_name=_('زمان نشانگر'))
+    watermark_id = models.UUIDField(null=True, blank=True, verbose_name=_('شناسه نشانگر'))
+    archived_total = models.BigIntegerField(default=0, verbose_name=_('تعداد کل بایگانی'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('تاریخ به‌روزرسانی'))
+    
+    class Meta:
+        db_table = 'notification_archive_state'
+        verbose_name = _('وضعیت بایگانی اعلانات')
+        verbose_name_plural = _('وضعیت بایگانی اعلانات')
+    
+    def __str__(self):
+        return f"{self.name} ({self.watermark_created_at})"
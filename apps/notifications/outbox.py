@@ -0,0 +1,186 @@
+# ==============================================================================
+# NOTIFICATION OUTBOX WORKER
+# کارگر ارسال صف اعلانات
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import logging
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .mailer import batch_mailer
+from .models import Notification, NotificationOutbox, OutboxStatus
+from .services import notification_service, OUTBOX_CHANNELS
+
+logger = logging.getLogger(__name__)
+
+
+def _deliver_each(send):
+    def deliver(notifications: List[Notification]) -> List[Optional[str]]:
+        errors = []
+        for notification in notifications:
+            try:
+                send(notification)
+                errors.append(None)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+        return errors
+    return deliver
+
+
+class OutboxWorker:
+    """
+    Deliver queued ``NotificationOutbox`` entries.
+
+    Each pass claims up to ``batch_size`` due entries per channel by
+    leasing them (``locked_until``) under ``select_for_update(skip_locked)``
+    where the database supports it, so several workers can run side by
+    side and entries of a crashed worker are picked up again once their
+    lease runs out. A claimed batch is split over the channel's
+    concurrency (threads; each email chunk shares one SMTP connection),
+    delivered, and then settled with a handful of queries: delivered
+    entries are deleted, failed ones retried with exponential backoff and
+    dead-lettered after ``max_attempts``.
+    """
+
+    def __init__(self, batch_size: int = None, max_attempts: int = None,
+                 backoff: float = None, lease: float = None, concurrency: Dict[str, int] = None):
+        # Unset options are read from settings on every pass
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._lease = lease
+        self._concurrency = concurrency
+        self.handlers = {
+            'websocket': notification_service.send_websocket_batch,
+            'email': batch_mailer.send,
+            'push': _deliver_each(notification_service.send_push_notification),
+        }
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size or getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 200)
+
+    @property
+    def max_attempts(self) -> int:
+        return self._max_attempts or getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+
+    @property
+    def backoff(self) -> float:
+        if self._backoff is not None:
+            return self._backoff
+        return getattr(settings, 'NOTIFICATION_OUTBOX_RETRY_BACKOFF', 30.0)
+
+    @property
+    def lease(self) -> float:
+        return self._lease or getattr(settings, 'NOTIFICATION_OUTBOX_LEASE', 300.0)
+
+    def concurrency(self, channel: str) -> int:
+        limits = self._concurrency or getattr(settings, 'NOTIFICATION_OUTBOX_CONCURRENCY', {})
+        return max(int(limits.get(channel, 1)), 1)
+
+    def run_once(self, channels: List[str] = None) -> Dict[str, Dict[str, int]]:
+        """Deliver one batch of every channel; returns ``{channel: {'sent', 'retried', 'dead'}}``"""
+        return {channel: self.process_channel(channel) for channel in channels or OUTBOX_CHANNELS}
+
+    def claim(self, channel: str) -> List[NotificationOutbox]:
+        """Lease the next due entries of ``channel``"""
+        now = timezone.now()
+        due = Q(status=OutboxStatus.PENDING, available_at__lte=now) | Q(
+            status=OutboxStatus.PROCESSING, locked_until__lt=now
+        )
+        with transaction.atomic():
+            queryset = NotificationOutbox.objects.filter(due, channel=channel).order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                queryset = queryset.select_for_update(skip_locked=True)
+            ids = list(queryset.values_list('id', flat=True)[:self.batch_size])
+            if ids:
+                NotificationOutbox.objects.filter(id__in=ids).update(
+                    status=OutboxStatus.PROCESSING,
+                    locked_until=now + timedelta(seconds=self.lease)
+                )
+        return list(
+            NotificationOutbox.objects.filter(id__in=ids)
+            .select_related('notification__user')
+            .order_by('id')
+        ) if ids else []
+
+    def process_channel(self, channel: str) -> Dict[str, int]:
+        """Claim, deliver and settle one batch of ``channel``"""
+        entries = self.claim(channel)
+        if not entries:
+            return {'sent': 0, 'retried': 0, 'dead': 0}
+
+        errors = self._deliver(channel, [entry.notification for entry in entries])
+        return self._settle(channel, entries, errors)
+
+    def _deliver(self, channel: str, notifications: List[Notification]) -> List[Optional[str]]:
+        handler = self.handlers[channel]
+        workers = min(self.concurrency(channel), len(notifications))
+        if workers == 1:
+            return handler(notifications)
+
+        def run(chunk):
+            try:
+                return handler(chunk)
+            finally:
+                # Worker threads open their own database connections
+                connections.close_all()
+
+        size = -(-len(notifications) // workers)
+        chunks = [notifications[i:i + size] for i in range(0, len(notifications), size)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [error for errors in executor.map(run, chunks) for error in errors]
+
+    def _settle(self, channel: str, entries: List[NotificationOutbox],
+                errors: List[Optional[str]]) -> Dict[str, int]:
+        now = timezone.now()
+        sent = [entry for entry, error in zip(entries, errors) if error is None]
+        stats = {'sent': len(sent), 'retried': 0, 'dead': 0}
+
+        with transaction.atomic():
+            if sent:
+                notification_ids = [entry.notification_id for entry in sent]
+                Notification.objects.filter(id__in=notification_ids, is_sent=False).update(
+                    is_sent=True, sent_at=now
+                )
+                if channel == 'websocket':
+                    Notification.objects.filter(id__in=notification_ids).update(websocket_sent=True)
+                NotificationOutbox.objects.filter(id__in=[entry.id for entry in sent]).delete()
+
+            for entry, error in zip(entries, errors):
+                if error is None:
+                    continue
+                entry.attempts += 1
+                entry.last_error = error[:1000]
+                entry.locked_until = None
+                if entry.attempts >= self.max_attempts:
+                    entry.status = OutboxStatus.DEAD
+                    stats['dead'] += 1
+                    logger.error(
+                        f"Giving up {channel} delivery of notification {entry.notification_id}: {error}"
+                    )
+                else:
+                    entry.status = OutboxStatus.PENDING
+                    entry.available_at = now + timedelta(seconds=self.backoff * 2 ** (entry.attempts - 1))
+                    stats['retried'] += 1
+                entry.save(update_fields=['attempts', 'last_error', 'locked_until', 'status', 'available_at'])
+
+        return stats
+
+    def requeue_dead(self, channel: str = None) -> int:
+        """Give dead-lettered entries a fresh set of attempts"""
+        queryset = NotificationOutbox.objects.filter(status=OutboxStatus.DEAD)
+        if channel:
+            queryset = queryset.filter(channel=channel)
+        return queryset.update(
+            status=OutboxStatus.PENDING, attempts=0, available_at=timezone.now(), locked_until=None
+        )
+
+
+# Initialize outbox worker
+outbox_worker = OutboxWorker()
@@ -0,0 +1,111 @@
+# ==============================================================================
+# KEYSET PAGINATION FOR NOTIFICATION FEEDS
+# صفحه‌بندی کلیدی فهرست اعلانات
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import base64
+import uuid
+from typing import Dict, Any, Optional, Tuple
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+def encode_cursor(notification) -> str:
+    """Opaque cursor for a notification's ``(created_at, id)`` position"""
+    raw = f"{notification.created_at.isoformat()}|{notification.pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, uuid.UUID]:
+    """``(created_at, id)`` of a cursor; raises ``ValueError`` if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, pk = raw.split('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(cursor)
+        return created_at, uuid.UUID(pk)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def notification_page(queryset, cursor: Optional[str] = None, since: Optional[str] = None,
+                      limit: int = 20) -> Dict[str, Any]:
+    """
+    One page of a notification feed, by keyset on ``(created_at, id)``.
+
+    Without ``since`` the page holds the ``limit`` newest notifications
+    older than ``cursor`` (newest first); ``next_cursor`` continues with
+    older ones. With ``since`` it holds the notifications created after
+    that cursor (oldest first), so a reconnecting client fetches only what
+    it missed, following ``next_cursor`` as ``since`` while ``has_more``.
+    Either way ``since_cursor`` marks the newest notification the client
+    has now seen. Each page is an index range scan, not an OFFSET, and is
+    stable while new notifications arrive.
+    """
+    if since:
+        created_at, pk = decode_cursor(since)
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        ).order_by('created_at', 'id')
+    else:
+        queryset = queryset.order_by('-created_at', '-id')
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    items = list(queryset[:limit + 1])
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    if since:
+        newest = items[-1] if items else None
+    else:
+        newest = items[0] if items and not cursor else None
+    return {
+        'results': items,
+        'next_cursor': encode_cursor(items[-1]) if has_more else None,
+        'since_cursor': encode_cursor(newest) if newest else (since or None),
+        'has_more': has_more,
+    }
+
+
+class NotificationPagination(PageNumberPagination):
+    """
+    Page numbers by default; keyset pages when ``cursor`` (empty for the
+    first page) or ``since`` is passed, see ``notification_page``.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        self.keyset = None
+        if 'cursor' not in params and 'since' not in params:
+            return super().paginate_queryset(queryset, request, view)
+
+        try:
+            self.keyset = notification_page(
+                queryset,
+                cursor=params.get('cursor') or None,
+                since=params.get('since') or None,
+                limit=self.get_page_size(request)
+            )
+        except ValueError as e:
+            raise ValidationError({'cursor': str(e)})
+        return self.keyset['results']
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'next_cursor': self.keyset['next_cursor'],
+            'since_cursor': self.keyset['since_cursor'],
+            'has_more': self.keyset['has_more'],
+            'results': data,
+        })
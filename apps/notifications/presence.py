@@ -0,0 +1,244 @@
+# ==============================================================================
+# WEBSOCKET PRESENCE REGISTRY
+# ثبت حضور اتصالات وب‌سوکت
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from datetime import timedelta
+from typing import Dict, List, Any, Optional
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+from .models import WebSocketConnection
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceRegistry:
+    """
+    Write-behind tracking of WebSocket connections.
+
+    Connects, heartbeats (client pings) and disconnects only touch this
+    process's in-memory view and a short-TTL cache entry per connection,
+    which is what the admin statistics read. The changes are journalled
+    and written to ``WebSocketConnection`` at most every
+    ``NOTIFICATION_PRESENCE_FLUSH_INTERVAL`` seconds with one upsert, so a
+    client flapping between networks costs no database write per flap;
+    stored timestamps are accurate to the flush interval.
+
+    Every flush also refreshes the cache entries of this process's open
+    connections and publishes their ids, so other processes see them, and
+    marks inactive the rows left behind by processes that died.
+    """
+
+    prefix = 'notifications:presence'
+
+    def __init__(self):
+        self.process_key = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._live = {}
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'NOTIFICATION_COUNTER_CACHE', 'default')]
+
+    @property
+    def ttl(self) -> int:
+        return getattr(settings, 'NOTIFICATION_PRESENCE_TTL', 90)
+
+    @property
+    def flush_interval(self) -> float:
+        return getattr(settings, 'NOTIFICATION_PRESENCE_FLUSH_INTERVAL', 30)
+
+    def key(self, connection_id: str) -> str:
+        return f"{self.prefix}:conn:{connection_id}"
+
+    def connect(self, connection_id: str, user, channel_name: str = '', user_agent: str = '',
+                platform: str = 'web', ip_address: Optional[str] = None):
+        """Register an opened connection"""
+        now = timezone.now()
+        entry = {
+            'connection_id': connection_id,
+            'channel_name': channel_name or connection_id,
+            'user_id': user.pk,
+            'username': user.username,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'platform': platform,
+            'user_agent': user_agent,
+            'ip_address': ip_address,
+            'connected_at': now,
+            'last_seen': now,
+            'disconnected_at': None,
+        }
+        with self._lock:
+            self._live[connection_id] = entry
+            self._dirty[connection_id] = entry
+        self._publish([entry])
+        self.maybe_flush()
+
+    def heartbeat(self, connection_id: str) -> bool:
+        """Record activity on an open connection; False if it is unknown here"""
+        with self._lock:
+            entry = self._live.get(connection_id)
+            if entry is None:
+                return False
+            entry['last_seen'] = timezone.now()
+            self._dirty[connection_id] = entry
+        self._publish([entry])
+        self.maybe_flush()
+        return True
+
+    def disconnect(self, connection_id: str):
+        """Register a closed connection"""
+        now = timezone.now()
+        with self._lock:
+            entry = self._live.pop(connection_id, None)
+            if entry is not None:
+                entry['last_seen'] = entry['disconnected_at'] = now
+                self._dirty[connection_id] = entry
+            idle = not self._live
+        try:
+            self.cache.delete(self.key(connection_id))
+        except Exception as e:
+            logger.error(f"Error removing presence of {connection_id}: {e}")
+        # Nothing left to trigger a later flush once the last client leaves
+        self.maybe_flush(force=idle)
+
+    def _publish(self, entries: List[Dict[str, Any]]):
+        try:
+            self.cache.set_many({
+                self.key(entry['connection_id']): self._public(entry) for entry in entries
+            }, self.ttl)
+        except Exception as e:
+            logger.error(f"Error publishing presence: {e}")
+
+    def _public(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'user__username': entry['username'],
+            'user__first_name': entry['first_name'],
+            'user__last_name': entry['last_name'],
+            'user_id': entry['user_id'],
+            'platform': entry['platform'],
+            'connected_at': entry['connected_at'].isoformat(),
+            'last_activity': entry['last_seen'].isoformat(),
+        }
+
+    def active_connections(self) -> List[Dict[str, Any]]:
+        """Open connections of all processes, newest first"""
+        ids = set(self._live)
+        try:
+            rosters = self.cache.get(f"{self.prefix}:rosters") or {}
+            for roster in self.cache.get_many(
+                [f"{self.prefix}:roster:{process}" for process in rosters]
+            ).values():
+                ids.update(roster)
+            entries = list(self.cache.get_many([self.key(connection_id) for connection_id in ids]).values())
+        except Exception as e:
+            logger.error(f"Error reading presence: {e}")
+            with self._lock:
+                entries = [self._public(entry) for entry in self._live.values()]
+        return sorted(entries, key=lambda entry: entry['connected_at'], reverse=True)
+
+    def maybe_flush(self, force: bool = False) -> int:
+        """Flush if the interval has passed (or ``force``) and no flush is running"""
+        if not force and time.monotonic() - self._flushed_at < self.flush_interval:
+            return 0
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self.flush()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self) -> int:
+        """Write journalled changes to ``WebSocketConnection``; returns the rows written"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            live = list(self._live.values())
+        self._flushed_at = time.monotonic()
+
+        self._publish(live)
+        self._publish_roster([entry['connection_id'] for entry in live])
+
+        try:
+            if dirty:
+                self._write(list(dirty.values()))
+            self.reap()
+        except Exception as e:
+            logger.error(f"Error flushing WebSocket connections: {e}")
+            # Keep the changes for the next flush unless newer ones arrived
+            with self._lock:
+                for connection_id, entry in dirty.items():
+                    self._dirty.setdefault(connection_id, entry)
+            return 0
+        return len(dirty)
+
+    def _write(self, entries: List[Dict[str, Any]]):
+        WebSocketConnection.objects.bulk_create(
+            [
+                WebSocketConnection(
+                    user_id=entry['user_id'],
+                    connection_id=entry['connection_id'],
+                    channel_name=entry['channel_name'],
+                    user_agent=entry['user_agent'],
+                    ip_address=entry['ip_address'],
+                    platform=entry['platform'],
+                    is_active=entry['disconnected_at'] is None,
+                    disconnected_at=entry['disconnected_at'],
+                )
+                for entry in entries
+            ],
+            update_conflicts=True,
+            # MySQL upserts on any unique key and rejects an explicit target
+            unique_fields=['connection_id'] if connection.features.supports_update_conflicts_with_target else None,
+            update_fields=['channel_name', 'is_active', 'last_activity', 'disconnected_at'],
+        )
+
+    def _publish_roster(self, connection_ids: List[str]):
+        # Rosters outlive a few missed flushes before their process counts as gone
+        lifetime = max(self.ttl, 3 * self.flush_interval)
+        now = time.time()
+        try:
+            self.cache.set(f"{self.prefix}:roster:{self.process_key}", connection_ids, lifetime)
+            rosters = self.cache.get(f"{self.prefix}:rosters") or {}
+            rosters = {process: seen for process, seen in rosters.items() if now - seen < lifetime}
+            rosters[self.process_key] = now
+            self.cache.set(f"{self.prefix}:rosters", rosters, None)
+        except Exception as e:
+            logger.error(f"Error publishing presence roster: {e}")
+
+    def reap(self, limit: int = 1000) -> int:
+        """Mark inactive the rows of connections no process reports any more"""
+        cutoff = timezone.now() - timedelta(seconds=self.ttl + self.flush_interval)
+        stale = list(
+            WebSocketConnection.objects.filter(is_active=True, last_activity__lt=cutoff)
+            .values_list('connection_id', flat=True)[:limit]
+        )
+        if not stale:
+            return 0
+        present = set(self._present(stale))
+        gone = [connection_id for connection_id in stale if connection_id not in present]
+        if not gone:
+            return 0
+        return WebSocketConnection.objects.filter(connection_id__in=gone, is_active=True).update(
+            is_active=False, disconnected_at=timezone.now()
+        )
+
+    def _present(self, connection_ids: List[str]) -> List[str]:
+        found = self.cache.get_many([self.key(connection_id) for connection_id in connection_ids])
+        return [connection_id for connection_id in connection_ids if self.key(connection_id) in found]
+
+
+# Initialize presence registry
+presence_registry = PresenceRegistry()
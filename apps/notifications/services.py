@@ -6,23 +6,41 @@
 
 import logging
 import json
+import uuid
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
+from itertools import islice
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from .archive import notification_archiver
+from .counters import unread_counter
+from .fanout import group_fanout
+from .mailer import batch_mailer
+from .presence import presence_registry
 from .models import (
     Notification, NotificationTemplate, NotificationPreference, 
-    WebSocketConnection
+    WebSocketConnection, NotificationOutbox, OutboxStatus
 )
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+# Channels used for users who never saved notification preferences
+DEFAULT_PREFERENCES = {
+    'websocket_enabled': True,
+    'email_enabled': False,
+    'push_enabled': False,
+    'sms_enabled': False
+}
+
+# Channels delivered through the outbox, in delivery order
+OUTBOX_CHANNELS = ('websocket', 'email', 'push')
+
 
 class NotificationService:
     """Comprehensive notification service for all delivery channels"""
@@ -36,26 +54,26 @@ class NotificationService:
         title: str,
         message: str,
         notification_type: str = 'info',
-        priority: str = 'medium',
+        priority: str = 'normal',
         data: Optional[Dict] = None,
         template_name: Optional[str] = None,
         auto_send: bool = True
     ) -> Notification:
         """Create a new notification"""
         try:
-            # Create notification instance
-            notification = Notification.objects.create(
-                user=user,
-                title=title,
-                message=message,
-                notification_type=notification_type,
-                priority=priority,
-                data=data or {},
-                template_name=template_name
-            )
-            
-            if auto_send:
-                self.send_notification(notification)
+            # The notification and its outbox entries commit together
+            with transaction.atomic():
+                notification = Notification.objects.create(
+                    user=user,
+                    title=title,
+                    message=message,
+                    type=notification_type,
+                    priority=priority,
+                    extra_data=self._extra_data(data, template_name)
+                )
+                
+                if auto_send:
+                    self.enqueue_notifications([notification])
             
             logger.info(f"Notification created for user {user.username}: {title}")
             return notification
@@ -64,37 +82,61 @@ class NotificationService:
             logger.error(f"Error creating notification: {e}")
             raise
     
+    def _extra_data(self, data: Optional[Dict], template_name: Optional[str]) -> Dict:
+        """Notification extra_data, recording the template used if any"""
+        extra_data = dict(data or {})
+        if template_name:
+            extra_data['template_name'] = template_name
+        return extra_data
+    
     def create_bulk_notifications(
         self,
-        users: List,
+        users,
         title: str,
         message: str,
         notification_type: str = 'info',
-        priority: str = 'medium',
+        priority: str = 'normal',
         data: Optional[Dict] = None,
         template_name: Optional[str] = None
     ) -> List[Notification]:
-        """Create notifications for multiple users"""
+        """
+        Create notifications for multiple users.
+
+        ``users`` may be a list or a queryset (read with ``iterator()``).
+        Notifications are inserted with ``bulk_create`` and enqueued in
+        batches of ``NOTIFICATION_BULK_BATCH_SIZE``, so the number of queries
+        grows with the number of batches, not users.
+        """
+        batch_size = getattr(settings, 'NOTIFICATION_BULK_BATCH_SIZE', 500)
+        extra_data = self._extra_data(data, template_name)
         notifications = []
         
         try:
-            for user in users:
-                notification = Notification.objects.create(
-                    user=user,
-                    title=title,
-                    message=message,
-                    notification_type=notification_type,
-                    priority=priority,
-                    data=data or {},
-                    template_name=template_name
-                )
-                notifications.append(notification)
-            
-            # Send all notifications
-            for notification in notifications:
-                self.send_notification(notification)
-            
-            logger.info(f"Bulk notifications created for {len(users)} users: {title}")
+            users = users.iterator(chunk_size=batch_size) if hasattr(users, 'iterator') else iter(users)
+            while True:
+                batch = list(islice(users, batch_size))
+                if not batch:
+                    break
+                
+                with transaction.atomic():
+                    created = Notification.objects.bulk_create([
+                        Notification(
+                            user=user,
+                            title=title,
+                            message=message,
+                            type=notification_type,
+                            priority=priority,
+                            extra_data=extra_data
+                        )
+                        for user in batch
+                    ])
+                    self.enqueue_notifications(created)
+                    user_ids = [notification.user_id for notification in created]
+                    # bulk_create sends no post_save, so count the batch here
+                    transaction.on_commit(lambda user_ids=user_ids: unread_counter.incr_many(user_ids))
+                notifications.extend(created)
+            
+            logger.info(f"Bulk notifications created for {len(notifications)} users: {title}")
             return notifications
             
         except Exception as e:
@@ -102,128 +144,101 @@ class NotificationService:
             raise
     
     def send_notification(self, notification: Notification):
-        """Send notification through appropriate channels"""
+        """Queue notification for delivery through appropriate channels"""
         try:
-            # Get user preferences
-            preferences = self.get_user_preferences(notification.user)
-            
-            # Send through each enabled channel
-            if preferences.get('websocket_enabled', True):
-                self.send_websocket_notification(notification)
-            
-            if preferences.get('email_enabled', False):
-                self.send_email_notification(notification)
-            
-            if preferences.get('push_enabled', False):
-                self.send_push_notification(notification)
-            
-            # Mark as sent
-            notification.is_sent = True
-            notification.sent_at = timezone.now()
-            notification.save()
-            
+            self.enqueue_notifications([notification])
         except Exception as e:
             logger.error(f"Error sending notification {notification.id}: {e}")
     
+    def enqueue_notifications(self, notifications: List[Notification]) -> int:
+        """
+        Queue a batch of notifications on each recipient's enabled channels.
+
+        Only ``NotificationOutbox`` entries are written (preferences are read
+        with one query, entries inserted with one ``bulk_create``); delivery
+        is left to the ``notification_worker`` command, so callers never
+        wait on SMTP or the channel layer. Call inside the transaction
+        creating the notifications so both commit or neither does.
+        """
+        if not notifications:
+            return 0
+        
+        preferences = self.get_bulk_preferences({n.user_id for n in notifications})
+        now = timezone.now()
+        entries = []
+        
+        for notification in notifications:
+            user_preferences = preferences.get(notification.user_id, DEFAULT_PREFERENCES)
+            for channel in OUTBOX_CHANNELS:
+                if user_preferences.get(f'{channel}_enabled', False):
+                    entries.append(NotificationOutbox(
+                        notification=notification,
+                        channel=channel,
+                        available_at=notification.scheduled_for or now
+                    ))
+        
+        NotificationOutbox.objects.bulk_create(entries)
+        return len(entries)
+    
+    def get_unread_counts(self, user_ids) -> Dict[Any, int]:
+        """Unread notification count per user, from the cached counters"""
+        return unread_counter.get_many(user_ids)
+    
     def send_websocket_notification(self, notification: Notification):
         """Send notification via WebSocket"""
-        try:
-            if not self.channel_layer:
-                logger.warning("Channel layer not configured for WebSocket notifications")
-                return
-            
-            # Prepare notification data for WebSocket
-            notification_data = notification.to_websocket_dict()
-            
-            # Send to user's personal group
-            group_name = f"notifications_{notification.user.id}"
-            
-            async_to_sync(self.channel_layer.group_send)(
-                group_name,
-                {
+        error = self.send_websocket_batch([notification])[0]
+        if error:
+            raise RuntimeError(f"WebSocket delivery for notification {notification.id} failed: {error}")
+    
+    def send_websocket_batch(self, notifications: List[Notification]) -> List[Optional[str]]:
+        """
+        Send a batch of notifications via WebSocket.
+
+        All group sends of the batch go out through ``group_fanout`` in one
+        event loop. Each user gets one unread count update per batch, and
+        notifications of a global broadcast (``extra_data['broadcast']``)
+        send no per-user copy, since the broadcast group already carried
+        them to every connected client. Returns an error message (or None)
+        for each notification.
+        """
+        errors = [None] * len(notifications)
+        if not self.channel_layer:
+            logger.warning("Channel layer not configured for WebSocket notifications")
+            return errors
+        
+        unread_counts = unread_counter.get_many({n.user_id for n in notifications})
+        messages, owners, last_of_user = [], [], {}
+        
+        for index, notification in enumerate(notifications):
+            if not notification.extra_data.get('broadcast'):
+                messages.append((f"notifications_{notification.user_id}", {
                     'type': 'notification_message',
-                    'notification': notification_data
-                }
-            )
-            
-            # Update unread count
-            unread_count = Notification.objects.filter(
-                user=notification.user,
-                is_read=False
-            ).count()
-            
-            async_to_sync(self.channel_layer.group_send)(
-                group_name,
-                {
-                    'type': 'unread_count_update',
-                    'count': unread_count
-                }
-            )
-            
-            # Record delivery (would use NotificationDelivery model if implemented)
-            logger.info(f"WebSocket delivery recorded for notification {notification.id}")
-            
-            logger.debug(f"WebSocket notification sent to user {notification.user.username}")
-            
-        except Exception as e:
-            logger.error(f"Error sending WebSocket notification: {e}")
-            # Record failed delivery (would use NotificationDelivery model if implemented)
-            logger.error(f"Failed WebSocket delivery for notification {notification.id}: {e}")
+                    'notification': notification.to_websocket_dict()
+                }))
+                owners.append(index)
+            last_of_user[notification.user_id] = index
+        
+        for user_id, index in last_of_user.items():
+            messages.append((f"notifications_{user_id}", {
+                'type': 'unread_count_update',
+                'count': unread_counts.get(user_id, 0)
+            }))
+            owners.append(index)
+        
+        for owner, error in zip(owners, group_fanout.send(self.channel_layer, messages)):
+            if error and not errors[owner]:
+                errors[owner] = error
+        
+        logger.info(f"WebSocket batch sent: {len(messages)} messages for {len(notifications)} notifications")
+        return errors
     
     def send_email_notification(self, notification: Notification):
         """Send notification via email"""
-        try:
-            user = notification.user
-            
-            # Skip if user has no email
-            if not user.email:
-                logger.warning(f"User {user.username} has no email address")
-                return
-            
-            # Use template if specified
-            if notification.template_name:
-                try:
-                    template = NotificationTemplate.objects.get(
-                        name=notification.template_name,
-                        template_type='email'
-                    )
-                    
-                    context = {
-                        'user': user,
-                        'notification': notification,
-                        'data': notification.data
-                    }
-                    
-                    subject = template.render_subject(context)
-                    html_content = template.render_content(context)
-                    
-                except NotificationTemplate.DoesNotExist:
-                    # Fallback to simple email
-                    subject = notification.title
-                    html_content = notification.message
-            else:
-                subject = notification.title
-                html_content = notification.message
-            
-            # Send email
-            send_mail(
-                subject=subject,
-                message=notification.message,  # Plain text fallback
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html_content,
-                fail_silently=False
-            )
-            
-            # Record successful delivery (would use NotificationDelivery model if implemented)
-            logger.info(f"Email delivery recorded for notification {notification.id}")
-            
-            logger.info(f"Email notification sent to {user.email}")
-            
-        except Exception as e:
-            logger.error(f"Error sending email notification: {e}")
-            # Record failed delivery (would use NotificationDelivery model if implemented)
-            logger.error(f"Failed email delivery for notification {notification.id}: {e}")
+        # Batches of emails go through batch_mailer.send directly
+        error = batch_mailer.send([notification])[0]
+        if error:
+            raise RuntimeError(f"Email delivery for notification {notification.id} failed: {error}")
+        logger.info(f"Email notification sent to {notification.user.email}")
     
     def send_push_notification(self, notification: Notification):
         """Send push notification (placeholder for future implementation)"""
@@ -239,38 +254,25 @@ class NotificationService:
         except Exception as e:
             logger.error(f"Error sending push notification: {e}")
             # Would record failed delivery if NotificationDelivery model was implemented
+            raise
     
     def get_user_preferences(self, user) -> Dict[str, Any]:
         """Get user notification preferences"""
+        return self.get_bulk_preferences([user.pk]).get(user.pk, dict(DEFAULT_PREFERENCES))
+    
+    def get_bulk_preferences(self, user_ids) -> Dict[Any, Dict[str, Any]]:
+        """Channel preferences of many users in one query; users without any are left out"""
         try:
-            preferences = NotificationPreference.objects.filter(user=user)
-            
-            # Convert to dictionary
-            prefs_dict = {}
-            for pref in preferences:
-                prefs_dict[f"{pref.delivery_method}_enabled"] = pref.is_enabled
-                if pref.notification_types:
-                    prefs_dict[f"{pref.delivery_method}_types"] = pref.notification_types
-            
-            # Set defaults if no preferences exist
-            if not prefs_dict:
-                prefs_dict = {
-                    'websocket_enabled': True,
-                    'email_enabled': False,
-                    'push_enabled': False,
-                    'sms_enabled': False
-                }
-            
-            return prefs_dict
-            
-        except Exception as e:
-            logger.error(f"Error getting user preferences: {e}")
             return {
-                'websocket_enabled': True,
-                'email_enabled': False,
-                'push_enabled': False,
-                'sms_enabled': False
+                row.pop('user_id'): row
+                for row in NotificationPreference.objects.filter(user_id__in=list(user_ids)).values(
+                    'user_id', 'websocket_enabled', 'email_enabled', 'push_enabled',
+                    'sms_enabled', 'in_app_enabled'
+                )
             }
+        except Exception as e:
+            logger.error(f"Error getting user preferences: {e}")
+            return {}
     
     def broadcast_to_all_users(
         self,
@@ -287,13 +289,16 @@ class NotificationService:
             if exclude_users:
                 users = users.exclude(id__in=[u.id for u in exclude_users])
             
-            # Create notifications for all users
-            self.create_bulk_notifications(
-                users=list(users),
+            # Create notifications for all users; the global broadcast
+            # below carries their content to connected clients
+            broadcast_id = uuid.uuid4().hex
+            notifications = self.create_bulk_notifications(
+                users=users,
                 title=title,
                 message=message,
                 notification_type=notification_type,
-                priority='high'
+                priority='high',
+                data={'broadcast': broadcast_id}
             )
             
             # Also send global WebSocket broadcast
@@ -306,12 +311,13 @@ class NotificationService:
                             'title': title,
                             'message': message,
                             'type': notification_type,
+                            'broadcast_id': broadcast_id,
                             'timestamp': timezone.now().isoformat()
                         }
                     }
                 )
             
-            logger.info(f"Broadcast sent to {users.count()} users: {title}")
+            logger.info(f"Broadcast sent to {len(notifications)} users: {title}")
             
         except Exception as e:
             logger.error(f"Error broadcasting to all users: {e}")
@@ -333,13 +339,16 @@ class NotificationService:
             else:
                 users = User.objects.filter(is_active=True)
             
-            # Create and send notifications
-            self.create_bulk_notifications(
-                users=list(users),
+            # Create and send notifications; without target roles the
+            # global announcement covers every recipient
+            broadcast_id = uuid.uuid4().hex
+            notifications = self.create_bulk_notifications(
+                users=users,
                 title=title,
                 message=message,
                 notification_type='system_announcement',
-                priority='high'
+                priority='high',
+                data=None if target_roles else {'broadcast': broadcast_id}
             )
             
             # Send WebSocket broadcast
@@ -352,29 +361,24 @@ class NotificationService:
                             'title': title,
                             'message': message,
                             'target_roles': target_roles,
+                            'broadcast_id': broadcast_id,
                             'timestamp': timezone.now().isoformat()
                         }
                     }
                 )
             
-            logger.info(f"System announcement sent to {users.count()} users: {title}")
+            logger.info(f"System announcement sent to {len(notifications)} users: {title}")
             
         except Exception as e:
             logger.error(f"Error sending system announcement: {e}")
     
     def cleanup_old_notifications(self, days: int = 30):
-        """Clean up old notifications"""
+        """Archive old notifications in batches (read ones after ``days``)"""
         try:
-            cutoff_date = timezone.now() - timedelta(days=days)
-            
-            # Delete old read notifications
-            deleted_count = Notification.objects.filter(
-                created_at__lt=cutoff_date,
-                is_read=True
-            ).delete()[0]
+            archived_count = notification_archiver.run(days=days)['archived']
             
-            logger.info(f"Cleaned up {deleted_count} old notifications")
-            return deleted_count
+            logger.info(f"Cleaned up {archived_count} old notifications")
+            return archived_count
             
         except Exception as e:
             logger.error(f"Error cleaning up old notifications: {e}")
@@ -388,12 +392,11 @@ class NotificationService:
             
             # Delivery statistics (would use NotificationDelivery model if implemented)
             successful_deliveries = 0  # Placeholder
-            failed_deliveries = 0      # Placeholder
+            failed_deliveries = NotificationOutbox.objects.filter(status=OutboxStatus.DEAD).count()
+            pending_deliveries = NotificationOutbox.objects.exclude(status=OutboxStatus.DEAD).count()
             
             # Active WebSocket connections
-            active_connections = WebSocketConnection.objects.filter(
-                is_active=True
-            ).count()
+            active_connections = len(presence_registry.active_connections())
             
             return {
                 'total_notifications': total_notifications,
@@ -401,6 +404,7 @@ class NotificationService:
                 'read_rate': (total_notifications - unread_notifications) / max(total_notifications, 1) * 100,
                 'successful_deliveries': successful_deliveries,
                 'failed_deliveries': failed_deliveries,
+                'pending_deliveries': pending_deliveries,
                 'delivery_success_rate': successful_deliveries / max(successful_deliveries + failed_deliveries, 1) * 100,
                 'active_websocket_connections': active_connections,
                 'timestamp': timezone.now().isoformat()
@@ -0,0 +1,31 @@
+# ==============================================================================
+# NOTIFICATION SIGNAL HANDLERS
+# سیگنال‌های اعلانات
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from .counters import unread_counter
+from .models import Notification
+
+
+def count_saved_notification(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Keep the unread counter in step with single-row saves"""
+    if raw:
+        return
+    if created:
+        if not instance.is_read:
+            transaction.on_commit(lambda: unread_counter.incr(instance.user_id))
+    elif update_fields and 'is_read' in update_fields and instance.is_read:
+        # Notification.mark_as_read only saves on an unread -> read change
+        transaction.on_commit(lambda: unread_counter.decr(instance.user_id))
+    elif update_fields is None or 'is_read' in update_fields:
+        # Other saves (serializer updates, admin) don't tell what is_read was; recount
+        transaction.on_commit(lambda: unread_counter.invalidate([instance.user_id]))
+
+
+# No post_delete receiver: it would turn off fast deletes for the bulk
+# cleanups, which only remove read notifications anyway
+post_save.connect(count_saved_notification, sender=Notification, dispatch_uid='notification_unread_count')
@@ -0,0 +1,457 @@
+# ==============================================================================
+# TESTS FOR NOTIFICATIONS APP
+# تاریخ ایجاد: ۱۴۰۳/۰۶/۲۰
+# ==============================================================================
+
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.notifications import mailer
+from apps.notifications.models import (
+    Notification, NotificationPreference, NotificationOutbox, OutboxStatus, NotificationTemplate,
+    WebSocketConnection, NotificationArchive, NotificationArchiveState
+)
+from apps.notifications.archive import NotificationArchiver
+from apps.notifications.counters import unread_counter
+from apps.notifications.fanout import GroupFanout
+from apps.notifications.pagination import notification_page
+from apps.notifications.presence import PresenceRegistry
+from apps.notifications.outbox import OutboxWorker, outbox_worker
+from apps.notifications.serializers import NotificationSerializer
+from apps.notifications.services import notification_service
+from apps.notifications.views import NotificationViewSet
+
+User = get_user_model()
+
+
+def create_users(count, prefix='user'):
+    return [
+        User.objects.create_user(
+            username=f'{prefix}{i}',
+            national_id=f'{i:010d}',
+            email=f'{prefix}{i}@example.com',
+            password='pass1234',
+            user_type='EMPLOYEE'
+        )
+        for i in range(count)
+    ]
+
+
+def receive_all(layer, channel):
+    """Drain the messages waiting on an in-memory channel"""
+    async def drain():
+        messages = []
+        while True:
+            try:
+                messages.append(await asyncio.wait_for(layer.receive(channel), 0.05))
+            except asyncio.TimeoutError:
+                return messages
+    return async_to_sync(drain)()
+
+
+class BulkNotificationTest(TestCase):
+    """Batched creation and fan-out of bulk notifications"""
+
+    def setUp(self):
+        cache.clear()
+        self.users = create_users(12)
+        self.layer = notification_service.channel_layer
+
+    @override_settings(NOTIFICATION_BULK_BATCH_SIZE=5)
+    def test_query_count_grows_with_batches_not_users(self):
+        with CaptureQueriesContext(connection) as queries:
+            notifications = notification_service.create_bulk_notifications(
+                User.objects.order_by('id'), 'Exam', 'Exam schedule published'
+            )
+
+        self.assertEqual(len(notifications), 12)
+        # users read, then per batch: savepoint, insert, preferences, outbox insert, release
+        self.assertLessEqual(len(queries), 1 + 3 * 5 + 2)
+        self.assertEqual(NotificationOutbox.objects.filter(channel='websocket').count(), 12)
+
+        # Delivery happens in the worker, one claimed batch per channel
+        with CaptureQueriesContext(connection) as queries:
+            results = OutboxWorker(batch_size=50).run_once()
+        self.assertEqual(results['websocket'], {'sent': 12, 'retried': 0, 'dead': 0})
+        # a fixed number of queries per channel, whatever the batch size
+        self.assertLessEqual(len(queries), 20)
+        self.assertEqual(Notification.objects.filter(is_sent=True, websocket_sent=True).count(), 12)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_preferences_and_unread_counts(self):
+        quiet, emailed = self.users[0], self.users[1]
+        NotificationPreference.objects.create(user=quiet, websocket_enabled=False, email_enabled=False)
+        NotificationPreference.objects.create(user=emailed, websocket_enabled=True, email_enabled=True)
+        Notification.objects.create(user=emailed, title='Old', message='Unread before')
+
+        channels = {}
+        for user in (quiet, emailed):
+            channels[user.pk] = async_to_sync(self.layer.new_channel)()
+            async_to_sync(self.layer.group_add)(f'notifications_{user.pk}', channels[user.pk])
+
+        notification_service.create_bulk_notifications(
+            [quiet, emailed], 'Grades', 'Grades are out', data={'term': 1}
+        )
+        self.assertEqual(mail.outbox, [])
+        outbox_worker.run_once()
+
+        self.assertEqual(receive_all(self.layer, channels[quiet.pk]), [])
+        messages = receive_all(self.layer, channels[emailed.pk])
+        self.assertEqual([m['type'] for m in messages], ['notification_message', 'unread_count_update'])
+        self.assertEqual(messages[0]['notification']['extra_data'], {'term': 1})
+        self.assertEqual(messages[1]['count'], 2)
+        self.assertEqual([m.to for m in mail.outbox], [[emailed.email]])
+
+
+    def test_broadcast_sends_no_per_user_copy(self):
+        channels = {}
+        for group in ('notifications_%s' % self.users[0].pk, 'global_notifications'):
+            channels[group] = async_to_sync(self.layer.new_channel)()
+            async_to_sync(self.layer.group_add)(group, channels[group])
+
+        notification_service.broadcast_to_all_users('Holiday', 'Campus closed tomorrow')
+        outbox_worker.run_once(['websocket'])
+
+        (broadcast,) = receive_all(self.layer, channels['global_notifications'])
+        self.assertEqual(broadcast['type'], 'broadcast_message')
+        personal = receive_all(self.layer, channels['notifications_%s' % self.users[0].pk])
+        self.assertEqual(personal, [{'type': 'unread_count_update', 'count': 1}])
+        self.assertEqual(
+            Notification.objects.filter(extra_data__broadcast=broadcast['message']['broadcast_id']).count(), 12
+        )
+
+    def test_fanout_limits_sends_in_flight(self):
+        class SlowLayer(InMemoryChannelLayer):
+            in_flight = peak = 0
+
+            async def group_send(self, group, message):
+                SlowLayer.in_flight += 1
+                SlowLayer.peak = max(SlowLayer.peak, SlowLayer.in_flight)
+                await asyncio.sleep(0.01)
+                SlowLayer.in_flight -= 1
+
+        errors = GroupFanout(concurrency=3).send(
+            SlowLayer(), [(f'notifications_{i}', {'type': 'ping'}) for i in range(10)]
+        )
+        self.assertEqual(errors, [None] * 10)
+        self.assertEqual(SlowLayer.peak, 3)
+
+
+class OutboxWorkerTest(TestCase):
+    """Retries and dead-lettering of outbox deliveries"""
+
+    def setUp(self):
+        self.user = create_users(1)[0]
+        NotificationPreference.objects.create(
+            user=self.user, websocket_enabled=False, email_enabled=True, push_enabled=False
+        )
+        self.notification = notification_service.create_notification(self.user, 'Fee', 'Fee due')
+        self.worker = OutboxWorker(max_attempts=2, backoff=0)
+        self.failures = 0
+
+        def flaky(notifications):
+            self.failures += 1
+            return ['SMTPServerDisconnected: gone' for _ in notifications]
+        self.worker.handlers['email'] = flaky
+
+    def test_failed_delivery_is_retried_then_dead_lettered(self):
+        self.assertEqual(self.worker.run_once(['email'])['email'], {'sent': 0, 'retried': 1, 'dead': 0})
+        self.assertEqual(self.worker.run_once(['email'])['email'], {'sent': 0, 'retried': 0, 'dead': 1})
+        self.assertEqual(self.worker.run_once(['email'])['email'], {'sent': 0, 'retried': 0, 'dead': 0})
+
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual(entry.status, OutboxStatus.DEAD)
+        self.assertEqual(entry.attempts, 2)
+        self.assertIn('SMTPServerDisconnected', entry.last_error)
+        self.assertEqual(self.failures, 2)
+
+        # Requeued entries are delivered normally
+        self.assertEqual(self.worker.requeue_dead('email'), 1)
+        self.worker.handlers['email'] = outbox_worker.handlers['email']
+        self.assertEqual(self.worker.run_once(['email'])['email'], {'sent': 1, 'retried': 0, 'dead': 0})
+        self.assertEqual(len(mail.outbox), 1)
+        self.notification.refresh_from_db()
+        self.assertTrue(self.notification.is_sent)
+
+    def test_expired_lease_is_claimed_again(self):
+        self.assertEqual(len(self.worker.claim('email')), 1)
+        self.assertEqual(self.worker.claim('email'), [])
+
+        NotificationOutbox.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(self.worker.claim('email')), 1)
+
+
+class BatchMailerTest(TestCase):
+    """Batched email sending over one connection"""
+
+    def setUp(self):
+        self.users = create_users(5)
+        NotificationTemplate.objects.create(
+            name='grade_published', type='grade',
+            title_template='Grade for {{ data.course }}',
+            message_template='<p>Dear {{ user.username }}, your grade is {{ data.grade }}.</p>'
+        )
+        self.notifications = [
+            Notification.objects.create(
+                user=user, title='Grade', message='New grade',
+                extra_data={'template_name': 'grade_published', 'course': 'CS101', 'grade': 17}
+            )
+            for user in self.users
+        ]
+
+    def test_one_connection_per_batch_and_cached_templates(self):
+        sender = mailer.BatchMailer(rate_limit=0)
+        with mock.patch.object(mailer, 'get_connection', wraps=mailer.get_connection) as opened:
+            errors = sender.send(self.notifications)
+
+        self.assertEqual(errors, [None] * 5)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].subject, 'Grade for CS101')
+        self.assertEqual(mail.outbox[0].body, 'New grade')
+        self.assertIn('your grade is 17', mail.outbox[0].alternatives[0][0])
+
+        compiled = sender.templates.get_many(['grade_published'])['grade_published']
+        with CaptureQueriesContext(connection) as queries:
+            sender.send(self.notifications[:1])
+        # only the version check; the compiled template is reused
+        self.assertEqual(len(queries), 1)
+        self.assertIs(sender.templates.get_many(['grade_published'])['grade_published'], compiled)
+
+    def test_failed_message_does_not_stop_the_batch(self):
+        self.users[2].email = ''
+        self.users[2].save()
+        sender = mailer.BatchMailer(rate_limit=0)
+        real_send = mail.get_connection().__class__.send_messages
+
+        def send_messages(backend, messages):
+            if messages[0].to == [self.users[3].email]:
+                raise ConnectionResetError('connection reset')
+            return real_send(backend, messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', send_messages):
+            errors = sender.send(self.notifications)
+
+        self.assertEqual(errors[:3], [None, None, None])
+        self.assertIn('connection reset', errors[3])
+        self.assertIsNone(errors[4])
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class UnreadCounterTest(TestCase):
+    """Cached per-user unread counts"""
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.other = create_users(2)
+
+    def test_counter_follows_create_read_and_mark_all(self):
+        Notification.objects.create(user=self.user, title='A', message='a')
+        self.assertEqual(unread_counter.get(self.user.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notification_service.create_notification(self.user, 'B', 'b')
+        with self.captureOnCommitCallbacks(execute=True):
+            notification_service.create_bulk_notifications([self.user, self.other, self.user], 'C', 'c')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(unread_counter.get(self.user.id), 4)
+        self.assertEqual(len(queries), 0)
+        # Not cached yet: counted from the database
+        self.assertEqual(unread_counter.get_many([self.user.id, self.other.id]), {self.user.id: 4, self.other.id: 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.filter(user=self.user).first().mark_as_read()
+        self.assertEqual(unread_counter.get(self.user.id), 3)
+
+        unread_counter.set(self.user.id, 0)
+        unread_counter.decr(self.user.id)
+        # Drift below zero drops the entry, so the next read recounts
+        self.assertEqual(unread_counter.get(self.user.id), 3)
+
+    def test_counter_follows_serializer_updates_and_mark_all(self):
+        notification = Notification.objects.create(user=self.user, title='A', message='a')
+        self.assertEqual(unread_counter.get(self.user.id), 1)
+
+        for is_read, expected in [(True, 0), (False, 1)]:
+            with self.captureOnCommitCallbacks(execute=True):
+                serializer = NotificationSerializer(notification, data={'is_read': is_read}, partial=True)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+            self.assertEqual(unread_counter.get(self.user.id), expected)
+
+        view = NotificationViewSet.as_view({'post': 'mark_all_read'})
+        request = APIRequestFactory().post('/notifications/mark_all_read/')
+        force_authenticate(request, user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            view(request)
+            # Created after the UPDATE, before the commit
+            Notification.objects.create(user=self.user, title='B', message='b')
+        self.assertEqual(unread_counter.get(self.user.id), 1)
+
+
+@override_settings(NOTIFICATION_PRESENCE_TTL=60, NOTIFICATION_PRESENCE_FLUSH_INTERVAL=3600)
+class PresenceRegistryTest(TestCase):
+    """Write-behind WebSocket connection tracking"""
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.other = create_users(2)
+        self.registry = PresenceRegistry()
+
+    def test_changes_are_written_in_one_flush(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.registry.connect('conn-1', self.user, user_agent='phone')
+            self.registry.connect('conn-2', self.other)
+            self.registry.disconnect('conn-2')
+            self.registry.connect('conn-3', self.other)
+            self.assertTrue(self.registry.heartbeat('conn-1'))
+        self.assertEqual(len(queries), 0)
+
+        active = self.registry.active_connections()
+        self.assertEqual(
+            sorted((entry['user__username'], entry['platform']) for entry in active),
+            [(self.user.username, 'web'), (self.other.username, 'web')]
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.registry.flush(), 3)
+        # upsert plus the stale-row check
+        self.assertEqual(len(queries), 2)
+        rows = dict(WebSocketConnection.objects.values_list('connection_id', 'is_active'))
+        self.assertEqual(rows, {'conn-1': True, 'conn-2': False, 'conn-3': True})
+
+        # Last client leaving flushes right away
+        self.registry.disconnect('conn-1')
+        self.registry.disconnect('conn-3')
+        self.assertFalse(WebSocketConnection.objects.filter(is_active=True).exists())
+
+    def test_rows_of_vanished_connections_are_reaped(self):
+        WebSocketConnection.objects.create(user=self.user, connection_id='dead', channel_name='dead')
+        self.registry.connect('alive', self.other)
+        self.registry.flush()
+        WebSocketConnection.objects.update(last_activity=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(self.registry.reap(), 1)
+        self.assertEqual(
+            list(WebSocketConnection.objects.filter(is_active=True).values_list('connection_id', flat=True)),
+            ['alive']
+        )
+
+
+class NotificationFeedTest(TestCase):
+    """Keyset pagination of the notification feed"""
+
+    def setUp(self):
+        self.user, self.other = create_users(2)
+        base = timezone.now() - timedelta(hours=1)
+        for i in range(7):
+            notification = Notification.objects.create(user=self.user, title=f'N{i}', message='m')
+            # Pairs share a timestamp, so ties are broken by id
+            Notification.objects.filter(pk=notification.pk).update(created_at=base + timedelta(minutes=i // 2))
+        Notification.objects.create(user=self.other, title='Other', message='m')
+        self.feed = Notification.objects.filter(user=self.user)
+        self.expected = list(self.feed.order_by('-created_at', '-id').values_list('title', flat=True))
+
+    def test_pages_walk_the_feed_once_and_delta_fetches_new_ones(self):
+        titles = []
+        first = notification_page(self.feed, limit=3)
+        page = first
+        while True:
+            titles.extend(n.title for n in page['results'])
+            if not page['has_more']:
+                break
+            page = notification_page(self.feed, cursor=page['next_cursor'], limit=3)
+        self.assertEqual(titles, self.expected)
+
+        for i in range(3):
+            Notification.objects.create(user=self.user, title=f'New{i}', message='m')
+        delta = notification_page(self.feed, since=first['since_cursor'], limit=2)
+        self.assertEqual(len(delta['results']), 2)
+        rest = notification_page(self.feed, since=delta['next_cursor'], limit=2)
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(
+            sorted(n.title for n in delta['results'] + rest['results']), ['New0', 'New1', 'New2']
+        )
+        self.assertEqual(notification_page(self.feed, since=rest['since_cursor'])['results'], [])
+
+        with self.assertRaises(ValueError):
+            notification_page(self.feed, cursor='not-a-cursor')
+
+    def test_rest_view_uses_cursor_when_asked(self):
+        view = NotificationViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+
+        request = factory.get('/notifications/', {'cursor': '', 'page_size': 4})
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual([n['title'] for n in response.data['results']], self.expected[:4])
+        self.assertTrue(response.data['has_more'])
+
+        request = factory.get('/notifications/', {'cursor': response.data['next_cursor'], 'page_size': 4})
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual([n['title'] for n in response.data['results']], self.expected[4:])
+        self.assertFalse(response.data['has_more'])
+
+        request = factory.get('/notifications/', {'page': 1})
+        force_authenticate(request, user=self.user)
+        self.assertEqual(view(request).data['count'], 7)
+
+
+class NotificationArchiverTest(TestCase):
+    """Batched archival of old notifications"""
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.other = create_users(2)
+        self.now = timezone.now()
+
+    def create(self, user, days_old, is_read, title='N'):
+        notification = Notification.objects.create(user=user, title=title, message='m', is_read=is_read)
+        Notification.objects.filter(pk=notification.pk).update(created_at=self.now - timedelta(days=days_old))
+        return notification
+
+    def test_moves_old_notifications_in_batches_and_keeps_counters(self):
+        for i in range(5):
+            self.create(self.user, 400 + i, is_read=i % 2 == 0)
+        old_read = self.create(self.other, 60, is_read=True)
+        kept_unread = self.create(self.other, 60, is_read=False)
+        kept_read = self.create(self.other, 5, is_read=True)
+        self.assertEqual(unread_counter.get(self.user.pk), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = NotificationArchiver(batch_size=2).run(days=30, unread_days=180)
+
+        self.assertEqual(stats, {'archived': 6, 'unread': 2, 'batches': 4})
+        self.assertEqual(
+            set(Notification.objects.values_list('pk', flat=True)), {kept_unread.pk, kept_read.pk}
+        )
+        self.assertEqual(NotificationArchive.objects.count(), 6)
+        self.assertTrue(NotificationArchive.objects.get(pk=old_read.pk).is_read)
+        self.assertEqual(unread_counter.get(self.user.pk), 0)
+        self.assertEqual(NotificationArchiveState.objects.get().archived_total, 6)
+
+    def test_runs_resume_from_the_watermark(self):
+        notifications = [self.create(self.user, 403 - i, is_read=False) for i in range(4)]
+        archiver = NotificationArchiver(batch_size=1)
+        self.assertEqual(archiver.run(max_batches=3)['archived'], 3)
+        self.assertEqual(NotificationArchiveState.objects.get().watermark_id, notifications[2].pk)
+
+        # Rows behind the watermark (only a backfill can add them) are not rescanned
+        late = self.create(self.user, 500, is_read=False)
+        self.assertEqual(archiver.run()['archived'], 1)
+        self.assertEqual(list(Notification.objects.values_list('pk', flat=True)), [late.pk])
+        self.assertEqual(archiver.run()['batches'], 0)
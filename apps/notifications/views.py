@@ -7,13 +7,15 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.utils import timezone
 from django.db.models import Q, Count
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
+from .counters import unread_counter
+from .pagination import NotificationPagination
 from .models import (
     Notification, NotificationTemplate, NotificationPreference, 
     WebSocketConnection
@@ -38,13 +40,6 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-class NotificationPagination(PageNumberPagination):
-    """Custom pagination for notifications"""
-    page_size = 20
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-
 class NotificationViewSet(viewsets.ModelViewSet):
     """ViewSet for managing user notifications"""
     
@@ -54,6 +49,26 @@ class NotificationViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['type', 'priority', 'is_read', 'is_sent']
     
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='cursor',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Keyset page: empty for the newest page, then next_cursor'
+            ),
+            OpenApiParameter(
+                name='since',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Only notifications created after this cursor (since_cursor of an earlier page)'
+            )
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        """List notifications, by page number or keyset cursor"""
+        return super().list(request, *args, **kwargs)
+    
     def get_queryset(self):
         """Get notifications for the authenticated user"""
         return Notification.objects.filter(
@@ -72,6 +87,13 @@ class NotificationViewSet(viewsets.ModelViewSet):
         """Set user when creating notification"""
         serializer.save(user=self.request.user)
     
+    def perform_destroy(self, instance):
+        """Delete notification, keeping the unread counter in step"""
+        user_id, was_unread = instance.user_id, not instance.is_read
+        instance.delete()
+        if was_unread:
+            transaction.on_commit(lambda: unread_counter.decr(user_id))
+    
     @extend_schema(
         summary="Mark notification as read",
         description="Mark a specific notification as read and update unread count"
@@ -84,10 +106,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
             notification.mark_as_read()
             
             # Get updated unread count
-            unread_count = Notification.objects.filter(
-                user=request.user,
-                is_read=False
-            ).count()
+            unread_count = unread_counter.get(request.user.id)
             
             return Response({
                 'success': True,
@@ -117,6 +136,9 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 is_read=True,
                 read_at=timezone.now()
             )
+            # Recount rather than set 0: notifications created before the
+            # commit would be lost from the count
+            transaction.on_commit(lambda: unread_counter.invalidate([request.user.id]))
             
             return Response({
                 'success': True,
@@ -138,12 +160,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Get unread notifications count"""
-        count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
-        
-        return Response({'unread_count': count})
+        return Response({'unread_count': unread_counter.get(request.user.id)})
     
     @extend_schema(
         summary="Get notification statistics",
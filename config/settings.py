@@ -318,6 +318,45 @@ CACHES = {
     }
 }
 
+# Analytics: thread pool size for evaluating dashboard widgets concurrently
+ANALYTICS_WIDGET_WORKERS = 4
+
+# Analytics: days before the rollup watermark re-rolled on every advance, so
+# rows edited or backdated within them are picked up (older ones need --rebuild)
+ANALYTICS_ROLLUP_LATE_DAYS = 7
+
+# Data management: import/export jobs write progress at most once per interval
+# (seconds) and store at most this many per-record errors per job
+DATA_JOB_PROGRESS_INTERVAL = 2.0
+DATA_JOB_MAX_STORED_ERRORS = 1000
+
+# Data management: worker processes for sharded exports (config {'shards': N})
+DATA_EXPORT_WORKERS = os.cpu_count() or 1
+
+# Data sync: models whose changes are logged even without a sync task, and
+# how old (seconds) a change log entry must be before a sync consumes it,
+# leaving slower transactions time to commit
+DATA_SYNC_WATCHED_MODELS = []
+DATA_SYNC_CHANGE_LAG = 5
+# Data sync delivery: batches sent concurrently per window (the change cursor
+# is saved after each window), pooled HTTP connections, and retry backoff
+# (seconds, doubled per attempt up to the maximum)
+DATA_SYNC_DELIVERY_WINDOW = 8
+DATA_SYNC_MAX_CONNECTIONS = 50
+DATA_SYNC_RETRY_BACKOFF = 0.5
+DATA_SYNC_MAX_BACKOFF = 30.0
+
+# Backups: codec for compressed backups ('gzip', or 'zstd' with zstandard installed)
+BACKUP_COMPRESSION = 'gzip'
+# Incremental backups re-read rows changed this many seconds before the
+# previous backup started, to catch transactions that were still open
+BACKUP_WATERMARK_OVERLAP = 300
+# Tables whose rows are never updated; incremental backups find their new rows
+# by created_at or pk. Other tables without updated_at are copied in full
+BACKUP_APPEND_ONLY_MODELS = []
+# Independent tables restored at once, each on its own database connection
+BACKUP_RESTORE_WORKERS = 4
+
 # Session Configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 SESSION_CACHE_ALIAS = 'session'
@@ -414,3 +453,31 @@ CHANNEL_LAYERS = {
 # WebSocket settings
 WEBSOCKET_ACCEPT_ALL = False  # Set to True to accept all WebSocket connections
 WEBSOCKET_TIMEOUT = 300  # WebSocket timeout in seconds
+
+# Notifications: users per bulk_create/send batch in bulk notifications
+NOTIFICATION_BULK_BATCH_SIZE = 500
+# Notification outbox worker: entries claimed per channel and pass, attempts
+# before dead-lettering, retry backoff and claim lease (seconds), and
+# delivery threads per channel
+NOTIFICATION_OUTBOX_BATCH_SIZE = 200
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = 5
+NOTIFICATION_OUTBOX_RETRY_BACKOFF = 30.0
+NOTIFICATION_OUTBOX_LEASE = 300.0
+NOTIFICATION_OUTBOX_CONCURRENCY = {'websocket': 1, 'email': 4, 'push': 4}
+# Notification emails per minute across a worker's threads (0: no limit)
+NOTIFICATION_EMAIL_RATE_LIMIT = 0
+# Unread notification counters: cache alias, and seconds before a cached
+# count is recounted from the database
+NOTIFICATION_COUNTER_CACHE = 'default'
+NOTIFICATION_UNREAD_TTL = 3600
+# Channel-layer group sends in flight at once when fanning out a batch
+NOTIFICATION_FANOUT_CONCURRENCY = 100
+# WebSocket presence: seconds a connection stays listed without a heartbeat,
+# and seconds between write-behind flushes to WebSocketConnection
+NOTIFICATION_PRESENCE_TTL = 90
+NOTIFICATION_PRESENCE_FLUSH_INTERVAL = 30
+# Notification archival: days before read / unread notifications move to the
+# archive table, and rows moved per transaction
+NOTIFICATION_RETENTION_DAYS = 30
+NOTIFICATION_UNREAD_RETENTION_DAYS = 180
+NOTIFICATION_ARCHIVE_BATCH_SIZE = 1000
@@ -13,6 +13,12 @@ CACHES = {
     }
 }
 
+# In-memory SQLite is per-connection, so keep widget evaluation, sharded
+# exports and restores on the test thread
+ANALYTICS_WIDGET_WORKERS = 1
+DATA_EXPORT_WORKERS = 1
+BACKUP_RESTORE_WORKERS = 1
+
 # Use simple session backend for testing
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
@@ -66,3 +72,13 @@ LOGGING = {
 
 # Disable email backend
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# In-memory channel layer (no Redis in tests)
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+# Deliver notifications from the outbox in the test thread
+NOTIFICATION_OUTBOX_CONCURRENCY = {}